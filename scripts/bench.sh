@@ -0,0 +1,5 @@
+#!/bin/sh
+
+. ./pyenv.sh
+
+python -m taskbuilder.bench "$@" && python -m invoker.bench
@@ -1,4 +1,5 @@
 import os
+import threading
 from pathlib import Path
 import appdirs
 from .configs import Config
@@ -47,25 +48,33 @@ class ConfigPaths:
         self.user_paths = [Path(user_path)]
 
 
+# the configs are requested from the worker threads, so the check and the
+# addition must be atomic. The lock is not stored in the manager, as the
+# manager is copied in tests
+_LOCK = threading.RLock()
+
+
 class ConfigManager:
     def __contains__(self, config_name):
         return config_name in self.__configs
 
     def __getitem__(self, config_name):
-        if config_name in self.__configs:
-            return self.__configs[config_name]
-        paths = self.__paths
-        paths.init_user(config_name)
-        config = Config(paths.filenames(config_name),
-                        paths.user_config(config_name),
-                        self.__defaults.get(config_name, ''))
-        self.__configs[config_name] = config
-        return config
+        with _LOCK:
+            if config_name in self.__configs:
+                return self.__configs[config_name]
+            paths = self.__paths
+            paths.init_user(config_name)
+            config = Config(paths.filenames(config_name),
+                            paths.user_config(config_name),
+                            self.__defaults.get(config_name, ''))
+            self.__configs[config_name] = config
+            return config
 
     def request(self, config_name, default_value):
-        if config_name not in self.__configs:
-            self.add_default(config_name, default_value)
-        return self.__getitem__(config_name)
+        with _LOCK:
+            if config_name not in self.__configs:
+                self.add_default(config_name, default_value)
+            return self.__getitem__(config_name)
 
     def add_default(self, config_name, value):
         if config_name in self.__defaults:
@@ -5,5 +5,8 @@ from .profiled_runner import ProfiledRunner
 from .profiled_runner import register_profile, create_profile, list_profiles
 from .profiled_runner import AbstractRunProfile
 from .sourcecode import SourceCode
-from .cli import CompileSubcommand, RunSubcommand
+from .batch import BatchRunner, TestRun
+from .session import Session, CompileResult, RunResult
+from .stats import RepeatStats, repeat_stats
+from .cli import CompileSubcommand, RunSubcommand, RunnerBenchSubcommand
 from .utils import default_exe_ext
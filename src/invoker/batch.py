@@ -0,0 +1,347 @@
+import os
+import queue
+import shutil
+import threading
+from collections import namedtuple
+from copy import copy
+from pathlib import Path
+from compat import fspath
+from runners import Status, scratch_pool
+from .parallel import parallel_map, reserved_jobs, default_jobs
+from .profiled_runner import ProfiledRunner, AbstractRunProfile
+from .profiled_runner import cli_exitcode
+from .staging import stage_file
+
+SLOTS_DIR = 'slots'
+
+TestRun = namedtuple('TestRun', ['input_file', 'output_file', 'results',
+                                 'exitcode'])
+
+
+class BatchRunProfile(AbstractRunProfile):
+    '''Wraps the profile, but always passes stdin into the program and
+    captures its stdout, as each test has its own input and output files'''
+
+    def update_runner(self, runner):
+        self.profile.update_runner(runner)
+        runner.pass_stdin = True
+        runner.capture_stdout = True
+
+    def __init__(self, profile):
+        super().__init__(profile.repository)
+        self.profile = profile
+        # name() is static in the profiles, so the name of the wrapped one is
+        # taken as is instead of being overridden by a method
+        self.name = profile.name
+
+
+def list_tests(paths):
+    '''Expands the directories in paths into the sorted lists of files'''
+    result = []
+    for cur_path in paths:
+        cur_path = Path(cur_path)
+        if cur_path.is_dir():
+            result += sorted(item for item in cur_path.iterdir()
+                             if item.is_file())
+        else:
+            result += [cur_path]
+    return result
+
+
+def output_name(input_file):
+    input_file = Path(input_file)
+    if input_file.suffix == '.in':
+        return input_file.stem + '.out'
+    return input_file.name + '.out'
+
+
+def output_names(input_files):
+    '''Returns the output file names for input_files. Raises ValueError if
+    some of the inputs have the same output name (like a/01.in and b/01.in,
+    or 01 and 01.in), as their outputs would overwrite each other'''
+    result = []
+    by_name = {}
+    for input_file in input_files:
+        name = output_name(input_file)
+        if name in by_name:
+            raise ValueError('tests {} and {} have the same output file {}'
+                             .format(fspath(by_name[name]),
+                                     fspath(input_file), name))
+        by_name[name] = input_file
+        result += [name]
+    return result
+
+
+def batch_exitcode(test_runs):
+    '''Returns the first non-zero exitcode among the tests, or zero if all
+    of them passed'''
+    for test_run in test_runs:
+        if test_run.exitcode != 0:
+            return test_run.exitcode
+    return 0
+
+
+def format_test_runs(test_runs):
+    # the digests are shown only if the outputs were hashed
+    with_digest = any(test_run.results.stdout_digest is not None
+                      for test_run in test_runs)
+    lines = ['{:<24} {:<14} {:>8} {:>10} {:>8}'.format(
+        'test', 'status', 'time', 'memory', 'exitcode')]
+    if with_digest:
+        lines[0] += ' stdout digest'
+    for test_run in test_runs:
+        results = test_run.results
+        status = results.status
+        # the status is colored, so it's padded manually
+        lines += ['{:<24} {}{} {:>8.3f} {:>10.2f} {:>8}'.format(
+            fspath(test_run.input_file), repr(status),
+            ' ' * max(0, 14 - len(status.value)), results.time,
+            results.memory, results.exitcode)]
+        if with_digest:
+            lines[-1] += ' {}'.format(results.stdout_digest or '-')
+    passed = sum(1 for test_run in test_runs
+                 if test_run.results.status == Status.OK)
+    lines += ['{} of {} test(s) passed'.format(passed, len(test_runs))]
+    return '\n'.join(lines)
+
+
+class WorkDir:
+    '''Working directory of one slot
+
+    The files are put into it with stage_file(). The staged files are
+    remembered, so the executable is staged once and kept between the tests,
+    while the other files are removed by reset()'''
+
+    @staticmethod
+    def __file_key(src):
+        stat = os.stat(fspath(src))
+        return fspath(Path(src).absolute()), stat.st_ino, stat.st_mtime_ns
+
+    def stage(self, src, name=None):
+        '''Stages src into the directory and returns the path to it. The file
+        is reflinked or copied, but never hardlinked, as the program may
+        modify the files in its working directory, which would change the
+        original through the link. Making the link read-only doesn't help, as
+        the mode is shared with the original and doesn't stop root'''
+        if name is None:
+            name = Path(src).name
+        key = self.__file_key(src)
+        target = self.path / name
+        if self.__staged.get(name) != key:
+            stage_file(src, target, False)
+            self.__staged[name] = key
+        return target
+
+    def reset(self, keep=()):
+        '''Removes everything from the directory except the staged files with
+        the names in keep'''
+        for item in os.scandir(fspath(self.path)):
+            if item.name in keep and item.name in self.__staged:
+                continue
+            self.__staged.pop(item.name, None)
+            if item.is_dir(follow_symlinks=False):
+                shutil.rmtree(item.path)
+            else:
+                os.unlink(item.path)
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.__staged = {}
+
+
+Slot = namedtuple('Slot', ['runner', 'work_dir'])
+
+
+class BatchRunner:
+    '''Runs one program on many tests in parallel slots
+
+    Each slot has its own runner, the slots are reused between the tests, so
+    the runners are not recreated for each run. If isolate is True, each slot
+    also has its own working directory in .taker/slots/ of the repository,
+    where the executable and the test input are staged, so the tests running
+    in parallel don't share the files. The files are reflinked or copied, not
+    hardlinked (see WorkDir.stage()), so each test costs a copy of its input
+    on the filesystems without reflinks. Call close() to return the working
+    directories to the pool after use
+
+    If supervisor is True, all the tests are run by one runner process, which
+    supervises the concurrent programs itself (see Runner.iter_batch()). It
+    cannot be combined with isolate
+
+    output_limit overrides the output limit of the profile (if not None). If
+    hash_stdout is True, the digest of each output is computed by the runner
+    (see Results.stdout_digest)'''
+
+    def __work_dirs_pool(self):
+        root = self.profile.repository.internal_dir(True) / SLOTS_DIR
+        root.mkdir(parents=True, exist_ok=True)
+        return scratch_pool(root)
+
+    def __create_runner(self):
+        runner = ProfiledRunner(self.profile, self.runner_path)
+        runner.output_limit = self.output_limit
+        runner.hash_stdout = self.hash_stdout
+        return runner
+
+    def __create_slots(self, count):
+        with self.__lock:
+            while self.__slot_count < count:
+                work_dir = None
+                if self.isolate:
+                    work_dir = WorkDir(self.__work_dirs_pool().acquire())
+                self.__slots.put(Slot(self.__create_runner(), work_dir))
+                self.__slot_count += 1
+
+    @staticmethod
+    def __stage_cmdline(work_dir, cmdline, exe_file):
+        exe_path = fspath(Path(exe_file).absolute())
+        staged_exe = fspath(work_dir.stage(exe_path))
+        work_dir.reset(keep={Path(exe_path).name})
+        return [staged_exe if arg == exe_path else arg for arg in cmdline]
+
+    def run_test(self, cmdline, input_file, output_file=None,
+                 working_dir=None, exe_file=None):
+        '''Runs the program on one test. In isolated mode, the executable
+        exe_file (cmdline[0] if None) is staged into the slot working
+        directory together with input_file, and working_dir is ignored'''
+        self.__create_slots(1)
+        slot = self.__slots.get()
+        runner = slot.runner
+        try:
+            input_path = Path(input_file)
+            if slot.work_dir is not None:
+                if exe_file is None:
+                    exe_file = cmdline[0]
+                cmdline = self.__stage_cmdline(slot.work_dir, cmdline,
+                                               exe_file)
+                input_path = slot.work_dir.stage(input_file)
+                working_dir = slot.work_dir.path
+            # the test is passed as a path, so it's not copied for each run,
+            # and the output is written into output_file directly
+            runner.stdin = input_path
+            stdout_file = output_file
+            if stdout_file is None and not self.hash_stdout:
+                # nobody needs the output
+                stdout_file = os.devnull
+            runner.runner.stdout_file = stdout_file
+            runner.run(cmdline, working_dir)
+            if output_file is not None and not Path(output_file).exists():
+                # the program has failed before its output was opened
+                Path(output_file).touch()
+            return TestRun(input_file=input_file, output_file=output_file,
+                           results=runner.results,
+                           exitcode=runner.get_cli_exitcode())
+        finally:
+            self.__slots.put(slot)
+
+    @staticmethod
+    def __supervised_test_run(input_file, output_dir, temp_files, results):
+        output_file = None
+        if output_dir is not None:
+            output_file = Path(output_dir) / output_name(input_file)
+            stdout_file = temp_files[0]
+            if stdout_file.exists():
+                # renamed if possible, otherwise copied and removed
+                shutil.move(fspath(stdout_file), fspath(output_file))
+            else:
+                # the output of the previous run is truncated
+                with output_file.open('w', encoding='utf8'):
+                    pass
+        # the outputs are removed as soon as the test finishes, so the scratch
+        # space (which may be in RAM) is not filled by the whole batch
+        for temp_file in temp_files:
+            try:
+                temp_file.unlink()
+            except FileNotFoundError:
+                pass
+        return TestRun(input_file=input_file, output_file=output_file,
+                       results=results, exitcode=cli_exitcode(results))
+
+    def __run_supervised(self, cmdline, input_files, output_dir,
+                         working_dir, jobs):
+        runner = self.__create_runner()
+        pool = scratch_pool()
+        temp_dir = Path(pool.acquire())
+        try:
+            parameters_list = []
+            temp_files = []
+            for index, input_file in enumerate(input_files):
+                runner.prepare(cmdline, working_dir)
+                parameters = copy(runner.runner.parameters)
+                parameters.stdin_redir = fspath(Path(input_file).absolute())
+                stdout_file = temp_dir / '{}.out'.format(index)
+                parameters.stdout_redir = fspath(stdout_file)
+                temp_files += [[stdout_file]]
+                if runner.runner.capture_stderr:
+                    stderr_file = temp_dir / '{}.err'.format(index)
+                    parameters.stderr_redir = fspath(stderr_file)
+                    temp_files[index] += [stderr_file]
+                parameters_list += [parameters]
+            test_runs = [None] * len(input_files)
+            # the runner runs the tests concurrently itself, so the jobserver
+            # tokens are taken for all of them at once
+            with reserved_jobs(min(jobs, len(input_files))) as jobs:
+                for index, results in runner.runner.iter_batch(
+                        parameters_list, jobs):
+                    test_runs[index] = self.__supervised_test_run(
+                        input_files[index], output_dir, temp_files[index],
+                        results)
+            return test_runs
+        finally:
+            pool.release(temp_dir)
+
+    def run(self, cmdline, input_files, output_dir=None, working_dir=None,
+            jobs=None, exe_file=None):
+        '''Runs the program with cmdline on each of input_files. If output_dir
+        is not None, the output for each test is saved there (the directory is
+        created if needed, ValueError is raised if two tests have the same
+        output name). Returns the list of TestRun in the same order as
+        input_files
+
+        If jobs is None, the number of jobs passed to the constructor is
+        used'''
+        if jobs is None:
+            jobs = self.jobs
+        input_files = list(input_files)
+        if output_dir is not None:
+            # the problems with the outputs are reported before the runs
+            output_names(input_files)
+            Path(output_dir).mkdir(parents=True, exist_ok=True)
+        if self.supervisor:
+            return self.__run_supervised(cmdline, input_files, output_dir,
+                                         working_dir, jobs)
+        self.__create_slots(min(jobs, len(input_files)))
+
+        def run_one(input_file):
+            output_file = None
+            if output_dir is not None:
+                output_file = Path(output_dir) / output_name(input_file)
+            return self.run_test(cmdline, input_file, output_file,
+                                 working_dir, exe_file)
+
+        return parallel_map(run_one, input_files, jobs)
+
+    def close(self):
+        with self.__lock:
+            while self.__slot_count > 0:
+                slot = self.__slots.get()
+                if slot.work_dir is not None:
+                    self.__work_dirs_pool().release(slot.work_dir.path)
+                self.__slot_count -= 1
+
+    def __init__(self, profile, jobs=None, runner_path=None, isolate=False,
+                 supervisor=False, output_limit=None, hash_stdout=False):
+        if isolate and supervisor:
+            raise ValueError('isolate cannot be used with supervisor')
+        if jobs is None:
+            jobs = default_jobs()
+        self.profile = BatchRunProfile(profile)
+        self.jobs = jobs
+        self.runner_path = runner_path
+        self.isolate = isolate
+        self.supervisor = supervisor
+        self.output_limit = output_limit
+        self.hash_stdout = hash_stdout
+        self.__slots = queue.Queue()
+        self.__slot_count = 0
+        self.__lock = threading.Lock()
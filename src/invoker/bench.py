@@ -0,0 +1,132 @@
+'''
+Startup latency benchmarks for the compiled programs
+
+The benchmark compiles an empty program for each of the given languages,
+both linked dynamically and statically, and runs it many times through the
+runner. As the program does nothing, the measured time is the cost of
+starting the process (exec, dynamic loading, relocations, static
+initialization), which is paid by each test run.
+
+Run it with "python -m invoker.bench" (see --help for options).
+'''
+import argparse
+import statistics
+import sys
+from collections import namedtuple
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from compat import fspath
+from runners import Runner, Status
+from taskbuilder import RepositoryManager
+from .compiler import Compiler, CompileError
+from .manager import LanguageManager
+
+DEFAULT_LANGUAGES = ['c.gcc', 'cpp.g++17']
+
+DEFAULT_RUNS = 200
+
+# empty programs, which pull the standard library of the language
+EMPTY_PROGRAMS = {
+    '.c': '#include <stdio.h>\n\nint main() {\n    return 0;\n}\n',
+    '.cpp': '#include <iostream>\n\nint main() {\n    return 0;\n}\n',
+}
+
+StartupResult = namedtuple('StartupResult',
+                           ['language', 'static', 'runs', 'min_time',
+                            'median_time', 'mean_time', 'cpu_time'])
+
+
+def measure_startup(runner, exe_file, runs):
+    '''Runs exe_file runs times, returns the lists of wall clock and CPU
+    times (in seconds)'''
+    clock_times = []
+    cpu_times = []
+    runner.parameters.executable = exe_file
+    for _ in range(runs):
+        runner.run()
+        if runner.results.status != Status.OK:
+            raise RuntimeError('empty program exited with status {}'
+                               .format(runner.results.status.value))
+        clock_times += [runner.results.clock_time]
+        cpu_times += [runner.results.time]
+    return clock_times, cpu_times
+
+
+def run_benchmark(language_names, runs=DEFAULT_RUNS):
+    '''Runs the benchmark for the given languages, returns the list of
+    StartupResult (dynamic and static for each language)'''
+    results = []
+    with TemporaryDirectory() as task_dir:
+        repo_manager = RepositoryManager(task_dir=Path(task_dir))
+        language_manager = LanguageManager(repo_manager)
+        runner = Runner()
+        for name in language_names:
+            language = language_manager.get_lang(name)
+            ext = language.get_extensions()[0]
+            src_file = Path(task_dir) / ('empty' + ext)
+            with src_file.open('w') as the_file:
+                the_file.write(EMPTY_PROGRAMS[ext])
+            old_static = language.static
+            try:
+                for static in [False, True]:
+                    language.static = static
+                    exe_file = Path(task_dir) / 'empty-{}-{}{}'.format(
+                        name, 'static' if static else 'dynamic',
+                        language.exe_ext)
+                    Compiler(repo_manager.repo, language, src_file,
+                             exe_file).compile()
+                    clock_times, cpu_times = measure_startup(
+                        runner, fspath(exe_file), runs)
+                    results += [StartupResult(
+                        language=name, static=static, runs=runs,
+                        min_time=min(clock_times),
+                        median_time=statistics.median(clock_times),
+                        mean_time=statistics.mean(clock_times),
+                        cpu_time=statistics.median(cpu_times))]
+            finally:
+                language.static = old_static
+    return results
+
+
+def format_results(results):
+    lines = ['{:>12} {:>8} {:>6} {:>8} {:>10} {:>8} {:>8}'.format(
+        'language', 'linking', 'runs', 'min, ms', 'median, ms', 'mean, ms',
+        'cpu, ms')]
+    for result in results:
+        lines += ['{:>12} {:>8} {:>6} {:>8.3f} {:>10.3f} {:>8.3f} {:>8.3f}'
+                  .format(result.language,
+                          'static' if result.static else 'dynamic',
+                          result.runs, 1e3 * result.min_time,
+                          1e3 * result.median_time, 1e3 * result.mean_time,
+                          1e3 * result.cpu_time)]
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m invoker.bench',
+        description='Measures startup time of empty programs linked '
+                    'dynamically and statically')
+    parser.add_argument('languages', nargs='*', type=str,
+                        default=DEFAULT_LANGUAGES,
+                        help='Languages to benchmark (default: {})'.format(
+                            ' '.join(DEFAULT_LANGUAGES)))
+    parser.add_argument('-n', '--runs', type=int, default=DEFAULT_RUNS,
+                        help='Number of runs for each executable (default: '
+                             '{})'.format(DEFAULT_RUNS))
+    args = parser.parse_args(args)
+    for name in args.languages:
+        if '.' + name.partition('.')[0] not in EMPTY_PROGRAMS:
+            parser.error('language {} is not supported'.format(name))
+
+    try:
+        results = run_benchmark(args.languages, args.runs)
+    except CompileError as exc:
+        print('error: {}'.format(exc), file=sys.stderr)
+        return 1
+    print(format_results(results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
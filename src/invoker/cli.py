@@ -1,49 +1,83 @@
+import json
 import sys
 from pathlib import Path
 from colorama import Fore, Style
 from compat import fspath
 from cli import Subcommand
-from taskbuilder import RepositoryManager
-from invoker import LanguageManager
-from runners import Status
-from .compiler import CompileError
-from .profiled_runner import ProfiledRunner, list_profiles, create_profile
+from runners import Runner, Status, LaunchMode
+from .profiled_runner import list_profiles, format_results
+from .batch import list_tests, format_test_runs, batch_exitcode
+from .batch import output_names
+from .session import Session
+from .stats import repeat_stats, format_repeat_stats
 
 
 class CompileSubcommand(Subcommand):
     def _update_parser(self, parser):
         super()._update_parser(parser)
-        parser.add_argument('src', type=Path,
-                            help='Source file to compile')
-        parser.add_argument('-o', '--exe', type=Path,
-                            help='Output executable')
-        parser.add_argument('-l', '--lang', type=str,
-                            help='Programming language in use '
-                                 '(default: choose by extension)')
+        parser.add_argument('src', type=Path, nargs='+',
+                            help='Source files to compile')
+        parser.add_argument('-o', '--exe', type=Path, action='append',
+                            help='Output executable (must be given once for '
+                                 'each source file)')
+        parser.add_argument('-l', '--lang', type=str, action='append',
+                            help='Programming language in use (default: '
+                                 'choose by extension). Can be given once '
+                                 'for all the sources or once for each '
+                                 'source file')
         parser.add_argument('-L', '--lib', type=Path, action='append',
-                            help='Library to use with the source')
-
-    def run(self, args):
-        # TODO: create global manager to initialize everything
-        # in one command (?)
-        repo_manager = RepositoryManager()
-        language_manager = LanguageManager(repo_manager)
+                            help='Library to use with the sources')
+        parser.add_argument('-j', '--jobs', type=int,
+                            help='Number of sources to compile in parallel '
+                                 '(default: number of processor cores)')
 
-        source = language_manager.create_source(
-            args.src, args.exe, args.lang, args.lib)
-        try:
-            source.compile()
+    @staticmethod
+    def _print_status(exitcode):
+        if exitcode == 0:
             print(Fore.GREEN + Style.BRIGHT + 'ok' + Style.RESET_ALL)
-            print(source.compiler.compiler_output)
-        except CompileError as exc:
+        else:
             print(Fore.RED + Style.BRIGHT + 'compilation error' +
                   Style.RESET_ALL)
-            print(source.compiler.compiler_output)
-            return exc.exitcode
-        return 0
+
+    def _per_source(self, values, src_count, name, allow_single):
+        if values is None:
+            return [None] * src_count
+        if allow_single and len(values) == 1:
+            return values * src_count
+        if len(values) != src_count:
+            self.parser.error('{} must be given once for each source'
+                              .format(name))
+        return values
+
+    def run(self, args):
+        if args.jobs is not None and args.jobs <= 0:
+            self.parser.error('--jobs must be positive')
+        langs = self._per_source(args.lang, len(args.src), '--lang', True)
+        exes = self._per_source(args.exe, len(args.src), '--exe', False)
+
+        session = Session()
+        compile_results = session.compile_many(args.src, exes, langs,
+                                               args.lib, args.jobs)
+
+        if len(compile_results) == 1:
+            compile_result = compile_results[0]
+            self._print_status(compile_result.exitcode)
+            print(compile_result.output)
+            return compile_result.exitcode
+
+        result = 0
+        for compile_result in compile_results:
+            print('{} ({:.2f} s): '.format(fspath(compile_result.src_file),
+                                           compile_result.time), end='')
+            self._print_status(compile_result.exitcode)
+            if compile_result.exitcode != 0:
+                print(compile_result.output)
+                if result == 0:
+                    result = compile_result.exitcode
+        return result
 
     def __init__(self):
-        super().__init__('compile', 'Compile a source file')
+        super().__init__('compile', 'Compile source files')
 
 
 class RunSubcommand(Subcommand):
@@ -62,41 +96,233 @@ class RunSubcommand(Subcommand):
                             help='Enable quiet mode')
         parser.add_argument('-i', '--input', type=str, default='',
                             help='Standard input to pass to the program')
+        parser.add_argument('-I', '--input-file', type=Path,
+                            help='File to pass to the program as standard '
+                                 'input (the program reads it directly, '
+                                 'without copying)')
         parser.add_argument('-p', '--profile', type=str, required=True,
                             choices=list_profiles(),
                             help='Profile used to run the program')
+        parser.add_argument('-T', '--tests', type=Path, nargs='+',
+                            help='Run the program on each of the given input '
+                                 'files (directories are expanded to the '
+                                 'files inside them)')
+        parser.add_argument('-O', '--output-dir', type=Path,
+                            help='Directory to save the output of each test '
+                                 '(used with --tests)')
+        parser.add_argument('-r', '--repeat', type=int,
+                            help='Run the program the given number of times '
+                                 'and print the timing statistics')
+        parser.add_argument('-j', '--jobs', type=int,
+                            help='Number of runs in parallel (used with '
+                                 '--tests, default: number of processor '
+                                 'cores, or with --repeat, default: 1)')
+        parser.add_argument('--isolate', action='store_true',
+                            help='Run each parallel test in its own working '
+                                 'directory with the copies of the executable '
+                                 'and the input file (used with --tests). The '
+                                 'input is copied for each test (reflinked, '
+                                 'if the filesystem supports it), so it costs '
+                                 'the size of the tests in extra writes')
+        parser.add_argument('--supervisor', action='store_true',
+                            help='Run all the tests in one runner process, '
+                                 'which supervises the parallel runs itself '
+                                 '(used with --tests)')
+        parser.add_argument('--trace', type=Path,
+                            help='Sample CPU time and memory usage of the '
+                                 'program during the run and save them into '
+                                 'the given JSON file')
+        parser.add_argument('--trace-interval', type=float, default=0.01,
+                            help='Interval between the samples in seconds '
+                                 '(used with --trace, default: 0.01)')
+        parser.add_argument('--output-limit', type=float,
+                            help='Limit of the files written by the program '
+                                 'in MBytes (default: from the profile)')
+        parser.add_argument('--hash-stdout', action='store_true',
+                            help='Print the SHA-256 digest of the output '
+                                 'instead of the output itself, so the '
+                                 'output is never read into memory')
         parser.add_argument('args', nargs='*', type=str,
                             help='Arguments to pass to the program')
 
-    def run(self, args):
-        repo_manager = RepositoryManager()
-        language_manager = LanguageManager(repo_manager)
+    @staticmethod
+    def _save_trace(trace, trace_file):
+        if trace is None:
+            trace = []
+        trace_json = {'clock-time': [sample.clock_time for sample in trace],
+                      'time': [sample.time for sample in trace],
+                      'rss': [sample.rss for sample in trace],
+                      'vm': [sample.vm for sample in trace]}
+        with trace_file.open('w', encoding='utf8') as out_file:
+            json.dump(trace_json, out_file)
 
-        profile = create_profile(args.profile, repo_manager.repo)
-        runner = ProfiledRunner(profile)
+    @staticmethod
+    def _stdin(args):
+        if args.input_file is not None:
+            return args.input_file
+        return args.input
 
-        cmdline = []
-        if args.lang is None:
-            cmdline = [fspath(args.exe.absolute())] + args.args
-        else:
-            lang = language_manager.get_lang(args.lang)
-            cmdline = lang.run_args(args.exe, args.args)
+    def _run_tests(self, args, session):
+        input_files = list_tests(args.tests)
+        if args.output_dir is not None:
+            if args.output_dir.exists() and not args.output_dir.is_dir():
+                self.parser.error('{} is not a directory'.format(
+                    fspath(args.output_dir)))
+            try:
+                output_names(input_files)
+            except ValueError as exc:
+                self.parser.error(str(exc))
+        try:
+            test_runs = session.run_tests(
+                args.exe, args.profile, input_files, args.output_dir,
+                args.args, args.lang, args.work_dir, args.jobs, args.isolate,
+                args.supervisor, args.output_limit, args.hash_stdout)
+        finally:
+            session.close()
+        if not args.quiet:
+            print(format_test_runs(test_runs))
+        return batch_exitcode(test_runs)
+
+    def _run_repeated(self, args, session):
+        run_results = session.run_repeated(
+            args.exe, args.profile, args.repeat, args.args, args.lang,
+            self._stdin(args), args.work_dir, args.jobs or 1)
+        if not args.quiet:
+            print(format_repeat_stats(repeat_stats(
+                run_result.results for run_result in run_results)))
+        for run_result in run_results:
+            if run_result.exitcode != 0:
+                return run_result.exitcode
+        return 0
+
+    def _check_modes(self, args):
+        if args.tests is None and (args.output_dir is not None or
+                                   args.isolate or args.supervisor):
+            self.parser.error('--output-dir, --isolate and --supervisor '
+                              'require --tests')
+        if args.tests is None and args.repeat is None and \
+                args.jobs is not None:
+            self.parser.error('--jobs requires --tests or --repeat')
+        if args.tests is not None and args.repeat is not None:
+            self.parser.error('--repeat cannot be used with --tests')
+        if args.repeat is not None and args.repeat <= 0:
+            self.parser.error('--repeat must be positive')
+        if args.trace is not None and (args.tests is not None or
+                                       args.repeat is not None):
+            self.parser.error('--trace cannot be used with --tests and '
+                              '--repeat')
+        if args.trace_interval <= 0:
+            self.parser.error('--trace-interval must be positive')
+        if args.isolate and args.work_dir is not None:
+            self.parser.error('--isolate cannot be used with --work-dir')
+        if args.isolate and args.supervisor:
+            self.parser.error('--isolate cannot be used with --supervisor')
+        if args.jobs is not None and args.jobs <= 0:
+            self.parser.error('--jobs must be positive')
 
-        if args.input is not None:
-            runner.stdin = args.input
+    def _check_io(self, args):
+        if args.input_file is not None:
+            if args.input:
+                self.parser.error('--input cannot be used with --input-file')
+            if args.tests is not None:
+                self.parser.error('--input-file cannot be used with --tests')
+            if not args.input_file.is_file():
+                self.parser.error('input file {} not found'.format(
+                    fspath(args.input_file)))
+        if args.output_limit is not None and args.output_limit <= 0:
+            self.parser.error('--output-limit must be positive')
+        if args.repeat is not None and (args.output_limit is not None or
+                                        args.hash_stdout):
+            self.parser.error('--output-limit and --hash-stdout cannot be '
+                              'used with --repeat')
 
-        runner.run(cmdline, args.work_dir)
+    @staticmethod
+    def _print_quiet(args, run_result):
+        if args.hash_stdout:
+            print(run_result.results.stdout_digest)
+        print(run_result.stdout, end='')
+        print(run_result.stderr, end='', file=sys.stderr)
+        status = run_result.results.status
+        if status not in {Status.OK, Status.RUNTIME_ERROR}:
+            print(Fore.RED + Style.BRIGHT + 'error: ' + Style.RESET_ALL +
+                  'program exited with status ' + repr(status),
+                  file=sys.stderr)
+
+    def _run_single(self, args, session):
+        trace_interval = None
+        if args.trace is not None:
+            trace_interval = args.trace_interval
+        run_result = session.run(args.exe, args.profile, args.args,
+                                 args.lang, self._stdin(args), args.work_dir,
+                                 trace_interval, args.output_limit,
+                                 args.hash_stdout)
+        if args.trace is not None:
+            self._save_trace(run_result.results.trace, args.trace)
         if args.quiet:
-            print(runner.stdout, end='')
-            print(runner.stderr, end='', file=sys.stderr)
-            status = runner.results.status
-            if status not in {Status.OK, Status.RUNTIME_ERROR}:
-                print(Fore.RED + Style.BRIGHT + 'error: ' + Style.RESET_ALL +
-                      'program exited with status ' + repr(status),
-                      file=sys.stderr)
+            self._print_quiet(args, run_result)
         else:
-            print(runner.format_results())
-        return runner.get_cli_exitcode()
+            print(format_results(run_result.results, run_result.stdout,
+                                 run_result.stderr))
+        return run_result.exitcode
+
+    def run(self, args):
+        self._check_modes(args)
+        self._check_io(args)
+        session = Session()
+        if args.tests is not None:
+            return self._run_tests(args, session)
+        if args.repeat is not None:
+            return self._run_repeated(args, session)
+        return self._run_single(args, session)
 
     def __init__(self):
         super().__init__('run', 'Run a compiled program')
+
+
+def format_baseline(baseline):
+    lines = ['{:<10} {:>12}'.format('phase', 'median, us')]
+    for phase, value in baseline.phases.items():
+        lines += ['{:<10} {:>12.1f}'.format(phase, 1e6 * value)]
+    lines += ['{:<10} {:>12.1f}'.format('total', 1e6 * sum(
+        baseline.phases.values()))]
+    lines += ['{:<10} {:>12.1f}'.format('launch', 1e6 * (
+        baseline.phases['spawn'] + baseline.phases['exec']))]
+    lines += ['baseline clock time: {:.1f} us, cpu time: {:.1f} us '
+              '(median of {} runs)'.format(1e6 * baseline.clock_time,
+                                           1e6 * baseline.time,
+                                           baseline.runs)]
+    return '\n'.join(lines)
+
+
+class RunnerBenchSubcommand(Subcommand):
+    def _update_parser(self, parser):
+        super()._update_parser(parser)
+        parser.add_argument('-n', '--runs', type=int, default=100,
+                            help='Number of runs (default: 100)')
+        parser.add_argument('-m', '--launch-mode', action='append',
+                            choices=[mode.value for mode in LaunchMode],
+                            help='Launch mode of the program. Can be given '
+                                 'several times to compare the modes '
+                                 '(default: auto)')
+        parser.add_argument('-o', '--output', type=Path,
+                            help='Save the baselines for each launch mode '
+                                 'into the given JSON file')
+
+    def run(self, args):
+        if args.runs <= 0:
+            self.parser.error('--runs must be positive')
+        runner = Runner()
+        baselines = {}
+        for mode in args.launch_mode or ['auto']:
+            baseline = runner.calibrate(args.runs,
+                                        launch_mode=LaunchMode(mode))
+            baselines[mode] = baseline._asdict()
+            print('launch mode: {}'.format(mode))
+            print(format_baseline(baseline))
+        if args.output is not None:
+            with args.output.open('w', encoding='utf8') as out_file:
+                json.dump(baselines, out_file, indent=2)
+        return 0
+
+    def __init__(self):
+        super().__init__('runner-bench', 'Measure the overhead of the runner')
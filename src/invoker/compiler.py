@@ -1,9 +1,9 @@
-import shutil
-from tempfile import mkdtemp
-from pathlib import Path
-from runners import Status
+from runners import Status, scratch_pool
 from compat import fspath
+from .config import config
 from .profiled_runner import ProfiledRunner, CompilerRunProfile
+from .staging import stage_file
+from .libraries import LibraryBuilder, LibraryBuildError
 
 
 class CompileError(Exception):
@@ -17,41 +17,65 @@ class Compiler:
         raise CompileError('Compilation failed:\n' + self.compiler_output,
                            exitcode)
 
-    def __copyfile(self, src, dst):
+    def __stage_file(self, src, dst, allow_link=True):
         try:
-            shutil.copy(fspath(src), fspath(dst))
-        except shutil.SameFileError as exc:
-            pass
+            stage_file(src, dst, allow_link)
         except OSError as exc:
             msg = 'could not copy file \"{}\" due to OS error: {}'
             self.compiler_output = msg.format(fspath(src), exc.strerror)
             self._raise_error()
 
+    def __build_libraries(self, work_dir):
+        if not self.prebuild_libs:
+            return []
+        builder = LibraryBuilder(self.repo, self.language, self.__runner)
+        result = []
+        for library_dir in self.library_dirs:
+            try:
+                archive = builder.build(library_dir, work_dir)
+            except LibraryBuildError as exc:
+                self.compiler_output = ('could not build library \"{}\":\n{}'
+                                        .format(fspath(library_dir), exc))
+                self._raise_error()
+            if archive is not None:
+                result += [archive]
+        return result
+
     def compile(self):
-        if not self.language.compile_args(self.src_file, self.exe_file):
+        try:
+            compile_args = self.language.compile_args(self.src_file,
+                                                      self.exe_file)
+        except FileNotFoundError as exc:
+            self.compiler_output = str(exc)
+            self._raise_error()
+        if not compile_args:
             # just copy the file
             if not self.save_exe:
                 return
-            self.__copyfile(self.src_file, self.exe_file)
+            # the source may be changed later, so it's not linked with exe
+            self.__stage_file(self.src_file, self.exe_file, False)
             return
-        temp_dir = Path(
-            mkdtemp('compilebox', '', fspath(self.repo.internal_dir(True))))
+        temp_dir = self.scratch_pool.acquire()
         try:
             src = temp_dir / self.src_file.name
             exe = temp_dir / self.exe_file.name
-            self.__copyfile(self.src_file, src)
-            self.__runner.run(
-                self.language.compile_args(src, exe, self.library_dirs))
+            if self.exe_in_place and self.save_exe:
+                exe = self.exe_file
+            self.__stage_file(self.src_file, src)
+            library_objects = self.__build_libraries(temp_dir)
+            self.__runner.run(self.language.compile_args(
+                src, exe, self.library_dirs, library_objects))
             self.compiler_output = self.__runner.format_results()
             if self.__runner.results.status != Status.OK:
                 self._raise_error(self.__runner.get_cli_exitcode())
-            if self.save_exe:
-                self.__copyfile(exe, self.exe_file)
+            if self.save_exe and exe != self.exe_file:
+                self.__stage_file(exe, self.exe_file)
         finally:
-            shutil.rmtree(fspath(temp_dir))
+            self.scratch_pool.release(temp_dir)
 
     def __init__(self, repo, language, src_file, exe_file=None,
-                 library_dirs=None, save_exe=True):
+                 library_dirs=None, save_exe=True, exe_in_place=False,
+                 prebuild_libs=None):
         """
         Creates the Compiler object instance
 
@@ -64,6 +88,11 @@ class Compiler:
         library_dirs (list): library paths in use. If None, no library paths
           are used.
         save_exe (bool): if False, exe is not saved to exe_file and is removed
+        exe_in_place (bool): if True, the compiler writes exe directly into
+          exe_file instead of the sandbox, so it's not staged afterwards
+        prebuild_libs (bool): if True, the sources in library_dirs are built
+          into static archives once and linked into exe (see LibraryBuilder).
+          If None, the value from the config is used.
         """
         self.repo = repo
         self.language = language
@@ -77,6 +106,11 @@ class Compiler:
         self.__runner = ProfiledRunner(CompilerRunProfile(repo))
         self.compiler_output = ''
         self.save_exe = save_exe
+        self.exe_in_place = exe_in_place
+        if prebuild_libs is None:
+            prebuild_libs = config()['compiler']['prebuild-libs']
+        self.prebuild_libs = prebuild_libs
+        self.scratch_pool = scratch_pool(config()['compiler']['scratch-dir'])
 
 
 def detect_language(repo, lang_list, src_file, library_dirs=None):
@@ -5,19 +5,36 @@ DEFAULT_CONFIG = '''[compiler]
 time-limit: float = 30.0
 # Compilation memory limits (in MBytes)
 memory-limit: float = 512.0
+# Limit of the files written by the compiler (in MBytes, null means no limit)
+output-limit: float = null
+# Directory for compilation sandboxes (if null, the runner scratch directory
+# is used). The sources and executables are linked between the sandbox and
+# the task only if they are on the same filesystem, otherwise they are copied
+scratch-dir: string = null
+# If true, the sources (e.g. *.cpp) in library directories are compiled once
+# into static archives in .taker/libs/ and linked into each program, instead
+# of being recompiled. The archives are rebuilt when the library changes.
+# Header-only libraries (like testlib.h) have nothing to prebuild, so they are
+# still parsed by each compilation
+prebuild-libs: bool = false
 
-# You can set time/memory limit for other executables here
+# You can set time/memory limit for other executables here. output-limit
+# (in MBytes) limits the size of the files written by the program (if null,
+# the size is not limited)
 [checker]
 time-limit: float = 10.0
 memory-limit: float = 512.0
+output-limit: float = null
 
 [validator]
 time-limit: float = 10.0
 memory-limit: float = 512.0
+output-limit: float = null
 
 [generator]
 time-limit: float = 10.0
 memory-limit: float = 512.0
+output-limit: float = null
 
 # You can define your own languages here:
 # Example:
@@ -26,6 +43,17 @@ memory-limit: float = 512.0
 # run-args = ['{exe}']
 # priority = 0
 # exe-ext = '.myexe'
+# link-args = ['-lm']
+# static = true
+# static-args = ['-static']
+# object-args = ['g++', '-c', '{src}', '-o', '{exe}', '-O2', '-I{lib}']
+# archive-args = ['ar', 'rcs', '{exe}']
+#
+# link-args are added after compile-args. If static is true, static-args are
+# also added to link the executable statically, which reduces the startup
+# time of each run. The predefined C/C++ languages use ['-static'] as
+# static-args, so it's enough to set "static = true" for them. object-args
+# and archive-args are used to prebuild libraries (see prebuild-libs)
 
 # To disable the existing one, use
 # [lang/c++.gcc]
@@ -0,0 +1,149 @@
+'''
+Client for GNU make jobserver
+
+When taker is run from make with -j, make advertises the jobserver in
+MAKEFLAGS (--jobserver-auth=R,W or --jobserver-fds=R,W for the pipe
+inherited as file descriptors, --jobserver-auth=fifo:PATH for the named
+pipe). Each process started by make owns one implicit token, and must read
+one more token from the jobserver before starting each additional job. The
+token is written back when the job is finished, so the total number of jobs
+stays within make's -j limit.
+'''
+import os
+import select
+import stat
+import threading
+from collections import namedtuple
+
+JobServerAuth = namedtuple('JobServerAuth', ['read_fd', 'write_fd', 'fifo'])
+
+
+class JobServerError(Exception):
+    pass
+
+
+def parse_makeflags(makeflags):
+    '''Returns JobServerAuth from MAKEFLAGS value, or None if the jobserver
+    is not advertised there'''
+    result = None
+    for flag in makeflags.split():
+        for prefix in ['--jobserver-auth=', '--jobserver-fds=']:
+            if not flag.startswith(prefix):
+                continue
+            value = flag[len(prefix):]
+            if value.startswith('fifo:'):
+                result = JobServerAuth(None, None, value[len('fifo:'):])
+                continue
+            read_fd, _, write_fd = value.partition(',')
+            try:
+                result = JobServerAuth(int(read_fd), int(write_fd), None)
+            except ValueError as exc:
+                raise JobServerError(
+                    'invalid jobserver auth: ' + value) from exc
+    return result
+
+
+def _check_pipe(fd):
+    try:
+        return stat.S_ISFIFO(os.fstat(fd).st_mode)
+    except OSError:
+        return False
+
+
+class JobServer:
+    '''Connection to the jobserver
+
+    acquire() returns the token to run one job and release() returns it
+    back. The implicit token of the process is handed out first (it's
+    represented as None), so the process runs one job without reading the
+    jobserver at all'''
+
+    def acquire(self):
+        with self.__lock:
+            if self.__implicit_free:
+                self.__implicit_free = False
+                return None
+        while True:
+            select.select([self.read_fd], [], [])
+            try:
+                token = os.read(self.read_fd, 1)
+            except (BlockingIOError, InterruptedError):
+                # other process has taken the token, wait for the next one
+                continue
+            if not token:
+                raise JobServerError('jobserver is closed')
+            return token
+
+    def acquire_many(self, count):
+        '''Returns the list of up to count tokens. Waits for the first one
+        (see acquire()), but takes the others only if they are available
+        right away'''
+        tokens = [self.acquire()]
+        while len(tokens) < count:
+            with self.__lock:
+                implicit_free = self.__implicit_free
+                self.__implicit_free = False
+            if implicit_free:
+                tokens += [None]
+                continue
+            ready, _, _ = select.select([self.read_fd], [], [], 0)
+            if not ready:
+                break
+            try:
+                token = os.read(self.read_fd, 1)
+            except (BlockingIOError, InterruptedError):
+                break
+            if not token:
+                break
+            tokens += [token]
+        return tokens
+
+    def release(self, token):
+        if token is None:
+            with self.__lock:
+                self.__implicit_free = True
+            return
+        os.write(self.write_fd, token)
+
+    def __init__(self, auth):
+        if auth.fifo is not None:
+            try:
+                fd = os.open(auth.fifo, os.O_RDWR | os.O_NONBLOCK)
+            except OSError as exc:
+                raise JobServerError('cannot open jobserver fifo: {}'
+                                     .format(exc.strerror)) from exc
+            self.read_fd = self.write_fd = fd
+        else:
+            self.read_fd = auth.read_fd
+            self.write_fd = auth.write_fd
+            # make doesn't pass the descriptors to the commands it doesn't
+            # consider recursive, so they can be closed or reused
+            if not (_check_pipe(self.read_fd) and
+                    _check_pipe(self.write_fd)):
+                raise JobServerError('jobserver descriptors are unavailable')
+        self.__lock = threading.Lock()
+        self.__implicit_free = True
+
+
+__JOBSERVERS = {}
+__JOBSERVERS_LOCK = threading.Lock()
+
+
+def jobserver():
+    '''Returns the JobServer advertised in MAKEFLAGS, or None if taker is
+    not run under make with jobserver. If the jobserver is advertised, but
+    cannot be used, JobServerError is raised. The jobserver is shared in the
+    whole process, so the implicit token is taken by one thread only'''
+    makeflags = os.environ.get('MAKEFLAGS', '')
+    with __JOBSERVERS_LOCK:
+        if makeflags not in __JOBSERVERS:
+            try:
+                auth = parse_makeflags(makeflags)
+                server = JobServer(auth) if auth is not None else None
+            except JobServerError as exc:
+                server = exc
+            __JOBSERVERS[makeflags] = server
+        server = __JOBSERVERS[makeflags]
+    if isinstance(server, JobServerError):
+        raise server
+    return server
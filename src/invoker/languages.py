@@ -4,6 +4,17 @@ from .config import config
 from .utils import is_valid_ext, default_exe_ext
 
 
+# Compiles the source (argv[1]) into bytecode (argv[2]). The source name
+# without the directory is used in tracebacks, as the compilation is done in
+# a temporary directory
+PY_COMPILE_SCRIPT = ('import os, py_compile, sys; '
+                     'py_compile.compile(sys.argv[1], sys.argv[2], '
+                     'os.path.basename(sys.argv[1]), True)')
+
+
+DEFAULT_ARCHIVE_ARGS = ['ar', 'rcs', '{exe}']
+
+
 class LanguageError(Exception):
     pass
 
@@ -21,6 +32,24 @@ class Language:
     def _run_args_template(self):
         return self._lang_section().get('run-args')
 
+    def _link_args_template(self):
+        return self._lang_section().get('link-args')
+
+    def _static_args_template(self):
+        return self._lang_section().get('static-args')
+
+    def _object_args_template(self):
+        return self._lang_section().get('object-args')
+
+    def _archive_args_template(self):
+        return self._lang_section().get('archive-args')
+
+    def library_signature(self):
+        '''Returns the string which identifies how the libraries are prebuilt
+        with this language (see object_args() and archive_args())'''
+        return repr((self._object_args_template(),
+                     self._archive_args_template()))
+
     def get_extensions(self):
         return ['.' + self.name.partition('.')[0]]
 
@@ -32,20 +61,12 @@ class Language:
                                     .format(args[0]))
         args[0] = first_arg
 
-    def compile_args(self, src_file, exe_file, library_dirs=[]):
-        src_file = src_file.absolute()
-        exe_file = exe_file.absolute()
-        args_template = self._compile_args_template()
-        if not args_template:
-            return None
+    @staticmethod
+    def _expand_args(args_template, mapping, library_dirs):
         res = []
         # FIXME : support {curly braces} inside the templates
         # currently arguments like '{a{lib}b}' will be expanded
         # with library locations, at it were just with '{lib}'
-        mapping = {
-            'src': fspath(src_file),
-            'exe': fspath(exe_file),
-        }
         for arg in args_template:
             if arg.find('{lib}') >= 0:
                 for lib in library_dirs:
@@ -53,6 +74,59 @@ class Language:
                     res += [arg.format_map(mapping)]
                 continue
             res += [arg.format_map(mapping)]
+        return res
+
+    def compile_args(self, src_file, exe_file, library_dirs=None,
+                     library_objects=None):
+        '''Returns the arguments to compile src_file into exe_file. The
+        prebuilt library_objects (see object_args()) are linked into exe_file
+        and placed before link-args'''
+        if library_dirs is None:
+            library_dirs = []
+        if library_objects is None:
+            library_objects = []
+        src_file = src_file.absolute()
+        exe_file = exe_file.absolute()
+        args_template = self._compile_args_template()
+        if not args_template:
+            return None
+        mapping = {
+            'src': fspath(src_file),
+            'exe': fspath(exe_file),
+        }
+        res = self._expand_args(args_template, mapping, library_dirs)
+        res += [fspath(obj.absolute()) for obj in library_objects]
+        link_template = list(self._link_args_template() or [])
+        if self.static:
+            link_template += self._static_args_template() or []
+        res += self._expand_args(link_template, mapping, library_dirs)
+        self._finalize_arglist(res)
+        return res
+
+    def object_args(self, src_file, obj_file, library_dirs=None):
+        '''Returns the arguments to compile src_file into object file
+        obj_file, or None if the language cannot build object files'''
+        if library_dirs is None:
+            library_dirs = []
+        args_template = self._object_args_template()
+        if not args_template:
+            return None
+        mapping = {
+            'src': fspath(src_file.absolute()),
+            'exe': fspath(obj_file.absolute()),
+        }
+        res = self._expand_args(args_template, mapping, library_dirs)
+        self._finalize_arglist(res)
+        return res
+
+    def archive_args(self, archive_file, obj_files):
+        '''Returns the arguments to pack obj_files into archive_file'''
+        args_template = self._archive_args_template()
+        if not args_template:
+            args_template = DEFAULT_ARCHIVE_ARGS
+        mapping = {'exe': fspath(archive_file.absolute())}
+        res = [arg.format_map(mapping) for arg in args_template]
+        res += [fspath(obj.absolute()) for obj in obj_files]
         self._finalize_arglist(res)
         return res
 
@@ -72,6 +146,8 @@ class Language:
     def __init__(self, name, priority=0, exe_ext=None):
         self.name = name
         self.is_active = self._lang_section().get('active', True)
+        # if True, static-args are added to link the executable statically
+        self.static = self._lang_section().get('static', False)
 
         self.priority = self._lang_section().get('priority')
         if self.priority is None:
@@ -99,11 +175,25 @@ class PredefinedLanguage(Language):
             return res
         return self.__run_args_template
 
+    def _static_args_template(self):
+        res = super()._static_args_template()
+        if res is not None:
+            return res
+        return self.__static_args_template
+
+    def _object_args_template(self):
+        res = super()._object_args_template()
+        if res is not None:
+            return res
+        return self.__object_args_template
+
     def __init__(self, name, priority=0, exe_ext=None, compile_args=None,
-                 run_args=None):
+                 run_args=None, static_args=None, object_args=None):
         super().__init__(name, priority, exe_ext)
         self.__compile_args_template = compile_args
         self.__run_args_template = run_args
+        self.__static_args_template = static_args
+        self.__object_args_template = object_args
 
 
 class LanguageManagerBase:
@@ -155,35 +245,23 @@ class LanguageManagerBase:
         if (which(cpp_compiler) is None) and (which('clang++') is not None):
             cpp_compiler = 'clang++'
 
-        self.add_language(PredefinedLanguage(
-            'c.gcc',
-            priority=1000,
-            compile_args=[c_compiler, '{src}', '-o', '{exe}', '-O2', '-I{lib}']
-        ))
-        self.add_language(PredefinedLanguage(
-            'cpp.g++',
-            priority=1000,
-            compile_args=[cpp_compiler, '{src}', '-o', '{exe}', '-O2',
-                          '-I{lib}']
-        ))
-        self.add_language(PredefinedLanguage(
-            'cpp.g++11',
-            priority=1100,
-            compile_args=[cpp_compiler, '{src}', '-o', '{exe}', '-O2',
-                          '--std=c++11', '-I{lib}']
-        ))
-        self.add_language(PredefinedLanguage(
-            'cpp.g++14',
-            priority=1200,
-            compile_args=[cpp_compiler, '{src}', '-o', '{exe}', '-O2',
-                          '--std=c++14', '-I{lib}']
-        ))
-        self.add_language(PredefinedLanguage(
-            'cpp.g++17',
-            priority=1300,
-            compile_args=[cpp_compiler, '{src}', '-o', '{exe}', '-O2',
-                          '--std=c++17', '-I{lib}']
-        ))
+        def add_gcc_like(name, priority, compiler, flags):
+            self.add_language(PredefinedLanguage(
+                name,
+                priority=priority,
+                compile_args=[compiler, '{src}', '-o', '{exe}'] + flags,
+                object_args=[compiler, '-c', '{src}', '-o', '{exe}'] + flags,
+                static_args=['-static']
+            ))
+
+        add_gcc_like('c.gcc', 1000, c_compiler, ['-O2', '-I{lib}'])
+        add_gcc_like('cpp.g++', 1000, cpp_compiler, ['-O2', '-I{lib}'])
+        add_gcc_like('cpp.g++11', 1100, cpp_compiler,
+                     ['-O2', '--std=c++11', '-I{lib}'])
+        add_gcc_like('cpp.g++14', 1200, cpp_compiler,
+                     ['-O2', '--std=c++14', '-I{lib}'])
+        add_gcc_like('cpp.g++17', 1300, cpp_compiler,
+                     ['-O2', '--std=c++17', '-I{lib}'])
         self.add_language(PredefinedLanguage(
             'pas.fpc',
             priority=1000,
@@ -192,14 +270,18 @@ class LanguageManagerBase:
         self.add_language(PredefinedLanguage(
             'py.py2',
             priority=1000,
-            exe_ext='.py',
-            run_args=['python2', '{exe}']
+            exe_ext='.pyc',
+            compile_args=['python2', '-E', '-s', '-S', '-c',
+                          PY_COMPILE_SCRIPT, '{src}', '{exe}'],
+            run_args=['python2', '-E', '-s', '-S', '{exe}']
         ))
         self.add_language(PredefinedLanguage(
             'py.py3',
             priority=1100,
-            exe_ext='.py',
-            run_args=['python3', '{exe}']
+            exe_ext='.pyc',
+            compile_args=['python3', '-I', '-S', '-c', PY_COMPILE_SCRIPT,
+                          '{src}', '{exe}'],
+            run_args=['python3', '-I', '-S', '{exe}']
         ))
         # TODO : add more languages!
 
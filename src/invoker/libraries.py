@@ -0,0 +1,128 @@
+import hashlib
+from pathlib import Path
+from compat import fspath
+from runners import Status
+from .staging import stage_file
+
+LIBS_DIR = 'libs'
+ARCHIVE_EXT = '.a'
+
+
+class LibraryBuildError(Exception):
+    pass
+
+
+def _library_files(library_dir):
+    return sorted(item for item in Path(library_dir).rglob('*')
+                  if item.is_file())
+
+
+def library_digest(language, library_dir):
+    '''Returns the digest of everything which affects the prebuilt library:
+    the language with its arguments and the contents of all the files in
+    library_dir (including the headers)'''
+    digest = hashlib.sha256()
+    digest.update(language.name.encode())
+    digest.update(language.library_signature().encode())
+    for the_file in _library_files(library_dir):
+        rel_name = fspath(the_file.relative_to(library_dir))
+        digest.update(b'\0' + rel_name.encode() + b'\0')
+        digest.update(the_file.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class LibraryBuilder:
+    '''Builds the sources in library directories into static archives once,
+    so they are linked into each program instead of being recompiled
+
+    The archives are stored in .taker/libs/ of the repository. Each archive
+    name contains the key of the library path (so the libraries with the same
+    directory name don't clash) and the digest of the library and the
+    language, so the archive is rebuilt only when the library sources or
+    compile arguments change
+
+    Only the sources are prebuilt, so the header-only libraries (like
+    testlib.h) gain nothing from it. Precompiling their headers is out of
+    scope: the precompiled header must be built with the same flags as each
+    program and is bound to one compiler, so it doesn't fit the archives
+    shared by all the programs of the language'''
+
+    def library_sources(self, library_dir):
+        '''Returns the files in library_dir which are built into the archive
+        (the ones with the extensions of the language). The headers are not
+        among them, so a header-only library has no sources'''
+        extensions = set(self.language.get_extensions())
+        return [item for item in _library_files(library_dir)
+                if item.suffix in extensions]
+
+    def __archive_prefix(self, library_dir):
+        path_key = hashlib.sha256(fspath(library_dir).encode()).hexdigest()
+        return '{}-{}-'.format(library_dir.name, path_key[:8])
+
+    def __archive_dir(self):
+        return self.repo.internal_dir(True) / LIBS_DIR / self.language.name
+
+    def archive_path(self, library_dir):
+        library_dir = Path(library_dir).absolute()
+        return self.__archive_dir() / '{}{}{}'.format(
+            self.__archive_prefix(library_dir),
+            library_digest(self.language, library_dir), ARCHIVE_EXT)
+
+    def __outdated_archives(self, library_dir, archive):
+        '''Returns the archives of the same library built from the other
+        versions of its sources'''
+        if not archive.parent.is_dir():
+            return []
+        prefix = self.__archive_prefix(library_dir)
+        return [item for item in archive.parent.iterdir()
+                if item.name.startswith(prefix) and
+                item.suffix == ARCHIVE_EXT and item != archive]
+
+    def __run(self, args):
+        self.runner.run(args)
+        self.output = self.runner.format_results()
+        return self.runner.results.status == Status.OK
+
+    def build(self, library_dir, work_dir):
+        '''Returns the archive with the library built from library_dir, or
+        None if the library has no sources to build. The objects are compiled
+        in work_dir. If the compilation fails, None is returned and the
+        compiler output is kept in output'''
+        library_dir = Path(library_dir).absolute()
+        sources = self.library_sources(library_dir)
+        if not sources:
+            return None
+        archive = self.archive_path(library_dir)
+        if archive.is_file():
+            return archive
+        # the archives which are replaced by this build are found before it,
+        # so the ones built concurrently are not removed
+        outdated = self.__outdated_archives(library_dir, archive)
+        objects = []
+        for index, source in enumerate(sources):
+            obj = Path(work_dir) / '{}-{}.o'.format(index, source.stem)
+            args = self.language.object_args(source, obj, [library_dir])
+            if args is None:
+                return None
+            if not self.__run(args):
+                raise LibraryBuildError(self.output)
+            objects += [obj]
+        temp_archive = Path(work_dir) / archive.name
+        if not self.__run(self.language.archive_args(temp_archive, objects)):
+            raise LibraryBuildError(self.output)
+        # the archive is replaced atomically, as the same library can be
+        # built by several compilers in parallel
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        stage_file(temp_archive, archive)
+        for item in outdated:
+            try:
+                item.unlink()
+            except FileNotFoundError:
+                pass
+        return archive
+
+    def __init__(self, repo, language, runner):
+        self.repo = repo
+        self.language = language
+        self.runner = runner
+        self.output = ''
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .jobserver import jobserver, JobServerError
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+def parallel_map(func, items, jobs=None):
+    '''Calls func for each of the items using up to jobs worker threads and
+    returns the results in the same order as items
+
+    Threads are enough here, as the real work is done by the child processes
+    (runners, compilers), and the workers only wait for them
+
+    If taker is run by make with jobserver, each call takes a token from the
+    jobserver, so make's -j limit is not exceeded. If the jobserver is
+    advertised, but cannot be used, the items are processed one by one'''
+    items = list(items)
+    if jobs is None:
+        jobs = default_jobs()
+    jobs = max(1, min(jobs, len(items)))
+    server = None
+    if jobs > 1:
+        try:
+            server = jobserver()
+        except JobServerError:
+            jobs = 1
+    if jobs == 1:
+        return [func(item) for item in items]
+
+    def run_item(item):
+        token = server.acquire() if server is not None else None
+        try:
+            return func(item)
+        finally:
+            if server is not None:
+                server.release(token)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(run_item, items))
+
+
+@contextmanager
+def reserved_jobs(jobs=None):
+    '''Reserves up to jobs concurrent jobs for one child process which runs
+    them itself (like the supervising runner), and yields their number, which
+    is at least 1
+
+    If taker is run by make with jobserver, one token is taken for each job
+    (the first one is waited for, the others are taken only if available),
+    and the tokens are returned on exit. If the jobserver is advertised, but
+    cannot be used, only one job is reserved'''
+    if jobs is None:
+        jobs = default_jobs()
+    jobs = max(1, jobs)
+    server = None
+    if jobs > 1:
+        try:
+            server = jobserver()
+        except JobServerError:
+            jobs = 1
+    if server is None:
+        yield jobs
+        return
+    tokens = server.acquire_many(jobs)
+    try:
+        yield len(tokens)
+    finally:
+        for token in tokens:
+            server.release(token)
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from runners import Runner, IsolatePolicy, Status
+from runners import Runner, IsolatePolicy, Status, is_path
 from .config import config
 
 # now the isolation is bound to the task directory
@@ -32,6 +32,8 @@ class ConfigRunProfile(AbstractRunProfile):
     def update_runner(self, runner):
         runner.parameters.time_limit = self._config_section()['time-limit']
         runner.parameters.memory_limit = self._config_section()['memory-limit']
+        runner.parameters.output_limit = self._config_section().get(
+            'output-limit')
         runner.parameters.isolate_dir = self.repository.directory
         runner.parameters.isolate_policy = IsolatePolicy.NORMAL
         runner.parameters.working_dir = Path(os.path.dirname(
@@ -107,6 +109,47 @@ register_profile(ValidatorRunProfile)
 register_profile(GeneratorRunProfile)
 
 
+def format_results(results, stdout, stderr):
+    signal = ''
+    if results.signal != 0:
+        if results.signal_name:
+            signal = 'signal: {} ({})\n'.format(results.signal,
+                                                results.signal_name)
+        else:
+            signal = 'signal: {}\n'.format(results.signal)
+    comment = results.comment
+    rusage = ''
+    if results.rusage is not None:
+        rusage = ('max rss: {} MiB\n'
+                  'context switches: {} voluntary, {} involuntary\n'
+                  'page faults: {} minor, {} major\n'
+                  'block i/o: {} input, {} output\n').format(*results.rusage)
+    digest = ''
+    if results.stdout_digest is not None:
+        digest = 'stdout digest: {}\n'.format(results.stdout_digest)
+    counters = ''
+    if results.counters:
+        counters = ''.join('{}: {}\n'.format(name, value)
+                           for name, value in sorted(results.counters.items()))
+    msg = ('stdout:\n{}\n{}stderr:\n{}\ntime: {} sec\nmemory: {} MiB\n'
+           '{}{}exitcode: {}\n{}status: {}\n{}')
+    msg = msg.format(stdout, digest, stderr, results.time, results.memory,
+                     rusage, counters, results.exitcode, signal,
+                     repr(results.status),
+                     'comment: ' + comment + '\n' if comment else '')
+    return msg
+
+
+def cli_exitcode(results):
+    if results.exitcode != 0:
+        return results.exitcode
+    if results.signal != 0:
+        return 128 + results.signal
+    if results.status != Status.OK:
+        return 1
+    return 0
+
+
 class ProfiledRunner:
     @property
     def results(self):
@@ -131,7 +174,12 @@ class ProfiledRunner:
     def all_output(self):
         return self.stdout + self.stderr
 
-    def run(self, cmdline, working_dir=None):
+    @property
+    def runner(self):
+        return self.__runner
+
+    def prepare(self, cmdline, working_dir=None):
+        '''Sets up the runner parameters to run cmdline with the profile'''
         for arg in cmdline:
             assert isinstance(arg, str)
         executable = os.path.abspath(cmdline[0])
@@ -139,38 +187,36 @@ class ProfiledRunner:
             raise FileNotFoundError(executable)
         self.__runner.parameters.executable = executable
         self.__runner.parameters.args = cmdline[1:]
+        self.__runner.pass_stdin = False
         self.profile.update_runner(self.__runner)
+        # the input file is passed to the program directly, so it doesn't
+        # depend on the profile
+        if is_path(self.stdin):
+            self.__runner.pass_stdin = True
+        self.__runner.parameters.trace_interval = self.trace_interval
+        if self.output_limit is not None:
+            self.__runner.parameters.output_limit = self.output_limit
+        self.__runner.parameters.hash_stdout = self.hash_stdout or None
         if working_dir is not None:
             self.__runner.parameters.working_dir = working_dir
+
+    def run(self, cmdline, working_dir=None):
+        self.prepare(cmdline, working_dir)
         self.__runner.run()
 
     def format_results(self):
-        signal = ''
-        if self.results.signal != 0:
-            if self.results.signal_name:
-                signal = 'signal: {} ({})\n'.format(self.results.signal,
-                                                    self.results.signal_name)
-            else:
-                signal = 'signal: {}\n'.format(self.results.signal)
-        comment = self.results.comment
-        msg = ('stdout:\n{}\nstderr:\n{}\ntime: {} sec\nmemory: {} MiB\n'
-               'exitcode: {}\n{}status: {}\n{}')
-        msg = msg.format(self.stdout, self.stderr, self.results.time,
-                         self.results.memory, self.results.exitcode,
-                         signal, repr(self.results.status),
-                         'comment: ' + comment + '\n' if comment else '')
-        return msg
+        return format_results(self.results, self.stdout, self.stderr)
 
     def get_cli_exitcode(self):
         '''Returns the exitcode that will be used in CLI subcommands'''
-        if self.results.exitcode != 0:
-            return self.results.exitcode
-        if self.results.signal != 0:
-            return 128 + self.results.signal
-        if self.results.status != Status.OK:
-            return 1
-        return 0
+        return cli_exitcode(self.results)
 
     def __init__(self, profile=None, runner_path=None):
         self.profile = profile
+        self.trace_interval = None
+        # output_limit overrides the limit from the profile (if not None).
+        # With hash_stdout, only the digest of the captured stdout is computed
+        # (see Results.stdout_digest), and stdout itself is not read
+        self.output_limit = None
+        self.hash_stdout = False
         self.__runner = Runner(runner_path)
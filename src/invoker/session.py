@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+from compat import fspath
+from taskbuilder import RepositoryManager
+from .batch import BatchRunner
+from .compiler import CompileError
+from .manager import LanguageManager
+from .parallel import parallel_map
+from .profiled_runner import ProfiledRunner, create_profile
+
+CompileResult = namedtuple('CompileResult',
+                           ['src_file', 'exe_file', 'language', 'exitcode',
+                            'output', 'time'])
+
+RunResult = namedtuple('RunResult',
+                       ['results', 'stdout', 'stderr', 'exitcode'])
+
+
+class Session:
+    '''Programmatic interface to compile and run the programs in the task
+
+    Unlike the CLI subcommands, the session keeps the managers, the profiles
+    and the runners between the calls, returns the structured results and
+    never exits the interpreter. The session can be used from multiple
+    threads.'''
+
+    def __profile(self, name):
+        with self.__lock:
+            if name not in self.__profiles:
+                self.__profiles[name] = create_profile(name, self.repo)
+            return self.__profiles[name]
+
+    def __runner_pool(self, profile):
+        with self.__lock:
+            return self.__runners.setdefault(profile, queue.Queue())
+
+    @contextmanager
+    def __runner(self, profile):
+        pool = self.__runner_pool(profile)
+        try:
+            runner = pool.get_nowait()
+        except queue.Empty:
+            runner = ProfiledRunner(self.__profile(profile), self.runner_path)
+        try:
+            yield runner
+        finally:
+            pool.put(runner)
+
+    def __batch_runner(self, profile, isolate, supervisor, output_limit,
+                       hash_stdout):
+        run_profile = self.__profile(profile)
+        with self.__lock:
+            key = profile, isolate, supervisor, output_limit, hash_stdout
+            if key not in self.__batch_runners:
+                self.__batch_runners[key] = BatchRunner(
+                    run_profile, runner_path=self.runner_path,
+                    isolate=isolate, supervisor=supervisor,
+                    output_limit=output_limit, hash_stdout=hash_stdout)
+            return self.__batch_runners[key]
+
+    def create_source(self, src_file, exe_file=None, language=None,
+                      library_dirs=None):
+        return self.language_manager.create_source(
+            src_file, exe_file, language, library_dirs)
+
+    @staticmethod
+    def _compile_source(source):
+        start_time = time.perf_counter()
+        exitcode = 0
+        try:
+            source.compile()
+        except CompileError as exc:
+            exitcode = exc.exitcode
+        return CompileResult(src_file=source.src_file,
+                             exe_file=source.exe_file,
+                             language=source.language.name,
+                             exitcode=exitcode,
+                             output=source.compiler.compiler_output,
+                             time=time.perf_counter() - start_time)
+
+    def compile(self, src_file, exe_file=None, language=None,
+                library_dirs=None):
+        '''Compiles src_file and returns CompileResult. The compilation
+        errors are not raised, non-zero exitcode is returned instead'''
+        return self._compile_source(self.create_source(
+            src_file, exe_file, language, library_dirs))
+
+    def compile_many(self, src_files, exe_files=None, languages=None,
+                     library_dirs=None, jobs=None):
+        '''Compiles src_files in parallel, returns the list of CompileResult
+        in the same order. exe_files and languages are either None or the
+        lists with one item per source'''
+        src_files = list(src_files)
+        if exe_files is None:
+            exe_files = [None] * len(src_files)
+        if languages is None:
+            languages = [None] * len(src_files)
+        sources = [self.create_source(src, exe, lang, library_dirs)
+                   for src, exe, lang in zip(src_files, exe_files, languages)]
+        return parallel_map(self._compile_source, sources, jobs)
+
+    def run_args(self, exe_file, args=None, language=None):
+        '''Returns the command line to run exe_file. If language is None, the
+        file is treated as independent executable. exe_file can be str or
+        Path'''
+        exe_file = Path(exe_file)
+        if args is None:
+            args = []
+        if language is None:
+            return [fspath(exe_file.absolute())] + args
+        if isinstance(language, str):
+            language = self.language_manager.get_lang(language)
+        return language.run_args(exe_file, args)
+
+    def run(self, exe_file, profile, args=None, language=None, stdin='',
+            working_dir=None, trace_interval=None, output_limit=None,
+            hash_stdout=False):
+        '''Runs exe_file with the given profile name and returns RunResult.
+        stdin can be str, bytes-like or a path to the input file, which is
+        passed to the program without copying. If trace_interval is not None,
+        the memory and CPU time of the program are sampled with this interval
+        (in seconds) into results.trace. output_limit (in MBytes) overrides
+        the limit of the profile. If hash_stdout is True, only the digest of
+        stdout is returned in results.stdout_digest, and stdout is empty'''
+        cmdline = self.run_args(exe_file, args, language)
+        with self.__runner(profile) as runner:
+            runner.stdin = stdin
+            runner.trace_interval = trace_interval
+            runner.output_limit = output_limit
+            runner.hash_stdout = hash_stdout
+            runner.run(cmdline, working_dir)
+            return RunResult(results=runner.results, stdout=runner.stdout,
+                             stderr=runner.stderr,
+                             exitcode=runner.get_cli_exitcode())
+
+    def run_repeated(self, exe_file, profile, repeat, args=None,
+                     language=None, stdin='', working_dir=None, jobs=1):
+        '''Runs exe_file repeat times and returns the list of RunResult (see
+        repeat_stats() to summarize them). By default, the runs are
+        sequential, so they don't disturb each other's timings'''
+
+        def run_one(_):
+            return self.run(exe_file, profile, args, language, stdin,
+                            working_dir)
+
+        return parallel_map(run_one, range(repeat), jobs)
+
+    def run_tests(self, exe_file, profile, input_files, output_dir=None,
+                  args=None, language=None, working_dir=None, jobs=None,
+                  isolate=False, supervisor=False, output_limit=None,
+                  hash_stdout=False):
+        '''Runs exe_file on each of input_files in parallel, returns the list
+        of TestRun. If isolate is True, each parallel slot runs the program in
+        its own working directory. If supervisor is True, all the tests are
+        run by one runner process. See BatchRunner for output_limit and
+        hash_stdout'''
+        cmdline = self.run_args(exe_file, args, language)
+        return self.__batch_runner(
+            profile, isolate, supervisor, output_limit, hash_stdout).run(
+                cmdline, input_files, output_dir, working_dir, jobs, exe_file)
+
+    def close(self):
+        '''Releases the working directories held by the session'''
+        with self.__lock:
+            batch_runners = list(self.__batch_runners.values())
+            self.__batch_runners.clear()
+        for batch_runner in batch_runners:
+            batch_runner.close()
+
+    def __init__(self, task_dir=None, search_dir=None, runner_path=None):
+        self.repo_manager = RepositoryManager(task_dir=task_dir,
+                                              search_dir=search_dir)
+        self.repo = self.repo_manager.repo
+        self.language_manager = LanguageManager(self.repo_manager)
+        self.runner_path = runner_path
+        self.__lock = threading.Lock()
+        self.__profiles = {}
+        self.__runners = {}
+        self.__batch_runners = {}
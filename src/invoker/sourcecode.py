@@ -13,7 +13,7 @@ class SourceCode:
         self.runner.run(self.language.run_args(self.exe_file, custom_args),
                         working_dir)
 
-    def add_compile_rule(self):
+    def add_compile_rule(self, group=None):
         try:
             if self.src_file.resolve() == self.exe_file.resolve():
                 return None
@@ -22,7 +22,7 @@ class SourceCode:
             # if we don't catch FileNotFoundError, it will fail tests on Py3.5
             pass
         makefile = self.repo_manager.makefile
-        rule = makefile.add_file_rule(self.exe_file)
+        rule = makefile.add_file_rule(self.exe_file, group=group)
         args = ['compile', OutputFile(self.exe_file, prefix='--exe='),
                 '--lang=' + self.language.name]
         for dir in self.library_dirs:
@@ -0,0 +1,91 @@
+import binascii
+import errno
+import os
+import shutil
+from compat import fspath
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl to clone the file contents (_IOW(0x94, 9, int) in linux/fs.h)
+FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    '''Creates dst which shares the data blocks with src (copy-on-write). It
+    is supported by some filesystems (e.g. Btrfs, XFS), OSError is raised on
+    the other ones'''
+    if fcntl is None or not hasattr(fcntl, 'ioctl'):
+        raise OSError(errno.EOPNOTSUPP, 'reflinks are not supported')
+    with open(fspath(src), 'rb') as src_file:
+        with open(fspath(dst), 'xb') as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            except OSError:
+                dst_file.close()
+                os.unlink(fspath(dst))
+                raise
+
+
+def _temp_name(dst):
+    dst_dir, dst_name = os.path.split(dst)
+    suffix = binascii.hexlify(os.urandom(6)).decode()
+    return os.path.join(dst_dir, '.{}.{}.tmp'.format(dst_name, suffix))
+
+
+def _is_same_file(src, dst):
+    try:
+        return os.path.samefile(src, dst)
+    except FileNotFoundError:
+        return False
+
+
+def _is_same_device(src, dst):
+    try:
+        dst_dir = os.path.dirname(os.path.abspath(dst))
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        # let the staging itself report the error
+        return True
+
+
+def stage_file(src, dst, allow_link=True):
+    '''Puts the contents of src into dst in the cheapest way available and
+    returns the method used ('link', 'reflink' or 'copy')
+
+    If allow_link is True, dst is tried to be made a hardlink to src first,
+    which doesn't copy anything, but dst shares the contents with src, so it
+    can be used only if none of them is modified later. Otherwise, a reflink
+    is tried, and the file is copied if the filesystem supports none of
+    them. dst is replaced atomically, as the file is staged under the
+    temporary name first. If src and dst are the same file, nothing is done
+    and None is returned
+
+    Hardlinks cannot cross filesystems, so they are not tried if dst is on
+    another device than src. Note that the scratch directory is in /dev/shm
+    by default, so the files staged between it and the task directory are
+    always reflinked or copied. Set the scratch directory on the same
+    filesystem as the task to make them linked'''
+    src = fspath(src)
+    dst = fspath(dst)
+    if _is_same_file(src, dst):
+        return None
+    methods = [('reflink', reflink), ('copy', shutil.copyfile)]
+    if allow_link and _is_same_device(src, dst):
+        methods = [('link', os.link)] + methods
+    temp_dst = _temp_name(dst)
+    error = None
+    for method, stage_func in methods:
+        try:
+            stage_func(src, temp_dst)
+            if method != 'link':
+                shutil.copymode(src, temp_dst)
+            os.replace(temp_dst, dst)
+            return method
+        except OSError as exc:
+            if os.path.lexists(temp_dst):
+                os.unlink(temp_dst)
+            error = exc
+    raise error
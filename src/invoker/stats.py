@@ -0,0 +1,84 @@
+import math
+import statistics
+from collections import namedtuple
+from runners import Status
+
+Summary = namedtuple('Summary',
+                     ['min', 'median', 'p95', 'max', 'mean', 'stddev'])
+
+RepeatStats = namedtuple('RepeatStats',
+                         ['runs', 'failed', 'time', 'clock_time', 'memory',
+                          'outliers'])
+
+# runs with fewer samples are not checked for outliers, as the quartiles are
+# meaningless there
+MIN_OUTLIER_SAMPLES = 4
+
+
+def percentile(values, fraction):
+    '''Returns the percentile of values (fraction is between 0 and 1),
+    interpolating linearly between the closest ranks'''
+    values = sorted(values)
+    if not values:
+        raise ValueError('no values given')
+    pos = (len(values) - 1) * fraction
+    lower = math.floor(pos)
+    upper = math.ceil(pos)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def summarize(values):
+    values = list(values)
+    return Summary(min=min(values),
+                   median=statistics.median(values),
+                   p95=percentile(values, 0.95),
+                   max=max(values),
+                   mean=statistics.mean(values),
+                   stddev=statistics.pstdev(values))
+
+
+def find_outliers(values, factor=1.5):
+    '''Returns the indices of values outside of Tukey's fences, i.e. farther
+    than factor * IQR from the quartiles'''
+    if len(values) < MIN_OUTLIER_SAMPLES:
+        return []
+    first = percentile(values, 0.25)
+    third = percentile(values, 0.75)
+    margin = factor * (third - first)
+    return [index for index, value in enumerate(values)
+            if value < first - margin or value > third + margin]
+
+
+def repeat_stats(results):
+    '''Computes RepeatStats for the list of Results of the same program. The
+    outliers are the indices of runs which are outliers either by CPU time or
+    by wall time'''
+    results = list(results)
+    times = [item.time for item in results]
+    clock_times = [item.clock_time for item in results]
+    outliers = set(find_outliers(times)) | set(find_outliers(clock_times))
+    return RepeatStats(
+        runs=len(results),
+        failed=sum(1 for item in results if item.status != Status.OK),
+        time=summarize(times),
+        clock_time=summarize(clock_times),
+        memory=summarize(item.memory for item in results),
+        outliers=sorted(outliers))
+
+
+def format_repeat_stats(stats):
+    lines = ['{:<14} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        '', 'min', 'median', 'p95', 'max', 'stddev')]
+    rows = [('time, s', stats.time, '{:>9.3f}'),
+            ('wall time, s', stats.clock_time, '{:>9.3f}'),
+            ('memory, MiB', stats.memory, '{:>9.2f}')]
+    for title, summary, value_format in rows:
+        values = [summary.min, summary.median, summary.p95, summary.max,
+                  summary.stddev]
+        lines += ['{:<14}'.format(title) + ''.join(
+            ' ' + value_format.format(value) for value in values)]
+    lines += ['runs: {}, failed: {}'.format(stats.runs, stats.failed)]
+    if stats.outliers:
+        lines += ['outliers: ' + ', '.join(
+            '#{}'.format(index + 1) for index in stats.outliers)]
+    return '\n'.join(lines)
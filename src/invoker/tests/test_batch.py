@@ -0,0 +1,181 @@
+import hashlib
+import shutil
+import pytest
+from pathlib import Path
+from compat import fspath
+from runners import Status
+from invoker.batch import BatchRunner, list_tests, output_name
+from invoker.batch import batch_exitcode, format_test_runs, output_names
+from invoker.parallel import parallel_map
+from invoker.profiled_runner import create_profile
+from .test_common import tests_location
+from ...pytest_fixtures import *
+
+
+def test_parallel_map():
+    items = list(range(20))
+    assert parallel_map(lambda x: x * x, items, 4) == [x * x for x in items]
+    assert parallel_map(lambda x: x + 1, items, 1) == [x + 1 for x in items]
+    assert parallel_map(lambda x: x, [], 4) == []
+
+
+def test_list_tests(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    (tmpdir / 'tests').mkdir()
+    for name in ['02.in', '01.in', '10.in']:
+        (tmpdir / 'tests' / name).open('w').write('')
+    (tmpdir / 'tests' / 'subdir').mkdir()
+    (tmpdir / 'extra').open('w').write('')
+
+    assert list_tests([tmpdir / 'extra', tmpdir / 'tests']) == [
+        tmpdir / 'extra', tmpdir / 'tests' / '01.in',
+        tmpdir / 'tests' / '02.in', tmpdir / 'tests' / '10.in']
+
+    assert output_name(Path('tests') / '01.in') == '01.out'
+    assert output_name(Path('tests') / '01') == '01.out'
+    assert output_name('test.txt') == 'test.txt.out'
+
+    assert output_names(['a/01.in', '02']) == ['01.out', '02.out']
+    with pytest.raises(ValueError):
+        output_names(['a/01.in', 'b/01.in'])
+    with pytest.raises(ValueError):
+        output_names(['01', '01.in'])
+
+
+def test_batch_runner(tmpdir, language_manager, repo_manager):
+    tmpdir = Path(str(tmpdir))
+    src = tmpdir / 'aplusb.cpp'
+    shutil.copy(fspath(tests_location() / 'aplusb.cpp'), fspath(src))
+    source = language_manager.create_source(
+        src, language=language_manager.get_lang('cpp.g++11'))
+    source.compile()
+    cmdline = source.language.run_args(source.exe_file)
+
+    (tmpdir / 'tests').mkdir()
+    (tmpdir / 'out').mkdir()
+    input_files = []
+    for test in range(10):
+        input_file = tmpdir / 'tests' / '{:02}.in'.format(test)
+        input_file.open('w').write('{} {}'.format(test, 2 * test))
+        input_files += [input_file]
+
+    profile = create_profile('generator', repo_manager.repo)
+    runner = BatchRunner(profile, jobs=3)
+    # the output directory is created if it doesn't exist
+    (tmpdir / 'out').rmdir()
+    test_runs = runner.run(cmdline, input_files, tmpdir / 'out')
+    assert [test_run.input_file for test_run in test_runs] == input_files
+    for test, test_run in enumerate(test_runs):
+        assert test_run.results.status == Status.OK
+        assert test_run.exitcode == 0
+        assert test_run.output_file == tmpdir / 'out' / '{:02}.out'.format(
+            test)
+        assert test_run.output_file.open('r').read() == '{}\n'.format(
+            3 * test)
+    assert batch_exitcode(test_runs) == 0
+    assert format_test_runs(test_runs).endswith('10 of 10 test(s) passed')
+
+    test_run = runner.run_test(cmdline, input_files[2])
+    assert test_run.output_file is None
+    assert test_run.results.status == Status.OK
+
+    # with hash_stdout, only the digests of the outputs are computed
+    for supervisor in [False, True]:
+        runner = BatchRunner(profile, jobs=3, supervisor=supervisor,
+                             output_limit=1.0, hash_stdout=True)
+        test_runs = runner.run(cmdline, input_files[:3])
+        for test, test_run in enumerate(test_runs):
+            assert test_run.results.status == Status.OK
+            assert test_run.results.stdout_digest == hashlib.sha256(
+                '{}\n'.format(3 * test).encode()).hexdigest()
+        assert test_runs[0].results.stdout_digest in format_test_runs(
+            test_runs)
+
+
+def test_batch_runner_isolate(tmpdir, language_manager, repo_manager):
+    tmpdir = Path(str(tmpdir))
+    src = tmpdir / 'marker.cpp'
+    # prints the number of files in the working directory, spoils the staged
+    # input and leaves one more file there
+    src.open('w').write('''\
+#include <stdio.h>
+#include <string.h>
+#include <dirent.h>
+
+int main() {
+    int count = 0;
+    DIR *dir = opendir(".");
+    while (struct dirent *entry = readdir(dir)) {
+        if (entry->d_name[0] != '.') {
+            ++count;
+        }
+        if (strstr(entry->d_name, ".in")) {
+            fclose(fopen(entry->d_name, "w"));
+        }
+    }
+    closedir(dir);
+    printf("%d\\n", count);
+    fclose(fopen("mark", "w"));
+    return 0;
+}
+''')
+    source = language_manager.create_source(
+        src, language=language_manager.get_lang('cpp.g++11'))
+    source.compile()
+    cmdline = source.language.run_args(source.exe_file)
+
+    (tmpdir / 'tests').mkdir()
+    input_files = []
+    for test in range(6):
+        input_files += [tmpdir / 'tests' / '{:02}.in'.format(test)]
+        input_files[-1].open('w').write('{}\n'.format(test))
+
+    profile = create_profile('checker', repo_manager.repo)
+    runner = BatchRunner(profile, jobs=2, isolate=True)
+    (tmpdir / 'out').mkdir()
+    test_runs = runner.run(cmdline, input_files, tmpdir / 'out',
+                           exe_file=source.exe_file)
+    for test_run in test_runs:
+        assert test_run.results.status == Status.OK
+        # the executable and the input file
+        assert test_run.output_file.open().read() == '2\n'
+    assert not (source.exe_file.parent / 'mark').exists()
+    for test, input_file in enumerate(input_files):
+        assert input_file.open().read() == '{}\n'.format(test)
+
+    slots_dir = repo_manager.repo.internal_dir(True) / 'slots'
+    assert len(list(slots_dir.iterdir())) == 2
+    runner.close()
+    for slot_dir in slots_dir.iterdir():
+        assert list(slot_dir.iterdir()) == []
+
+
+def test_batch_runner_supervisor(tmpdir, language_manager, repo_manager):
+    tmpdir = Path(str(tmpdir))
+    src = tmpdir / 'aplusb.cpp'
+    shutil.copy(fspath(tests_location() / 'aplusb.cpp'), fspath(src))
+    source = language_manager.create_source(
+        src, language=language_manager.get_lang('cpp.g++11'))
+    source.compile()
+    cmdline = source.language.run_args(source.exe_file)
+
+    (tmpdir / 'tests').mkdir()
+    (tmpdir / 'out').mkdir()
+    input_files = []
+    for test in range(6):
+        input_file = tmpdir / 'tests' / '{:02}.in'.format(test)
+        input_file.open('w').write('{} {}'.format(test, 2 * test))
+        input_files += [input_file]
+
+    profile = create_profile('generator', repo_manager.repo)
+    runner = BatchRunner(profile, jobs=3, supervisor=True)
+    test_runs = runner.run(cmdline, input_files, tmpdir / 'out')
+    assert [test_run.input_file for test_run in test_runs] == input_files
+    for test, test_run in enumerate(test_runs):
+        assert test_run.results.status == Status.OK
+        assert test_run.exitcode == 0
+        assert test_run.output_file.open('r').read() == '{}\n'.format(
+            3 * test)
+
+    with pytest.raises(ValueError):
+        BatchRunner(profile, isolate=True, supervisor=True)
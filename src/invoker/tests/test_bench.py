@@ -0,0 +1,19 @@
+from invoker.bench import *
+from ...pytest_fixtures import config_manager
+
+
+def test_run_benchmark(config_manager):
+    results = run_benchmark(['cpp.g++17'], runs=5)
+    assert [result.static for result in results] == [False, True]
+    for result in results:
+        assert result.language == 'cpp.g++17'
+        assert result.runs == 5
+        assert 0.0 <= result.min_time <= result.median_time
+    assert format_results(results).count('\n') == 2
+
+
+def test_main(config_manager, capsys):
+    assert main(['c.gcc', '-n', '3']) == 0
+    out, err = capsys.readouterr()
+    assert out.count('\n') == 3
+    assert err == ''
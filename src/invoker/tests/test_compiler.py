@@ -1,3 +1,4 @@
+import os
 import shutil
 from pathlib import Path
 import pytest
@@ -5,6 +6,7 @@ from compat import fspath
 from runners import Runner, Status
 from invoker.compiler import Compiler, CompileError
 from invoker.utils import default_exe_ext
+from invoker.languages import PredefinedLanguage
 from .test_common import tests_location
 from ...pytest_fixtures import *
 
@@ -98,3 +100,119 @@ def test_compiler(tmpdir, repo_manager, language_manager):
     runner.run()
     assert runner.results.status == Status.OK
     assert runner.stdout == 'hello world\n'
+
+
+def test_compiler_staging(tmpdir, repo_manager, language_manager):
+    tmpdir = Path(str(tmpdir))
+    repo = repo_manager.repo
+
+    lang_cpp = language_manager.get_lang('cpp.g++14')
+    lang_py = language_manager.get_lang('py.py3')
+    src_cpp = tmpdir / 'code.cpp'
+    src_py = tmpdir / 'code.py'
+    shutil.copy(fspath(tests_location() / 'code.cpp'), fspath(src_cpp))
+    shutil.copy(fspath(tests_location() / 'code.py'), fspath(src_py))
+
+    exe_cpp = tmpdir / ('in-place' + default_exe_ext())
+    compiler = Compiler(repo, lang_cpp, src_cpp, exe_cpp, exe_in_place=True)
+    compiler.compile()
+    runner = Runner()
+    runner.capture_stdout = True
+    runner.parameters.executable = exe_cpp
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.stdout == 'hello world\n'
+
+    # the languages without compile step copy the source, but don't link it
+    src_sh = tmpdir / 'code.sh'
+    src_sh.open('w').write('echo hello world\n')
+    exe_sh = tmpdir / 'copied.sh'
+    lang_sh = PredefinedLanguage('sh.sh', exe_ext='.sh',
+                                 run_args=['sh', '{exe}'])
+    compiler = Compiler(repo, lang_sh, src_sh, exe_sh)
+    compiler.compile()
+    assert exe_sh.open().read() == src_sh.open().read()
+    assert not os.path.samefile(fspath(src_sh), fspath(exe_sh))
+
+    # python sources are compiled into bytecode, so syntax errors are found
+    # during compilation
+    exe_py = tmpdir / 'code.pyc'
+    compiler = Compiler(repo, lang_py, src_py, exe_py)
+    compiler.compile()
+    runner.parameters.executable = lang_py.run_args(exe_py)[0]
+    runner.parameters.args = lang_py.run_args(exe_py)[1:]
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.stdout == 'hello world\n'
+
+    src_bad_py = tmpdir / 'bad.py'
+    src_bad_py.open('w').write('print(\n')
+    with pytest.raises(CompileError):
+        Compiler(repo, lang_py, src_bad_py).compile()
+
+
+def test_prebuild_libs(tmpdir, repo_manager, language_manager):
+    tmpdir = Path(str(tmpdir))
+    repo = repo_manager.repo
+    lang = language_manager.get_lang('cpp.g++14')
+
+    lib_dir = tmpdir / 'mylib'
+    lib_dir.mkdir()
+    (lib_dir / 'mylib.h').open('w').write('int answer();\n')
+    (lib_dir / 'mylib.cpp').open('w').write(
+        '#include "mylib.h"\n\nint answer() { return 42; }\n')
+    src = tmpdir / 'main.cpp'
+    src.open('w').write('#include <cstdio>\n#include "mylib.h"\n\n'
+                        'int main() { printf("%d\\n", answer()); }\n')
+
+    # without prebuilt library, answer() is not defined
+    with pytest.raises(CompileError):
+        Compiler(repo, lang, src, library_dirs=[lib_dir],
+                 prebuild_libs=False).compile()
+
+    runner = Runner()
+    runner.capture_stdout = True
+
+    def compile_and_run():
+        compiler = Compiler(repo, lang, src, library_dirs=[lib_dir],
+                            prebuild_libs=True)
+        compiler.compile()
+        runner.parameters.executable = compiler.exe_file
+        runner.run()
+        assert runner.results.status == Status.OK
+        return runner.stdout
+
+    libs_dir = repo.internal_dir(True) / 'libs' / 'cpp.g++14'
+    assert compile_and_run() == '42\n'
+    archives = list(libs_dir.iterdir())
+    assert len(archives) == 1
+    assert archives[0].name.startswith('mylib-')
+    mtime = archives[0].stat().st_mtime_ns
+
+    assert compile_and_run() == '42\n'
+    assert list(libs_dir.iterdir()) == archives
+    assert archives[0].stat().st_mtime_ns == mtime
+
+    (lib_dir / 'mylib.cpp').open('w').write(
+        '#include "mylib.h"\n\nint answer() { return 43; }\n')
+    assert compile_and_run() == '43\n'
+    new_archives = list(libs_dir.iterdir())
+    assert len(new_archives) == 1
+    assert new_archives != archives
+
+    (lib_dir / 'mylib.cpp').open('w').write('compile error')
+    with pytest.raises(CompileError):
+        compile_and_run()
+
+    # the libraries with the same directory name don't replace each other
+    other_dir = tmpdir / 'other' / 'mylib'
+    shutil.copytree(fspath(lib_dir), fspath(other_dir))
+    (other_dir / 'mylib.cpp').open('w').write(
+        '#include "mylib.h"\n\nint answer() { return 44; }\n')
+    (lib_dir / 'mylib.cpp').open('w').write(
+        '#include "mylib.h"\n\nint answer() { return 43; }\n')
+    assert compile_and_run() == '43\n'
+    lib_dir = other_dir
+    assert compile_and_run() == '44\n'
+    assert len(list(libs_dir.iterdir())) == 2
+    assert new_archives[0].is_file()
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+import pytest
+from invoker import jobserver as jobserver_module
+from invoker.jobserver import *
+from invoker.parallel import parallel_map, reserved_jobs
+
+
+def test_parse_makeflags():
+    assert parse_makeflags('') is None
+    assert parse_makeflags('-j4') is None
+    assert parse_makeflags(' -j4 --jobserver-auth=3,4') == \
+        JobServerAuth(3, 4, None)
+    assert parse_makeflags('-j --jobserver-fds=5,6 --jobserver-auth=7,8') == \
+        JobServerAuth(7, 8, None)
+    assert parse_makeflags('-j4 --jobserver-auth=fifo:/tmp/GMfifo1') == \
+        JobServerAuth(None, None, '/tmp/GMfifo1')
+    with pytest.raises(JobServerError):
+        parse_makeflags('--jobserver-auth=a,b')
+
+
+def test_jobserver():
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, b'++')
+        server = JobServer(JobServerAuth(read_fd, write_fd, None))
+        tokens = [server.acquire() for i in range(3)]
+        assert tokens == [None, b'+', b'+']
+        for token in tokens:
+            server.release(token)
+        assert server.acquire() is None
+        assert os.read(read_fd, 2) == b'++'
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+    with pytest.raises(JobServerError):
+        JobServer(JobServerAuth(read_fd, write_fd, None))
+
+
+def test_jobserver_acquire_many():
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, b'++')
+        server = JobServer(JobServerAuth(read_fd, write_fd, None))
+        # only the available tokens are taken
+        tokens = server.acquire_many(5)
+        assert tokens == [None, b'+', b'+']
+        for token in tokens:
+            server.release(token)
+        assert server.acquire_many(2) == [None, b'+']
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_jobserver_fifo(tmpdir):
+    fifo = str(tmpdir / 'fifo')
+    os.mkfifo(fifo)
+    server = JobServer(JobServerAuth(None, None, fifo))
+    os.write(server.write_fd, b'+')
+    assert server.acquire() is None
+    assert server.acquire() == b'+'
+    with pytest.raises(JobServerError):
+        JobServer(JobServerAuth(None, None, str(tmpdir / 'missing')))
+
+
+def test_parallel_map_jobserver(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    try:
+        # one extra token, so at most two items are processed at once
+        os.write(write_fd, b'+')
+        monkeypatch.setattr(jobserver_module, '__JOBSERVERS', {})
+        monkeypatch.setenv('MAKEFLAGS', '-j2 --jobserver-auth={},{}'.format(
+            read_fd, write_fd))
+        server = jobserver()
+        assert jobserver() is server
+        lock = threading.Lock()
+        running = 0
+        max_running = 0
+
+        def work(item):
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            return item * 2
+
+        assert parallel_map(work, range(8), 8) == [i * 2 for i in range(8)]
+        assert max_running == 2
+        # all the tokens are returned
+        assert os.read(read_fd, 2) == b'+'
+
+        monkeypatch.setenv('MAKEFLAGS', '-j2 --jobserver-auth=x,y')
+        with pytest.raises(JobServerError):
+            jobserver()
+        max_running = 0
+        assert parallel_map(work, range(4), 4) == [i * 2 for i in range(4)]
+        assert max_running == 1
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_reserved_jobs(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, b'+')
+        monkeypatch.setattr(jobserver_module, '__JOBSERVERS', {})
+        monkeypatch.setenv('MAKEFLAGS', '-j2 --jobserver-auth={},{}'.format(
+            read_fd, write_fd))
+        server = jobserver()
+        assert jobserver() is server
+        with reserved_jobs(4) as jobs:
+            assert jobs == 2
+        # all the tokens are returned
+        assert os.read(read_fd, 2) == b'+'
+        assert server.acquire() is None
+
+        monkeypatch.setenv('MAKEFLAGS', '-j2 --jobserver-auth=x,y')
+        with pytest.raises(JobServerError):
+            jobserver()
+        with reserved_jobs(4) as jobs:
+            assert jobs == 1
+        monkeypatch.setenv('MAKEFLAGS', '-j4')
+        assert jobserver() is None
+        with reserved_jobs(4) as jobs:
+            assert jobs == 4
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
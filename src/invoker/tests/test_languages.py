@@ -44,7 +44,7 @@ active = false
     assert lang_manager.get_ext('.bad_ext') == []
     assert lang_manager['py.py2'].name == 'py.py2'
     assert lang_manager['py.py3'].name == 'py.py3'
-    assert lang_manager['py.py3'].exe_ext == '.py'
+    assert lang_manager['py.py3'].exe_ext == '.pyc'
 
     with pytest.raises(LanguageError):
         lang_manager['bad_ext.bad_lang']
@@ -84,3 +84,42 @@ active = false
     assert lang_manager.get_best_lang('.py').name == 'py.py3'
     with pytest.raises(LanguageError):
         lang_manager.get_best_lang('.red')
+
+
+def test_static_languages(config_manager):
+    config_manager.user_config(CONFIG_NAME).open(
+        'w', encoding='utf8').write('''
+[lang/cpp.g++17]
+static = true
+link-args = ['-lm']
+[lang/c.gcc]
+link-args = ['-lm']
+static-args = ['-static', '-s']
+[lang/sh.sh]
+compile-args = ['sh', '-n', '{src}']
+static = true
+''')
+
+    lang_manager = LanguageManagerBase()
+
+    lang = lang_manager['cpp.g++17']
+    assert lang.static
+    assert lang.compile_args(Path('file.cpp'),
+                             Path('file.exe'))[-2:] == ['-lm', '-static']
+
+    lang = lang_manager['c.gcc']
+    assert not lang.static
+    assert lang.compile_args(Path('file.c'), Path('file.exe'))[-1] == '-lm'
+    lang.static = True
+    assert lang.compile_args(Path('file.c'),
+                             Path('file.exe'))[-3:] == ['-lm', '-static',
+                                                        '-s']
+
+    assert not lang_manager['cpp.g++11'].static
+    assert lang_manager['cpp.g++11'].compile_args(
+        Path('file.cpp'), Path('file.exe'))[-1] != '-static'
+
+    # no static-args for the language, so nothing is added
+    lang = lang_manager['sh.sh']
+    assert lang.compile_args(Path('file.sh'), Path('file.exe')) == [
+        shutil.which('sh'), '-n', fspath(Path.cwd() / 'file.sh')]
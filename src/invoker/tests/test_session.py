@@ -0,0 +1,69 @@
+import shutil
+import threading
+from pathlib import Path
+from compat import fspath
+from runners import Status
+from invoker import Session
+from .test_common import tests_location
+from ...pytest_fixtures import *
+
+
+def test_session(tmpdir, repo_manager, language_manager):
+    tmpdir = Path(str(tmpdir))
+    src_ok = tmpdir / 'aplusb.cpp'
+    src_bad = tmpdir / 'compile_error.cpp'
+    shutil.copy(fspath(tests_location() / 'aplusb.cpp'), fspath(src_ok))
+    shutil.copy(fspath(tests_location() / 'compile_error.cpp'),
+                fspath(src_bad))
+
+    session = Session(task_dir=repo_manager.task_dir)
+    assert session.repo.directory == repo_manager.task_dir
+
+    compile_result = session.compile(src_bad, language='cpp.g++11')
+    assert compile_result.exitcode != 0
+    assert compile_result.output
+
+    compile_result = session.compile(src_ok, language='cpp.g++11')
+    assert compile_result.exitcode == 0
+    assert compile_result.language == 'cpp.g++11'
+    assert compile_result.exe_file.is_file()
+
+    run_result = session.run(compile_result.exe_file, 'checker',
+                             language='cpp.g++11', stdin='2 3')
+    assert run_result.results.status == Status.OK
+    assert run_result.exitcode == 0
+    # the executable can be given as str
+    run_result = session.run(fspath(compile_result.exe_file), 'checker',
+                             stdin='2 3')
+    assert run_result.results.status == Status.OK
+
+    # the runners are reused and can be used from multiple threads
+    outputs = {}
+
+    def run_one(value):
+        outputs[value] = session.run(compile_result.exe_file, 'compiler',
+                                     stdin='{} 1'.format(value))
+
+    threads = [threading.Thread(target=run_one, args=(value,))
+               for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for value in range(4):
+        assert outputs[value].results.status == Status.OK
+
+    run_results = session.run_repeated(compile_result.exe_file, 'compiler',
+                                       5, jobs=2)
+    assert len(run_results) == 5
+    for run_result in run_results:
+        assert run_result.results.status == Status.OK
+
+    compile_results = session.compile_many([src_ok, src_bad],
+                                           [tmpdir / 'first',
+                                            tmpdir / 'second'],
+                                           ['cpp.g++11', 'cpp.g++11'],
+                                           jobs=2)
+    assert compile_results[0].exitcode == 0
+    assert compile_results[1].exitcode != 0
+    assert (tmpdir / 'first').is_file()
@@ -83,7 +83,7 @@ def test_make_rules(tmpdir, language_manager, repo_manager, taker_app):
     src4.add_run_command(rule5, 'generator', quiet=True, stdin="see '42'!",
                          working_dir=tmpdir)
 
-    assert rule3 is None
+    assert rule3 is not None
     assert rule4 is not None
     repo_manager.makefile.all_rule.add_depend(rule1)
     repo_manager.makefile.all_rule.add_depend(rule2)
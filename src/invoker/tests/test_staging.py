@@ -0,0 +1,50 @@
+import os
+from pathlib import Path
+import pytest
+from invoker import staging
+from invoker.staging import stage_file
+
+
+def test_stage_file(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    src = tmpdir / 'src'
+    src.open('w').write('contents')
+    src.chmod(0o751)
+
+    dst = tmpdir / 'dst'
+    assert stage_file(src, dst) == 'link'
+    assert dst.open().read() == 'contents'
+    assert os.path.samefile(str(src), str(dst))
+    assert stage_file(src, dst) is None
+
+    dst.unlink()
+    dst.open('w').write('old contents')
+    assert stage_file(src, dst, allow_link=False) in {'reflink', 'copy'}
+    assert dst.open().read() == 'contents'
+    assert not os.path.samefile(str(src), str(dst))
+    assert dst.stat().st_mode & 0o777 == 0o751
+    assert sorted(item.name for item in tmpdir.iterdir()) == ['dst', 'src']
+
+    with pytest.raises(FileNotFoundError):
+        stage_file(tmpdir / 'missing', tmpdir / 'dst2')
+    assert sorted(item.name for item in tmpdir.iterdir()) == ['dst', 'src']
+
+
+def test_stage_file_other_device(tmpdir, monkeypatch):
+    tmpdir = Path(str(tmpdir))
+    src = tmpdir / 'src'
+    src.open('w').write('contents')
+    assert staging._is_same_device(src, tmpdir / 'dst')
+    linked = []
+    real_link = os.link
+
+    def link(src, dst):
+        linked.append(dst)
+        real_link(src, dst)
+
+    # the hardlink is not even tried across the filesystems
+    monkeypatch.setattr(staging.os, 'link', link)
+    monkeypatch.setattr(staging, '_is_same_device', lambda src, dst: False)
+    assert stage_file(src, tmpdir / 'dst') in {'reflink', 'copy'}
+    assert linked == []
+    assert (tmpdir / 'dst').open().read() == 'contents'
@@ -0,0 +1,56 @@
+import pytest
+from runners import Results, Status
+from invoker.stats import percentile, summarize, find_outliers
+from invoker.stats import repeat_stats, format_repeat_stats
+
+
+def make_results(time, clock_time, memory, status=Status.OK):
+    return Results(time=time, clock_time=clock_time, memory=memory,
+                   exitcode=0, signal=0, signal_name='', status=status,
+                   comment='')
+
+
+def test_percentile():
+    assert percentile([3.0], 0.95) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 0.0) == 1.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 1.0) == 4.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 0.5) == 2.5
+    assert percentile(list(range(21)), 0.95) == 19.0
+    with pytest.raises(ValueError):
+        percentile([], 0.5)
+
+
+def test_summarize():
+    summary = summarize([1.0, 2.0, 3.0, 4.0, 5.0])
+    assert summary.min == 1.0
+    assert summary.median == 3.0
+    assert summary.max == 5.0
+    assert summary.mean == 3.0
+    assert summary.stddev == pytest.approx(2.0 ** 0.5)
+    assert summary.p95 == pytest.approx(4.8)
+
+
+def test_find_outliers():
+    assert find_outliers([1.0, 1.1, 0.9, 1.0, 5.0, 1.05]) == [4]
+    assert find_outliers([1.0, 1.0, 1.0, 1.0]) == []
+    # too few samples to detect anything
+    assert find_outliers([1.0, 1.0, 10.0]) == []
+
+
+def test_repeat_stats():
+    results = [make_results(0.10, 0.12, 10.0),
+               make_results(0.11, 0.13, 12.0),
+               make_results(0.10, 0.90, 11.0),
+               make_results(0.12, 0.12, 10.5),
+               make_results(0.11, 0.13, 11.5),
+               make_results(0.50, 0.52, 30.0, Status.TIME_LIMIT)]
+    stats = repeat_stats(results)
+    assert stats.runs == 6
+    assert stats.failed == 1
+    assert stats.time.min == 0.10
+    assert stats.memory.max == 30.0
+    # the third run is outlier by wall time, the last one by CPU time
+    assert stats.outliers == [2, 5]
+    text = format_repeat_stats(stats)
+    assert text.find('runs: 6, failed: 1') >= 0
+    assert text.find('outliers: #3, #6') >= 0
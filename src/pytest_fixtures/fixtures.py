@@ -10,8 +10,11 @@ import cli
 
 
 @pytest.fixture(scope='function')
-def config_manager(tmpdir):
+def config_manager(tmpdir, monkeypatch):
     tmpdir = Path(str(tmpdir))
+    # the lock files shared between taker processes are kept in the test
+    # directory, not with the ones of the real runs
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmpdir / 'runtime'))
     old_manager = deepcopy(configs.manager)
     try:
         paths = configs.ConfigPaths()
@@ -1,2 +1,7 @@
 from .runners import Runner, RunnerError
+from .scratch import ScratchPool, scratch_pool, scratch_root
+from .scheduler import MemoryScheduler, memory_scheduler
+from .affinity import CpuSlots, cpu_slots
 from .runners import Parameters, Results, Status, IsolatePolicy, RunnerFeature
+from .runners import Rusage, TraceSample, RunnerBaseline, RUN_PHASES
+from .runners import LaunchMode, file_digest, is_path
@@ -0,0 +1,153 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from .config import config
+from .locks import runtime_dir, try_lock
+
+CPU_SYSFS_PATH = '/sys/devices/system/cpu'
+
+
+def parse_cpu_list(value):
+    '''Parses the CPU list in the kernel format (like "0-3,8,10-11") into
+    the sorted list of CPU numbers'''
+    result = set()
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        first, sep, last = item.partition('-')
+        first = int(first)
+        last = int(last) if sep else first
+        if first < 0 or last < first:
+            raise ValueError('invalid CPU range: {}'.format(item))
+        result.update(range(first, last + 1))
+    return sorted(result)
+
+
+def available_cpus():
+    '''Returns the sorted list of CPUs the current process may run on'''
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def thread_siblings(cpu, sysfs_path=CPU_SYSFS_PATH):
+    '''Returns the list of CPUs which share the same physical core with cpu
+    (SMT siblings), including cpu itself'''
+    siblings_path = os.path.join(sysfs_path, 'cpu{}'.format(cpu), 'topology',
+                                 'thread_siblings_list')
+    try:
+        with open(siblings_path, 'r', encoding='ascii') as siblings_file:
+            return parse_cpu_list(siblings_file.read())
+    except (OSError, ValueError):
+        return [cpu]
+
+
+def cpu_cores(cpus, skip_smt=True, sysfs_path=CPU_SYSFS_PATH):
+    '''Splits cpus into the slots, one slot per CPU. If skip_smt is True, only
+    one CPU of each physical core is used, so the runs in parallel don't share
+    the core with each other'''
+    if not skip_smt:
+        return [[cpu] for cpu in cpus]
+    result = []
+    used = set()
+    for cpu in cpus:
+        if cpu in used:
+            continue
+        used.update(thread_siblings(cpu, sysfs_path))
+        result += [[cpu]]
+    return result
+
+
+class CpuSlots:
+    '''Hands each concurrent run a dedicated CPU
+
+    The run which doesn't get a slot waits until some of the running ones
+    finish. The slots are given out in order, so the lowest CPUs are used
+    first
+
+    If lock_dir is given, the slots are also shared with the other processes
+    using the same lock_dir: each taken slot holds a lock on its file there.
+    As the other processes cannot notify about the released slots, they are
+    checked again every POLL_INTERVAL seconds'''
+
+    POLL_INTERVAL = 0.01
+
+    def __lock_file(self, index):
+        return self.lock_dir / 'cpu{}.lock'.format(self.slots[index][0])
+
+    def __take(self):
+        for index in sorted(self.__free):
+            if self.lock_dir is not None:
+                fd = try_lock(self.__lock_file(index))
+                if fd is None:
+                    continue
+                self.__lock_fds[index] = fd
+            self.__free.remove(index)
+            return index
+        return None
+
+    def __release(self, index):
+        fd = self.__lock_fds.pop(index, None)
+        if fd is not None:
+            os.close(fd)
+        self.__free.add(index)
+
+    @contextmanager
+    def slot(self):
+        timeout = self.POLL_INTERVAL if self.lock_dir is not None else None
+        with self.__cond:
+            index = self.__take()
+            while index is None:
+                self.__cond.wait(timeout)
+                index = self.__take()
+        try:
+            yield self.slots[index]
+        finally:
+            with self.__cond:
+                self.__release(index)
+                self.__cond.notify()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __init__(self, slots, lock_dir=None):
+        if not slots:
+            raise ValueError('no CPU slots given')
+        self.slots = [list(cpus) for cpus in slots]
+        self.lock_dir = Path(lock_dir) if lock_dir is not None else None
+        self.__free = set(range(len(self.slots)))
+        self.__lock_fds = {}
+        self.__cond = threading.Condition()
+
+
+def affinity_enabled():
+    return config()['affinity']['enabled']
+
+
+def create_cpu_slots():
+    '''Creates CpuSlots from the config: the CPUs from "cpus" option (or all
+    the available CPUs), one slot per CPU or per physical core. The slots are
+    shared between taker processes via the lock files in runtime_dir()'''
+    cpus = config()['affinity']['cpus']
+    if cpus is None:
+        cpus = available_cpus()
+    else:
+        cpus = parse_cpu_list(cpus)
+    return CpuSlots(cpu_cores(cpus, config()['affinity']['skip-smt']),
+                    runtime_dir())
+
+
+__CPU_SLOTS = {}
+__CPU_SLOTS_LOCK = threading.Lock()
+
+
+def cpu_slots():
+    '''Returns CpuSlots for runtime_dir(), which are shared in the whole
+    process. They are created from the config when requested first'''
+    lock_dir = runtime_dir()
+    with __CPU_SLOTS_LOCK:
+        if lock_dir not in __CPU_SLOTS:
+            __CPU_SLOTS[lock_dir] = create_cpu_slots()
+        return __CPU_SLOTS[lock_dir]
@@ -3,6 +3,44 @@ from configs import manager
 DEFAULT_CONFIG = '''[path]
 # Runner executable (if null or unset, use default)
 # executable = 'taker_unixrun'
+
+[scratch]
+# Directory for temporary files of the runs (stdin, stdout, stderr) and
+# compilation. If null, /dev/shm is used if it's available and has enough
+# free space, otherwise the default temporary directory is used
+dir: string = null
+# Minimal free space (in MBytes) in /dev/shm to use it by default
+min-free: float = 256.0
+
+[scheduler]
+# If true, the run is started only if the sum of memory limits of the running
+# programs (in all the taker processes, see [runtime]) fits into the memory
+# budget. Each run then updates the shared list of runs twice, so it's off by
+# default and is worth enabling only if the parallel runs can exhaust memory
+enabled: bool = false
+# Memory budget (in MBytes) for the runs in parallel. If null, only the
+# available memory is used as budget
+memory-budget: float = null
+# Part of the available memory (MemAvailable from /proc/meminfo) which can be
+# used by the runs
+available-ratio: float = 0.9
+
+[runtime]
+# Directory for the lock files shared between the taker processes (so the
+# parallel runs started by make -j don't take the same CPU and share the
+# memory budget). If null, $XDG_RUNTIME_DIR/taker or the temporary directory
+# is used
+dir: string = null
+
+[affinity]
+# If true, each run is pinned to its own CPU, so the runs in parallel don't
+# disturb each other's timings
+enabled: bool = false
+# CPUs to use for the runs (like "2-7" or "1,3,5"). If null, all the CPUs
+# available to the process are used
+cpus: string = null
+# Use only one CPU of each physical core (i.e. skip SMT siblings)
+skip-smt: bool = true
 '''
 
 CONFIG_NAME = 'runner'
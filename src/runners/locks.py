@@ -0,0 +1,60 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from compat import fspath
+from .config import config
+
+
+def runtime_dir():
+    '''Returns the directory for the lock files shared between taker processes
+    of the current user: the directory from the config, or taker/ in
+    $XDG_RUNTIME_DIR, or taker-<uid> in the default temporary directory. The
+    directory is created if it doesn't exist'''
+    result = config()['runtime']['dir']
+    if result is None:
+        xdg_dir = os.environ.get('XDG_RUNTIME_DIR')
+        if xdg_dir:
+            result = Path(xdg_dir) / 'taker'
+        else:
+            result = Path(tempfile.gettempdir()) / 'taker-{}'.format(
+                os.getuid())
+    result = Path(result)
+    result.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return result
+
+
+def _open_lock_file(file_name):
+    return os.open(fspath(file_name), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC,
+                   0o600)
+
+
+def try_lock(file_name):
+    '''Tries to lock file_name exclusively without waiting. Returns the file
+    descriptor which holds the lock (close it to unlock), or None if the file
+    is locked by someone else. The lock is released automatically when the
+    process dies'''
+    fd = _open_lock_file(file_name)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+@contextmanager
+def locked(file_name):
+    '''Locks file_name exclusively, waiting until it's unlocked by the others,
+    and yields the file descriptor opened for reading and writing. The lock is
+    released on exit'''
+    fd = _open_lock_file(file_name)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)
@@ -1,13 +1,19 @@
 from enum import Enum
+import hashlib
 import json
 import subprocess
 import os
 import shutil
-import tempfile
+import statistics
+import time
 from colorama import Fore, Style
 from copy import copy
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager, ExitStack
 from .config import config
+from .scratch import scratch_pool
+from .scheduler import memory_scheduler, scheduler_enabled
+from .affinity import affinity_enabled, cpu_slots
 from compat import fspath
 from pathlib import Path
 
@@ -20,6 +26,7 @@ class Parameters:
             'time_limit': 2.0,
             'idle_limit': None,
             'memory_limit': 256.0,
+            'output_limit': None,
             'executable': '',
             'clear_env': False,
             'env': {},
@@ -29,7 +36,12 @@ class Parameters:
             'stdout_redir': '',
             'stderr_redir': '',
             'isolate_dir': None,
-            'isolate_policy': None
+            'isolate_policy': None,
+            'affinity': None,
+            'perf_counters': None,
+            'trace_interval': None,
+            'launch_mode': None,
+            'hash_stdout': None
         }
 
     def _asdict(self):
@@ -46,7 +58,33 @@ class Parameters:
 
 Results = namedtuple('Results',
                      ['time', 'clock_time', 'memory', 'exitcode', 'signal',
-                      'signal_name', 'status', 'comment'])
+                      'signal_name', 'status', 'comment', 'counters',
+                      'rusage', 'trace', 'phases', 'stdout_digest'])
+# counters, trace and stdout_digest are collected only if requested and
+# supported by the runner, rusage and phases are present if the runner
+# reports them
+Results.__new__.__defaults__ = (None, None, None, None, None)
+
+Rusage = namedtuple('Rusage',
+                    ['max_rss', 'voluntary_switches', 'involuntary_switches',
+                     'minor_faults', 'major_faults', 'block_input',
+                     'block_output'])
+
+TraceSample = namedtuple('TraceSample', ['clock_time', 'time', 'rss', 'vm'])
+
+RunnerBaseline = namedtuple('RunnerBaseline',
+                            ['runs', 'clock_time', 'time', 'phases'])
+
+# Phases of Runner.run():
+# files - temporary files handling (stdin, stdout, stderr)
+# encode - encoding the parameters into JSON
+# runner - runner process startup and communication with it
+# spawn - fork() of the child by the runner
+# exec - from fork() to successful exec() in the child
+# wait - waiting for the program to finish (including the polling latency)
+# parse - decoding the results from JSON
+RUN_PHASES = ['files', 'encode', 'runner', 'spawn', 'exec', 'wait', 'parse']
+RUNNER_PHASES = ['spawn', 'exec', 'wait']
 
 RunnerInfo = namedtuple('RunnerInfo',
                         ['name', 'description', 'author', 'version',
@@ -55,6 +93,11 @@ RunnerInfo = namedtuple('RunnerInfo',
 
 class RunnerFeature(Enum):
     ISOLATE = 'isolate'
+    AFFINITY = 'affinity'
+    PERF_COUNTERS = 'perf-counters'
+    BATCH = 'batch'
+    OUTPUT_LIMIT = 'output-limit'
+    HASH_STDOUT = 'hash-stdout'
 
 
 class Status(Enum):
@@ -62,6 +105,7 @@ class Status(Enum):
     TIME_LIMIT = 'time-limit'
     IDLE_LIMIT = 'idle-limit'
     MEMORY_LIMIT = 'memory-limit'
+    OUTPUT_LIMIT = 'output-limit'
     RUNTIME_ERROR = 'runtime-error'
     SECURITY_ERROR = 'security-error'
     RUN_FAIL = 'run-fail'
@@ -76,6 +120,7 @@ STATUS_COLORS = {
     Status.TIME_LIMIT: Fore.BLUE,
     Status.IDLE_LIMIT: Fore.BLUE,
     Status.MEMORY_LIMIT: Fore.CYAN,
+    Status.OUTPUT_LIMIT: Fore.YELLOW,
     Status.RUNTIME_ERROR: Fore.MAGENTA,
     Status.SECURITY_ERROR: '',
     Status.RUN_FAIL: ''
@@ -89,6 +134,12 @@ class IsolatePolicy(Enum):
     STRICT = 'strict'
 
 
+class LaunchMode(Enum):
+    AUTO = 'auto'
+    FORK = 'fork'
+    VFORK = 'vfork'
+
+
 class RunnerError(Exception):
     pass
 
@@ -113,10 +164,32 @@ def parameters_to_json(parameters):
     if parameters.isolate_policy is None:
         param_dict['isolate-policy'] = IsolatePolicy.NORMAL
     param_dict['isolate-policy'] = param_dict['isolate-policy'].value
+    if parameters.affinity is None:
+        del param_dict['affinity']
+    else:
+        param_dict['affinity'] = list(parameters.affinity)
+    if parameters.perf_counters is None:
+        del param_dict['perf-counters']
+    if parameters.trace_interval is None:
+        del param_dict['trace-interval']
+    if parameters.output_limit is None:
+        del param_dict['output-limit']
+    if parameters.hash_stdout is None:
+        del param_dict['hash-stdout']
+    if parameters.launch_mode is None:
+        del param_dict['launch-mode']
+    else:
+        param_dict['launch-mode'] = param_dict['launch-mode'].value
     # dump as JSON
     return json.dumps(param_dict)
 
 
+def is_path(value):
+    '''Checks if value is a path object (str is not considered a path, as
+    it's treated as data)'''
+    return isinstance(value, Path) or hasattr(value, '__fspath__')
+
+
 def typecheck(typename, value):
     if not isinstance(value, typename):
         raise ValueError('"{}" is not {}'.format(
@@ -137,11 +210,70 @@ def json_to_runner_info(results_json):
         features=res['features'])
 
 
+def json_to_counters(counters):
+    if counters is None:
+        return None
+    typecheck(dict, counters)
+    return {typecheck(str, name): typecheck(int, value)
+            for name, value in counters.items()}
+
+
+def json_to_rusage(rusage):
+    if rusage is None:
+        return None
+    rusage = dict_keys_replace(typecheck(dict, rusage), '-', '_')
+    return Rusage(
+        max_rss=float(rusage['max_rss']),
+        **{field: typecheck(int, rusage[field])
+           for field in Rusage._fields if field != 'max_rss'})
+
+
+def delta_decode(values, unit):
+    result = []
+    last = 0
+    for value in values:
+        last += typecheck(int, value)
+        result += [last * unit]
+    return result
+
+
+def json_to_trace(trace):
+    '''Decodes the trace from the runner. It consists of delta-encoded
+    arrays with time in microseconds and memory in KiB'''
+    if trace is None:
+        return None
+    typecheck(dict, trace)
+    columns = [delta_decode(trace['clock-time'], 1e-6),
+               delta_decode(trace['time'], 1e-6),
+               delta_decode(trace['rss'], 1 / 1024),
+               delta_decode(trace['vm'], 1 / 1024)]
+    if len({len(column) for column in columns}) != 1:
+        raise ValueError('trace arrays have different lengths')
+    return [TraceSample(*sample) for sample in zip(*columns)]
+
+
+def json_to_phases(phases):
+    if phases is None:
+        return None
+    typecheck(dict, phases)
+    return {typecheck(str, name): float(value)
+            for name, value in phases.items()}
+
+
+def json_to_digest(digest):
+    if digest is None:
+        return None
+    return typecheck(str, digest)
+
+
 def json_to_results(results_json):
+    return dict_to_results(json.loads(results_json))
+
+
+def dict_to_results(res):
     # when time is string but it's convertible to float
     # then it passes validation
     # FIXME : fail validation in this cases (?)
-    res = json.loads(results_json)
     return Results(
         time=float(res['time']),
         clock_time=float(res['clock-time']),
@@ -150,7 +282,23 @@ def json_to_results(results_json):
         signal=typecheck(int, res.setdefault('signal', 0)),
         signal_name=typecheck(str, res.setdefault('signal-name', '')),
         status=Status(res['status']),
-        comment=typecheck(str, res.setdefault('comment', '')))
+        comment=typecheck(str, res.setdefault('comment', '')),
+        counters=json_to_counters(res.get('counters')),
+        rusage=json_to_rusage(res.get('rusage')),
+        trace=json_to_trace(res.get('trace')),
+        phases=json_to_phases(res.get('phases')),
+        stdout_digest=json_to_digest(res.get('stdout-digest')))
+
+
+def file_digest(file_name):
+    '''Returns the hex digest of the file in the same format as stdout_digest
+    in Results, so the expected answer can be compared with the output
+    without reading the latter'''
+    digest = hashlib.sha256()
+    with open(fspath(file_name), 'rb') as in_file:
+        for chunk in iter(lambda: in_file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
 class Runner:
@@ -160,50 +308,202 @@ class Runner:
             subprocess.check_output([self.runner_path, '-?'],
                                     input='', universal_newlines=True))
 
+    @contextmanager
+    def _timed(self, phase):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] += time.perf_counter() - start_time
+
     def _do_run(self):
-        input_str = parameters_to_json(self.parameters)
+        with self._timed('encode'):
+            input_str = parameters_to_json(self.parameters)
         try:
-            output_str = subprocess.check_output(
-                [self.runner_path], input=input_str, universal_newlines=True)
-            self.results = json_to_results(output_str)
+            with self._timed('runner'):
+                output_str = subprocess.check_output(
+                    [self.runner_path], input=input_str,
+                    universal_newlines=True)
+            with self._timed('parse'):
+                self.results = json_to_results(output_str)
         except subprocess.CalledProcessError as exc:
             raise RunnerError('runner exited with exitcode = {}'
                               .format(exc.returncode))
+        # the phases inside the runner are reported by the runner itself
+        for phase, value in (self.results.phases or {}).items():
+            if phase in self.phases:
+                self.phases[phase] += value
+                self.phases['runner'] -= value
+
+    def __use_cpu_slots(self):
+        return (self.parameters.affinity is None and
+                RunnerFeature.AFFINITY in self.info.features and
+                affinity_enabled())
+
+    @staticmethod
+    def __read_output(file_name):
+        try:
+            with open(file_name, 'r', encoding='utf8') as out_file:
+                return out_file.read()
+        except FileNotFoundError:
+            return ''
+
+    @staticmethod
+    def __write_input(file_name, data):
+        if isinstance(data, str):
+            with open(file_name, 'w', encoding='utf8') as in_file:
+                in_file.write(data)
+        else:
+            with open(file_name, 'wb') as in_file:
+                in_file.write(data)
 
     def run(self):
         old_parameters = copy(self.parameters)
         self.results = None
         self.stdout = ''
         self.stderr = ''
-        create_temp_dir = (self.pass_stdin or self.capture_stdout
-                           or self.capture_stderr)
-        if create_temp_dir:
-            temp_dir = tempfile.mkdtemp()
+        self.phases = OrderedDict((phase, 0.0) for phase in RUN_PHASES)
+        stdin_file = None
+        if self.pass_stdin and is_path(self.stdin):
+            # the program will read the file directly, so it's not copied.
+            # The runner changes the directory before opening it, so the
+            # path must be absolute
+            stdin_file = os.path.abspath(fspath(self.stdin))
+        # the output written into stdout_file or hashed by the runner is not
+        # read, so large outputs are not kept in memory
+        read_stdout = (self.capture_stdout and self.stdout_file is None and
+                       not self.parameters.hash_stdout)
+        use_temp_dir = ((self.pass_stdin and stdin_file is None) or
+                        (self.capture_stdout and self.stdout_file is None) or
+                        self.capture_stderr)
+        temp_dir = None
+        if use_temp_dir:
+            with self._timed('files'):
+                temp_dir = self.scratch_pool.acquire()
         try:
-            if self.pass_stdin:
-                self.parameters.stdin_redir = os.path.join(temp_dir, 't.in')
-                open(self.parameters.stdin_redir, 'w',
-                     encoding='utf8').write(self.stdin)
-            if self.capture_stdout:
-                self.parameters.stdout_redir = os.path.join(temp_dir, 't.out')
-            if self.capture_stderr:
-                self.parameters.stderr_redir = os.path.join(temp_dir, 't.err')
-            self._do_run()
-            try:
-                if self.capture_stdout:
-                    self.stdout = open(
-                        self.parameters.stdout_redir, 'r',
-                        encoding='utf8').read()
+            with self._timed('files'):
+                if stdin_file is not None:
+                    self.parameters.stdin_redir = stdin_file
+                elif self.pass_stdin:
+                    self.parameters.stdin_redir = os.path.join(temp_dir,
+                                                               't.in')
+                    self.__write_input(self.parameters.stdin_redir,
+                                       self.stdin)
+                if self.capture_stdout and self.stdout_file is not None:
+                    self.parameters.stdout_redir = os.path.abspath(
+                        fspath(self.stdout_file))
+                elif self.capture_stdout:
+                    self.parameters.stdout_redir = os.path.join(temp_dir,
+                                                                't.out')
                 if self.capture_stderr:
-                    self.stderr = open(
-                        self.parameters.stderr_redir, 'r',
-                        encoding='utf8').read()
-            except FileNotFoundError:
-                pass
+                    self.parameters.stderr_redir = os.path.join(temp_dir,
+                                                                't.err')
+            with ExitStack() as stack:
+                if scheduler_enabled():
+                    stack.enter_context(memory_scheduler().admit(
+                        self.parameters.memory_limit))
+                if self.__use_cpu_slots():
+                    self.parameters.affinity = stack.enter_context(
+                        cpu_slots().slot())
+                self._do_run()
+            with self._timed('files'):
+                if read_stdout:
+                    self.stdout = self.__read_output(
+                        self.parameters.stdout_redir)
+                if self.capture_stderr:
+                    self.stderr = self.__read_output(
+                        self.parameters.stderr_redir)
         finally:
             self.parameters = old_parameters
-            if create_temp_dir:
-                shutil.rmtree(temp_dir)
+            if temp_dir is not None:
+                with self._timed('files'):
+                    self.scratch_pool.release(temp_dir)
+
+    def iter_batch(self, parameters_list, jobs=None, poll_interval=None):
+        '''Runs the programs with each of parameters_list in one runner
+        process, up to jobs of them concurrently, and yields the pairs
+        (index, Results) in the order the programs terminate
+
+        The runner checks the limits every poll_interval seconds (0.005 by
+        default, the values below 0.001 are rounded up to it), the
+        termination is detected immediately. The temporary
+        files (stdin, stdout, stderr) are not created here, set the
+        redirections in the parameters instead. The memory scheduler and CPU
+        slots are not used, as the runner limits the number of concurrent
+        programs itself'''
+        if RunnerFeature.BATCH not in self.info.features:
+            raise RunnerError('runner does not support batch mode')
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        batch = {'jobs': jobs,
+                 'runs': [json.loads(parameters_to_json(parameters))
+                          for parameters in parameters_list]}
+        if poll_interval is not None:
+            batch['poll-interval'] = poll_interval
+        process = subprocess.Popen([self.runner_path, '--batch'],
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        with process:
+            process.stdin.write(json.dumps(batch))
+            process.stdin.close()
+            for line in process.stdout:
+                item = json.loads(line)
+                yield (typecheck(int, item['index']),
+                       dict_to_results(item['results']))
+        if process.returncode != 0:
+            raise RunnerError('runner exited with exitcode = {}'
+                              .format(process.returncode))
+
+    def run_batch(self, parameters_list, jobs=None, poll_interval=None):
+        '''Same as iter_batch(), but returns the list of Results in the same
+        order as parameters_list'''
+        parameters_list = list(parameters_list)
+        results = [None] * len(parameters_list)
+        for index, item in self.iter_batch(parameters_list, jobs,
+                                           poll_interval):
+            results[index] = item
+        return results
+
+    def calibrate(self, runs=100, executable=None, launch_mode=None):
+        '''Runs a trivial program (true or the runner itself) runs times and
+        returns RunnerBaseline with the median clock time, CPU time and the
+        median duration of each phase of run() (see RUN_PHASES). The baseline
+        is also kept in self.baseline, so it can be reported alongside the
+        results or subtracted from them
+
+        launch_mode (LaunchMode) allows to compare the latency of the
+        different ways to start the program'''
+        if executable is None:
+            executable = shutil.which('true')
+        args = []
+        if executable is None:
+            executable, args = self.runner_path, ['-?']
+        saved = (self.parameters, self.pass_stdin, self.capture_stdout,
+                 self.capture_stderr, self.stdin, self.stdout_file)
+        self.parameters = Parameters(executable=executable, args=args,
+                                     launch_mode=launch_mode)
+        self.pass_stdin = self.capture_stdout = self.capture_stderr = True
+        self.stdin = ''
+        self.stdout_file = None
+        samples = []
+        try:
+            for _ in range(runs):
+                self.run()
+                samples += [(self.results, self.phases)]
+        finally:
+            (self.parameters, self.pass_stdin, self.capture_stdout,
+             self.capture_stderr, self.stdin, self.stdout_file) = saved
+        self.baseline = RunnerBaseline(
+            runs=runs,
+            clock_time=statistics.median(
+                results.clock_time for results, _ in samples),
+            time=statistics.median(results.time for results, _ in samples),
+            phases=OrderedDict(
+                (phase, statistics.median(phases[phase]
+                                          for _, phases in samples))
+                for phase in RUN_PHASES))
+        return self.baseline
 
     def __init__(self, runner_path=None):
         # TODO : runner must capture stdout instead of creating temp files (?)
@@ -216,12 +516,21 @@ class Runner:
         if runner_path is None:
             raise RunnerError('runner executable not found')
         self.runner_path = runner_path
+        self.scratch_pool = scratch_pool()
         self.parameters = Parameters()
         self.results = None
         self.pass_stdin = False
         self.capture_stdout = False
         self.capture_stderr = False
+        # stdin may be str, bytes-like (both are written into a temporary
+        # file) or a path to the file which is passed to the program as is
         self.stdin = ''
+        # if stdout_file is set, the captured stdout is written there directly
+        # instead of stdout. With parameters.hash_stdout, the captured stdout
+        # is not read either, only results.stdout_digest is filled
+        self.stdout_file = None
         self.stdout = ''
         self.stderr = ''
+        self.phases = OrderedDict()
+        self.baseline = None
         self.info = self.get_runner_info()
@@ -0,0 +1,171 @@
+import itertools
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from .config import config
+from .locks import locked, runtime_dir
+
+MEMINFO_PATH = '/proc/meminfo'
+
+
+def available_memory(meminfo_path=MEMINFO_PATH):
+    '''Returns MemAvailable from /proc/meminfo in MBytes, or None if it
+    cannot be read'''
+    try:
+        with open(meminfo_path, 'r', encoding='ascii') as meminfo:
+            for line in meminfo:
+                key, _, value = line.partition(':')
+                if key == 'MemAvailable':
+                    return int(value.split()[0]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_all(fd):
+    os.lseek(fd, 0, os.SEEK_SET)
+    chunks = []
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks += [chunk]
+
+
+def _write_all(fd, data):
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.ftruncate(fd, 0)
+    while data:
+        data = data[os.write(fd, data):]
+
+
+class MemoryScheduler:
+    '''Admits the runs so that the sum of their memory limits fits into the
+    memory budget
+
+    The run which doesn't fit waits until some of the running ones finish.
+    The smaller runs which fit can be admitted before it, so the budget is
+    packed as tight as possible. If nothing is running, the run is admitted
+    even if it exceeds the budget, so the large runs never wait forever
+
+    If lock_dir is given, the budget is also shared with the other processes
+    using the same lock_dir: the admitted runs are listed in the file there
+    (locked while it's updated), with the pid of their process, so the runs of
+    the processes which died are dropped. As the other processes cannot notify
+    about the finished runs, the waiting run checks again every POLL_INTERVAL
+    seconds'''
+
+    POLL_INTERVAL = 0.01
+    RUNS_FILE = 'memory.runs'
+
+    __run_ids = itertools.count()
+
+    @staticmethod
+    def __parse_runs(data):
+        runs = []
+        for line in data.decode('ascii', 'replace').splitlines():
+            try:
+                pid, run_id, memory = line.split()
+                runs += [(int(pid), int(run_id), float(memory))]
+            except ValueError:
+                continue
+        return [run for run in runs if _pid_alive(run[0])]
+
+    @staticmethod
+    def __format_runs(runs):
+        return ''.join('{} {} {!r}\n'.format(*run)
+                       for run in runs).encode('ascii')
+
+    def __try_add(self, run):
+        with locked(self.lock_dir / self.RUNS_FILE) as fd:
+            runs = self.__parse_runs(_read_all(fd))
+            used = sum(memory for _, _, memory in runs)
+            admitted = not runs or used + run[2] <= self.budget
+            if admitted:
+                runs += [run]
+            _write_all(fd, self.__format_runs(runs))
+            return admitted
+
+    def __remove(self, run):
+        with locked(self.lock_dir / self.RUNS_FILE) as fd:
+            runs = [other for other in self.__parse_runs(_read_all(fd))
+                    if other[:2] != run[:2]]
+            _write_all(fd, self.__format_runs(runs))
+
+    def __try_admit(self, run):
+        if self.running and self.used + run[2] > self.budget:
+            return False
+        return self.lock_dir is None or self.__try_add(run)
+
+    @contextmanager
+    def admit(self, memory):
+        memory = max(memory or 0.0, 0.0)
+        run = (os.getpid(), next(self.__run_ids), memory)
+        timeout = self.POLL_INTERVAL if self.lock_dir is not None else None
+        with self.__cond:
+            while not self.__try_admit(run):
+                self.__cond.wait(timeout)
+            self.used += memory
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self.__cond:
+                if self.lock_dir is not None:
+                    self.__remove(run)
+                self.used -= memory
+                self.running -= 1
+                self.__cond.notify_all()
+
+    def __init__(self, budget, lock_dir=None):
+        self.budget = budget
+        self.lock_dir = Path(lock_dir) if lock_dir is not None else None
+        self.used = 0.0
+        self.running = 0
+        self.__cond = threading.Condition()
+
+
+def scheduler_enabled():
+    return config()['scheduler']['enabled']
+
+
+def memory_budget():
+    '''Returns the memory budget in MBytes: the budget from the config, but
+    not more than the available memory'''
+    budget = config()['scheduler']['memory-budget']
+    available = available_memory()
+    if available is not None:
+        available *= config()['scheduler']['available-ratio']
+        if budget is None or available < budget:
+            budget = available
+    if budget is None:
+        budget = float('inf')
+    return budget
+
+
+__SCHEDULERS = {}
+__SCHEDULERS_LOCK = threading.Lock()
+
+
+def memory_scheduler():
+    '''Returns MemoryScheduler for runtime_dir(), which is shared in the whole
+    process. The budget is computed when it's requested first, and it's
+    shared between taker processes via the file in runtime_dir(). Runner uses
+    it only if scheduler_enabled()'''
+    lock_dir = runtime_dir()
+    with __SCHEDULERS_LOCK:
+        if lock_dir not in __SCHEDULERS:
+            __SCHEDULERS[lock_dir] = MemoryScheduler(memory_budget(),
+                                                     lock_dir)
+        return __SCHEDULERS[lock_dir]
@@ -0,0 +1,126 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from compat import fspath
+from .config import config
+
+SHM_PATH = Path('/dev/shm')
+
+
+def _free_space(the_path):
+    stat = os.statvfs(fspath(the_path))
+    return stat.f_bavail * stat.f_frsize / 1048576
+
+
+def default_scratch_root(min_free=None):
+    '''Returns /dev/shm if it's available, writable and has at least min_free
+    MBytes of free space. Otherwise, returns the default temporary
+    directory'''
+    if min_free is None:
+        min_free = config()['scratch']['min-free']
+    try:
+        if (SHM_PATH.is_dir() and os.access(fspath(SHM_PATH), os.W_OK) and
+                _free_space(SHM_PATH) >= min_free):
+            return SHM_PATH
+    except OSError:
+        pass
+    return Path(tempfile.gettempdir())
+
+
+def _clean_dir(the_dir):
+    for item in os.scandir(fspath(the_dir)):
+        if item.is_dir(follow_symlinks=False):
+            shutil.rmtree(item.path)
+        else:
+            os.unlink(item.path)
+
+
+class ScratchPool:
+    '''Pool of scratch directories for temporary files
+
+    The directories are reused between the runs: the directory returned to
+    the pool is cleaned, but not removed, so the next run gets the existing
+    empty directory instead of creating a new one'''
+
+    def acquire(self):
+        with self.__lock:
+            if self.__free:
+                return self.__free.pop()
+        the_dir = Path(tempfile.mkdtemp(self.suffix, self.prefix,
+                                        fspath(self.root)))
+        with self.__lock:
+            self.__all.add(the_dir)
+        return the_dir
+
+    def release(self, the_dir):
+        try:
+            _clean_dir(the_dir)
+        except OSError:
+            # the directory is broken, so don't reuse it
+            with self.__lock:
+                self.__all.discard(the_dir)
+            shutil.rmtree(fspath(the_dir), ignore_errors=True)
+            return
+        with self.__lock:
+            self.__free.append(the_dir)
+
+    @contextmanager
+    def directory(self):
+        the_dir = self.acquire()
+        try:
+            yield the_dir
+        finally:
+            self.release(the_dir)
+
+    def cleanup(self):
+        '''Removes all the directories which are not in use'''
+        with self.__lock:
+            free, self.__free = self.__free, []
+            self.__all.difference_update(free)
+        for the_dir in free:
+            shutil.rmtree(fspath(the_dir), ignore_errors=True)
+
+    def __init__(self, root, prefix='taker-', suffix=''):
+        self.root = Path(root)
+        self.prefix = prefix
+        self.suffix = suffix
+        self.__lock = threading.Lock()
+        self.__free = []
+        self.__all = set()
+
+
+__POOLS = {}
+__POOLS_LOCK = threading.Lock()
+
+
+def scratch_root():
+    '''Returns the scratch directory set in the runner config, or the default
+    one if it's not set'''
+    root = config()['scratch']['dir']
+    if root is None:
+        return default_scratch_root()
+    return Path(root)
+
+
+def scratch_pool(root=None):
+    '''Returns the pool of scratch directories located in root, which is
+    shared in the whole process. If root is None, scratch_root() is used'''
+    if root is None:
+        root = scratch_root()
+    root = Path(root).absolute()
+    with __POOLS_LOCK:
+        if root not in __POOLS:
+            __POOLS[root] = ScratchPool(root)
+        return __POOLS[root]
+
+
+def _cleanup_pools():
+    for pool in __POOLS.values():
+        pool.cleanup()
+
+
+atexit.register(_cleanup_pools)
@@ -2,6 +2,7 @@
 #include <cstring>
 #include <iostream>
 #include "processrunner.hpp"
+#include "supervisor.hpp"
 
 int main(int argc, char **argv) {
   using namespace UnixRunner;
@@ -14,6 +15,13 @@ int main(int argc, char **argv) {
   Json::Value value;
   std::cin >> value;
 
+  if (argc == 2 && strcmp(argv[1], "--batch") == 0) {
+    Supervisor supervisor;
+    supervisor.loadFromJson(value);
+    supervisor.run(std::cout);
+    return 0;
+  }
+
   ProcessRunner runner;
   runner.parameters().loadFromJson(value);
   runner.execute();
@@ -0,0 +1,125 @@
+/*
+ * Copyright (C) 2019  Alexander Kernozhitsky <sh200105@mail.ru>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+
+#include "perfcounters.hpp"
+#include <unistd.h>
+#include <cstring>
+#include "config.hpp"
+
+#ifdef HAVE_PERF_EVENT
+#include <linux/perf_event.h>
+#include <sys/syscall.h>
+#endif
+
+namespace UnixRunner {
+
+#ifdef HAVE_PERF_EVENT
+
+namespace {
+
+struct CounterInfo {
+  const char *name;
+  uint32_t type;
+  uint64_t config;
+};
+
+// software counters are always available, so they are collected together
+// with the hardware ones and serve as fallback when the latter are missing
+const CounterInfo COUNTERS[] = {
+    {"instructions", PERF_TYPE_HARDWARE, PERF_COUNT_HW_INSTRUCTIONS},
+    {"cycles", PERF_TYPE_HARDWARE, PERF_COUNT_HW_CPU_CYCLES},
+    {"cache-misses", PERF_TYPE_HARDWARE, PERF_COUNT_HW_CACHE_MISSES},
+    {"branch-misses", PERF_TYPE_HARDWARE, PERF_COUNT_HW_BRANCH_MISSES},
+    {"task-clock", PERF_TYPE_SOFTWARE, PERF_COUNT_SW_TASK_CLOCK},
+    {"context-switches", PERF_TYPE_SOFTWARE, PERF_COUNT_SW_CONTEXT_SWITCHES},
+    {"page-faults", PERF_TYPE_SOFTWARE, PERF_COUNT_SW_PAGE_FAULTS}};
+
+int perfEventOpen(const CounterInfo &info, pid_t pid) {
+  struct perf_event_attr attr;
+  memset(&attr, 0, sizeof(attr));
+  attr.size = sizeof(attr);
+  attr.type = info.type;
+  attr.config = info.config;
+  attr.read_format =
+      PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING;
+  attr.disabled = 1;
+  attr.enable_on_exec = 1;
+  attr.inherit = 1;
+  attr.exclude_kernel = 1;
+  attr.exclude_hv = 1;
+  return static_cast<int>(
+      syscall(__NR_perf_event_open, &attr, pid, -1, -1, PERF_FLAG_FD_CLOEXEC));
+}
+
+}  // namespace
+
+bool PerfCounters::supported() { return true; }
+
+void PerfCounters::open(pid_t pid) {
+  close();
+  for (const CounterInfo &info : COUNTERS) {
+    int fd = perfEventOpen(info, pid);
+    if (fd >= 0) {
+      counters_.push_back({info.name, fd});
+    }
+  }
+}
+
+std::map<std::string, uint64_t> PerfCounters::read() const {
+  std::map<std::string, uint64_t> result;
+  for (const Counter &counter : counters_) {
+    uint64_t values[3];  // value, time enabled, time running
+    if (::read(counter.fd, values, sizeof(values)) != sizeof(values)) {
+      continue;
+    }
+    if (values[1] != 0 && values[2] == 0) {
+      // the counter was never scheduled onto the CPU
+      continue;
+    }
+    if (values[2] != 0 && values[2] < values[1]) {
+      // the counters were multiplexed, so scale the value
+      values[0] = static_cast<uint64_t>(static_cast<double>(values[0]) *
+                                        values[1] / values[2]);
+    }
+    result[counter.name] = values[0];
+  }
+  return result;
+}
+
+#else
+
+bool PerfCounters::supported() { return false; }
+
+void PerfCounters::open(pid_t) {}
+
+std::map<std::string, uint64_t> PerfCounters::read() const { return {}; }
+
+#endif  // HAVE_PERF_EVENT
+
+void PerfCounters::close() {
+  for (const Counter &counter : counters_) {
+    ::close(counter.fd);
+  }
+  counters_.clear();
+}
+
+PerfCounters::PerfCounters() : counters_() {}
+
+PerfCounters::~PerfCounters() { close(); }
+
+}  // namespace UnixRunner
@@ -0,0 +1,59 @@
+/*
+ * Copyright (C) 2019  Alexander Kernozhitsky <sh200105@mail.ru>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+
+#ifndef PERFCOUNTERS_H
+#define PERFCOUNTERS_H
+
+#include <sys/types.h>
+#include <cstdint>
+#include <map>
+#include <string>
+#include <vector>
+
+namespace UnixRunner {
+
+// Performance counters of the child process, collected with
+// perf_event_open(). The counters which are unavailable on the machine (for
+// example, hardware ones in virtual machines) are silently skipped
+class PerfCounters {
+ public:
+  static bool supported();
+
+  // opens the counters for the process pid, they start counting when the
+  // process calls exec()
+  void open(pid_t pid);
+  std::map<std::string, uint64_t> read() const;
+  void close();
+
+  PerfCounters();
+  PerfCounters(const PerfCounters &) = delete;
+  PerfCounters &operator=(const PerfCounters &) = delete;
+  ~PerfCounters();
+
+ private:
+  struct Counter {
+    std::string name;
+    int fd;
+  };
+
+  std::vector<Counter> counters_;
+};
+
+}  // namespace UnixRunner
+
+#endif  // PERFCOUNTERS_H
@@ -18,8 +18,10 @@
 #include "processrunner.hpp"
 #include <errno.h>
 #include <fcntl.h>
+#include <sched.h>
 #include <signal.h>
 #include <sys/resource.h>
+#include <sys/stat.h>
 #include <sys/types.h>
 #include <sys/wait.h>
 #include <unistd.h>
@@ -29,6 +31,7 @@
 #include <fstream>
 #include <iostream>
 #include <map>
+#include <memory>
 #include <sstream>
 #include "config.hpp"
 #include "utils.hpp"
@@ -39,44 +42,78 @@ extern char **environ;
 
 namespace UnixRunner {
 
-pid_t g_activeChild = 0;
+const int MAX_ACTIVE_CHILDREN = 1024;
+
+pid_t g_activeChildren[MAX_ACTIVE_CHILDREN] = {};
+int g_activeChildCount = 0;
 
 void termSignal(int) {
-  if (g_activeChild != 0) {
-    kill(g_activeChild, SIGKILL);
+  for (pid_t pid : g_activeChildren) {
+    if (pid != 0) {
+      kill(pid, SIGKILL);
+    }
   }
   kill(0, SIGKILL);
 }
 
+// Registers the child, so it's killed if the runner is terminated. The signal
+// handlers are installed while there is at least one active child
 class ActiveChildLock {
  private:
-  struct sigaction oldActions_[3];
+  static struct sigaction oldActions_[3];
+  int slot_;
 
  public:
-  ActiveChildLock(pid_t pid) {
-    if (g_activeChild != 0) {
-      throw std::runtime_error("active child already set");
+  ActiveChildLock(pid_t pid) : slot_(-1) {
+    for (int i = 0; i < MAX_ACTIVE_CHILDREN; ++i) {
+      if (g_activeChildren[i] == 0) {
+        slot_ = i;
+        break;
+      }
     }
-    g_activeChild = pid;
-    struct sigaction sigHandler;
-    zeroMem(sigHandler);
-    for (int i = 0; i < 3; ++i) {
-      zeroMem(oldActions_[i]);
+    if (slot_ < 0) {
+      throw std::runtime_error("too many active children");
     }
-    sigHandler.sa_handler = termSignal;
-    sigaction(SIGINT, &sigHandler, &oldActions_[0]);
-    sigaction(SIGTERM, &sigHandler, &oldActions_[1]);
-    sigaction(SIGQUIT, &sigHandler, &oldActions_[2]);
+    if (g_activeChildCount++ == 0) {
+      struct sigaction sigHandler;
+      zeroMem(sigHandler);
+      for (int i = 0; i < 3; ++i) {
+        zeroMem(oldActions_[i]);
+      }
+      sigHandler.sa_handler = termSignal;
+      sigaction(SIGINT, &sigHandler, &oldActions_[0]);
+      sigaction(SIGTERM, &sigHandler, &oldActions_[1]);
+      sigaction(SIGQUIT, &sigHandler, &oldActions_[2]);
+    }
+    g_activeChildren[slot_] = pid;
   }
 
+  ActiveChildLock(const ActiveChildLock &) = delete;
+  ActiveChildLock &operator=(const ActiveChildLock &) = delete;
+
   ~ActiveChildLock() {
-    g_activeChild = 0;
-    sigaction(SIGINT, &oldActions_[0], nullptr);
-    sigaction(SIGTERM, &oldActions_[1], nullptr);
-    sigaction(SIGQUIT, &oldActions_[2], nullptr);
+    g_activeChildren[slot_] = 0;
+    if (--g_activeChildCount == 0) {
+      sigaction(SIGINT, &oldActions_[0], nullptr);
+      sigaction(SIGTERM, &oldActions_[1], nullptr);
+      sigaction(SIGQUIT, &oldActions_[2], nullptr);
+    }
   }
 };
 
+struct sigaction ActiveChildLock::oldActions_[3];
+
+bool createPipe(int fds[2]) {
+#ifdef HAVE_PIPE2
+  return pipe2(fds, O_CLOEXEC) == 0;
+#else
+  // empty comments prevent clang-format from removing line breaks
+  return pipe(fds) == 0 &&                        //
+         fcntl(fds[0], F_SETFD, FD_CLOEXEC) == 0 &&  //
+         fcntl(fds[1], F_SETFD, FD_CLOEXEC) == 0;
+#endif
+}
+
 RunnerError::RunnerError(const std::string &comment)
     : std::runtime_error(comment) {}
 
@@ -94,8 +131,14 @@ void ProcessRunner::Parameters::validate() {
   VALIDATE_ASSERT(timeLimit > 0);
   VALIDATE_ASSERT(idleLimit > 0);
   VALIDATE_ASSERT(memoryLimit > 0);
+  VALIDATE_ASSERT(outputLimit >= 0);
+  VALIDATE_ASSERT(!hashStdout || !stdoutRedir.empty());
+  VALIDATE_ASSERT(traceInterval >= 0);
   VALIDATE_ASSERT(fileIsExecutable(executable));
   VALIDATE_ASSERT(stdinRedir.empty() || fileIsReadable(stdinRedir));
+  for (int cpu : affinity) {
+    VALIDATE_ASSERT(cpu >= 0 && cpu < CPU_SETSIZE);
+  }
 }
 
 #undef VALIDATE_ASSERT
@@ -105,6 +148,7 @@ void ProcessRunner::Parameters::loadFromJson(const Json::Value &value) {
   timeLimit = value.get("time-limit", Value(timeLimit)).asDouble();
   idleLimit = value.get("idle-limit", Value(timeLimit * 3.5)).asDouble();
   memoryLimit = value.get("memory-limit", Value(memoryLimit)).asDouble();
+  outputLimit = value.get("output-limit", Value(0.0)).asDouble();
   executable = value.get("executable", Value("")).asString();
   clearEnv = value.get("clear-env", Value(clearEnv)).asBool();
   if (value.isMember("env")) {
@@ -139,6 +183,21 @@ void ProcessRunner::Parameters::loadFromJson(const Json::Value &value) {
   isolateDir = value.get("isolate-dir", Value("")).asString();
   isolatePolicy = strToIsolatePolicy(
       value.get("isolate-policy", Value("normal")).asString());
+  affinity.clear();
+  if (value.isMember("affinity")) {
+    auto affinityNode = value["affinity"];
+    if (!affinityNode.isArray()) {
+      throw std::runtime_error("affinity is not an array");
+    }
+    for (Json::ArrayIndex i = 0; i < affinityNode.size(); ++i) {
+      affinity.push_back(affinityNode[i].asInt());
+    }
+  }
+  perfCounters = value.get("perf-counters", Value(false)).asBool();
+  traceInterval = value.get("trace-interval", Value(0.0)).asDouble();
+  launchMode =
+      strToLaunchMode(value.get("launch-mode", Value("auto")).asString());
+  hashStdout = value.get("hash-stdout", Value(false)).asBool();
 }
 
 void ProcessRunner::Parameters::loadFromJsonStr(const std::string &json) {
@@ -150,9 +209,10 @@ void ProcessRunner::Parameters::loadFromJsonStr(const std::string &json) {
 
 const char *ProcessRunner::runStatusToStr(ProcessRunner::RunStatus status) {
   static const char *RUN_STATUS_STRS[] = {
-      "ok",           "time-limit",    "idle-limit",
-      "memory-limit", "runtime-error", "security-error",
-      "run-fail",     "running",       "none"};
+      "ok",             "time-limit",     "idle-limit",
+      "memory-limit",   "output-limit",   "runtime-error",
+      "security-error", "run-fail",       "running",
+      "none"};
   return RUN_STATUS_STRS[static_cast<int>(status)];
 }
 
@@ -169,6 +229,56 @@ ProcessRunner::IsolatePolicy ProcessRunner::strToIsolatePolicy(
   throw RunnerValidateError(value + " is invalid isolate-policy");
 }
 
+void ProcessRunner::ResourceUsage::loadFromRusage(
+    const struct rusage &resources) {
+  maxRss = resources.ru_maxrss / 1048576.0 * maxRssBytes;
+  voluntarySwitches = resources.ru_nvcsw;
+  involuntarySwitches = resources.ru_nivcsw;
+  minorFaults = resources.ru_minflt;
+  majorFaults = resources.ru_majflt;
+  blockInput = resources.ru_inblock;
+  blockOutput = resources.ru_oublock;
+}
+
+ProcessRunner::LaunchMode ProcessRunner::strToLaunchMode(
+    const std::string &value) {
+  static const char *LAUNCH_MODE_STRS[] = {"auto", "fork", "vfork"};
+  int strCount = sizeof(LAUNCH_MODE_STRS) / sizeof(LAUNCH_MODE_STRS[0]);
+  for (int i = 0; i < strCount; ++i) {
+    if (LAUNCH_MODE_STRS[i] == value) {
+      return static_cast<LaunchMode>(i);
+    }
+  }
+  throw RunnerValidateError(value + " is invalid launch-mode");
+}
+
+Json::Value ProcessRunner::ResourceUsage::saveToJson() const {
+  Json::Value value;
+  value["max-rss"] = maxRss;
+  value["voluntary-switches"] = Json::Int64(voluntarySwitches);
+  value["involuntary-switches"] = Json::Int64(involuntarySwitches);
+  value["minor-faults"] = Json::Int64(minorFaults);
+  value["major-faults"] = Json::Int64(majorFaults);
+  value["block-input"] = Json::Int64(blockInput);
+  value["block-output"] = Json::Int64(blockOutput);
+  return value;
+}
+
+// saves the values as integers in the given units, each value except the
+// first one is stored as difference with the previous one
+template <typename Getter>
+Json::Value deltaEncode(const std::vector<ProcessRunner::TraceSample> &trace,
+                        double unit, Getter getter) {
+  Json::Value result(Json::arrayValue);
+  int64_t last = 0;
+  for (const auto &sample : trace) {
+    int64_t value = llround(getter(sample) / unit);
+    result.append(Json::Int64(value - last));
+    last = value;
+  }
+  return result;
+}
+
 Json::Value ProcessRunner::RunResults::saveToJson() const {
   Json::Value value;
   value["time"] = time;
@@ -182,6 +292,39 @@ Json::Value ProcessRunner::RunResults::saveToJson() const {
   }
   value["status"] = ProcessRunner::runStatusToStr(status);
   value["comment"] = comment;
+  if (hasCounters) {
+    Json::Value countersNode(Json::objectValue);
+    for (const auto &iter : counters) {
+      countersNode[iter.first] = Json::Value(Json::UInt64(iter.second));
+    }
+    value["counters"] = countersNode;
+  }
+  if (hasRusage) {
+    value["rusage"] = rusage.saveToJson();
+  }
+  if (hasTrace) {
+    // time is stored in microseconds, memory in KiB
+    Json::Value traceNode;
+    traceNode["clock-time"] = deltaEncode(
+        trace, 1e-6, [](const TraceSample &s) { return s.clockTime; });
+    traceNode["time"] = deltaEncode(
+        trace, 1e-6, [](const TraceSample &s) { return s.time; });
+    traceNode["rss"] = deltaEncode(
+        trace, 1.0 / 1024, [](const TraceSample &s) { return s.rss; });
+    traceNode["vm"] = deltaEncode(
+        trace, 1.0 / 1024, [](const TraceSample &s) { return s.vm; });
+    value["trace"] = traceNode;
+  }
+  if (!phases.empty()) {
+    Json::Value phasesNode(Json::objectValue);
+    for (const auto &iter : phases) {
+      phasesNode[iter.first] = iter.second;
+    }
+    value["phases"] = phasesNode;
+  }
+  if (!stdoutDigest.empty()) {
+    value["stdout-digest"] = stdoutDigest;
+  }
   return value;
 }
 
@@ -200,6 +343,15 @@ Json::Value ProcessRunner::runnerInfoJson() const {
   res["version-number"] = TAKER_UNIXRUN_VERSION_NUMBER;
   res["license"] = "GPL-3+";
   res["features"] = Json::Value(Json::arrayValue);
+#ifdef HAVE_SCHED_SETAFFINITY
+  res["features"].append("affinity");
+#endif
+  if (PerfCounters::supported()) {
+    res["features"].append("perf-counters");
+  }
+  res["features"].append("batch");
+  res["features"].append("output-limit");
+  res["features"].append("hash-stdout");
   return res;
 }
 
@@ -214,125 +366,318 @@ const ProcessRunner::RunResults &ProcessRunner::results() const {
 }
 
 void ProcessRunner::execute() {
+  start();
+  while (poll()) {
+    usleep(1'000);
+  }
+}
+
+void ProcessRunner::start() {
   if (results_.status == RunStatus::RUNNING) {
     throw std::runtime_error("process is already running");
   }
   try {
-    doExecute();
+    doStart();
   } catch (const std::exception &e) {
     results_.status = RunStatus::RUN_FAIL;
     results_.comment = getFullExceptionMessage(e);
   }
+  if (results_.status != RunStatus::RUNNING) {
+    childLock_.reset();
+    perfCounters_.close();
+    closeOutput();
+  }
 }
 
-void ProcessRunner::doExecute() {
+bool ProcessRunner::poll() {
+  if (results_.status != RunStatus::RUNNING) {
+    return false;
+  }
+  try {
+    if (doPoll()) {
+      return true;
+    }
+  } catch (const std::exception &e) {
+    results_.status = RunStatus::RUN_FAIL;
+    results_.comment = getFullExceptionMessage(e);
+  }
+  results_.phases["wait"] = timer_.getTime() - execTime_;
+  try {
+    collectCounters();
+  } catch (const std::exception &e) {
+    results_.comment = getFullExceptionMessage(e);
+  }
+  if (outputFd_ >= 0 && parameters_.hashStdout &&
+      results_.status != RunStatus::RUN_FAIL) {
+    results_.stdoutDigest = outputHash_.hexDigest();
+  }
+  closeOutput();
+  childLock_.reset();
+  return false;
+}
+
+bool ProcessRunner::running() const {
+  return results_.status == RunStatus::RUNNING;
+}
+
+pid_t ProcessRunner::pid() const { return pid_; }
+
+void ProcessRunner::doStart() {
+  Timer spawnTimer;
   parameters_.validate();
   results_ = RunResults();
   results_.status = RunStatus::RUNNING;
-#ifdef HAVE_PIPE2
-  if (pipe2(pipe_, O_CLOEXEC) != 0) {
-#else
-  // empty comments prevent clang-format from removing line breaks
-  if (pipe(pipe_) != 0 ||                           //
-      fcntl(pipe_[0], F_SETFD, FD_CLOEXEC) != 0 ||  //
-      fcntl(pipe_[1], F_SETFD, FD_CLOEXEC) != 0) {
-#endif
+  if (!createPipe(pipe_)) {
     throw RunnerError(getFullErrorMessage("unable to create pipe", errno));
   }
-  pid_ = fork();
+  syncPipe_[0] = syncPipe_[1] = -1;
+  if (parameters_.perfCounters && !createPipe(syncPipe_)) {
+    int errCode = errno;
+    close(pipe_[0]);
+    close(pipe_[1]);
+    throw RunnerError(getFullErrorMessage("unable to create pipe", errCode));
+  }
+  prepareExec();
+  // the timer is started before the launch, so the "exec" phase covers
+  // creating the child too
+  timer_.start();
+  pid_ = launchChild();
   if (pid_ < 0) {
     int errCode = errno;
+    childStack_.reset();
     close(pipe_[0]);
     close(pipe_[1]);
+    if (syncPipe_[0] >= 0) {
+      close(syncPipe_[0]);
+      close(syncPipe_[1]);
+    }
     throw RunnerError(getFullErrorMessage("unable to fork()", errCode));
   }
   if (pid_ == 0) {
-    close(pipe_[0]);
-    try {
-      handleChild();
-    } catch (const std::exception &e) {
-      childFailure(getFullExceptionMessage(e));
-    }
+    runChild();
   }
-  ActiveChildLock lock(pid_);
+  childLock_.reset(new ActiveChildLock(pid_));
   close(pipe_[1]);
+  startCounters();
+  results_.phases["spawn"] = spawnTimer.getTime();
   handleParent();
 }
 
+void ProcessRunner::prepareExec() {
+  // argv and environment are prepared in the parent, so the child only has
+  // to make system calls before exec. This is required for vfork-like
+  // launch, as the child shares the memory with the parent there
+  argStrings_.clear();
+  argStrings_.push_back(parameters_.executable);
+  argStrings_.insert(argStrings_.end(), parameters_.args.begin(),
+                     parameters_.args.end());
+  envStrings_.clear();
+  if (!parameters_.clearEnv) {
+    for (char **item = environ; *item != nullptr; ++item) {
+      std::string envItem = *item;
+      std::string key = envItem.substr(0, envItem.find('='));
+      if (parameters_.env.find(key) == parameters_.env.end()) {
+        envStrings_.push_back(envItem);
+      }
+    }
+  }
+  for (const auto &iter : parameters_.env) {
+    envStrings_.push_back(iter.first + "=" + iter.second);
+  }
+  argv_.clear();
+  for (std::string &arg : argStrings_) {
+    argv_.push_back(&arg[0]);
+  }
+  argv_.push_back(nullptr);
+  envp_.clear();
+  for (std::string &envItem : envStrings_) {
+    envp_.push_back(&envItem[0]);
+  }
+  envp_.push_back(nullptr);
+}
+
+ProcessRunner::LaunchMode ProcessRunner::chooseLaunchMode() const {
+  // with perf counters, the child must wait for the parent before exec,
+  // which is impossible when the parent is suspended until exec
+  bool canUseVfork = !parameters_.perfCounters;
+#ifndef __linux__
+  canUseVfork = false;
+#endif
+  switch (parameters_.launchMode) {
+    case LaunchMode::AUTO:
+      return canUseVfork ? LaunchMode::VFORK : LaunchMode::FORK;
+    case LaunchMode::VFORK:
+      if (!canUseVfork) {
+        throw RunnerValidateError("vfork launch mode cannot be used");
+      }
+      return LaunchMode::VFORK;
+    default:
+      return LaunchMode::FORK;
+  }
+}
+
+#ifdef __linux__
+
+int ProcessRunner::cloneEntry(void *runner) {
+  auto self = static_cast<ProcessRunner *>(runner);
+  self->runChild();
+  // not reached, as runChild() either calls exec() or exits
+  self->childFailure(ChildError::UNEXPECTED_END);
+}
+
+#endif
+
+pid_t ProcessRunner::launchChild() {
+  // all the signals are blocked while the child is created, so the signal
+  // handlers of the runner don't run in the child, which shares the memory
+  // with the parent in vfork-like launch. The child resets the handlers and
+  // restores the mask before exec() (see restoreSignals())
+  sigset_t allSignals;
+  sigfillset(&allSignals);
+  sigprocmask(SIG_SETMASK, &allSignals, &savedSigmask_);
+  pid_t result = -1;
+  if (chooseLaunchMode() == LaunchMode::FORK) {
+    result = fork();
+  } else {
+#ifdef __linux__
+    // the parent is suspended until the child calls exec() or exits. The
+    // stack is kept until handleParent() sees that, as the child runs on it
+    // until then. pid_ is shared with the child, so it must be zero while
+    // the child runs
+    const size_t STACK_SIZE = 256 * 1024;
+    childStack_.reset(new char[STACK_SIZE]);
+    pid_ = 0;
+    result = clone(cloneEntry, childStack_.get() + STACK_SIZE,
+                   CLONE_VM | CLONE_VFORK | SIGCHLD, this);
+#else
+    result = fork();
+#endif
+  }
+  if (result != 0) {
+    int errCode = errno;
+    sigprocmask(SIG_SETMASK, &savedSigmask_, nullptr);
+    errno = errCode;
+  }
+  return result;
+}
+
+void ProcessRunner::runChild() noexcept {
+  close(pipe_[0]);
+  handleChild();
+}
+
+void ProcessRunner::startCounters() {
+  if (syncPipe_[0] < 0) {
+    return;
+  }
+  // the counters must be opened before the child calls exec(), so the child
+  // waits until the parent closes the pipe
+  close(syncPipe_[0]);
+  perfCounters_.open(pid_);
+  close(syncPipe_[1]);
+}
+
+void ProcessRunner::waitForCounters() noexcept {
+  if (syncPipe_[0] < 0) {
+    return;
+  }
+  close(syncPipe_[1]);
+  char unused;
+  while (read(syncPipe_[0], &unused, 1) < 0 && errno == EINTR) {
+  }
+  close(syncPipe_[0]);
+}
+
+void ProcessRunner::collectCounters() {
+  if (!parameters_.perfCounters) {
+    return;
+  }
+  results_.hasCounters = true;
+  results_.counters = perfCounters_.read();
+  perfCounters_.close();
+}
+
 void ProcessRunner::handleParent() {
   FileDescriptorOwner fdOwner(pipe_[0]);
-  timer_.start();
 
   // check for RUN_FAIL
-  int msgSize;
-  int bytesRead = read(pipe_[0], &msgSize, sizeof(msgSize));
+  ChildFailure failure;
+  int bytesRead = read(pipe_[0], &failure, sizeof(failure));
+  // the pipe is closed on exec() or exit, so the child doesn't use its stack
+  // anymore
+  childStack_.reset();
   if (bytesRead < 0) {
     parentFailure("unable to read from pipe", errno);
   }
   if (bytesRead > 0) {
-    if (bytesRead != sizeof(msgSize)) {
+    if (bytesRead != sizeof(failure)) {
       parentFailure("unexpected child/parent protocol error");
     }
-    char *message = new char[msgSize + 1];
-    message[msgSize] = 0;
-    int bytesExpected = sizeof(char) * msgSize;
-    trySyscall(read(pipe_[0], message, bytesExpected) == bytesExpected,
-               "unexpected child/parent protocol error (message length"
-               " must be " +
-                   std::to_string(bytesExpected) + ", not " +
-                   std::to_string(bytesRead) + ")");
     results_.status = RunStatus::RUN_FAIL;
-    results_.comment = message;
-    delete[] message;
+    results_.comment = getFullErrorMessage(childErrorMessage(failure.error),
+                                           failure.errcode);
     waitpid(pid_, nullptr, 0);
     return;
   }
+  // the pipe is closed on exec, so the program is started now
+  execTime_ = timer_.getTime();
+  results_.phases["exec"] = execTime_;
 
   // initialize results
   results_.exitCode = results_.signal = 0;
   results_.time = results_.clockTime = 0.0;
   results_.memory = 0.0;
   results_.status = RunStatus::RUNNING;
+  results_.hasTrace = parameters_.traceInterval > 0;
+  currentRss_ = currentVm_ = 0.0;
+  nextTraceTime_ = 0.0;
+  openOutput();
+}
 
-  // wait for process
-  while (results_.status == RunStatus::RUNNING) {
-    // check for time and memory limits
-    updateResultsOnRun();
-    updateVerdicts();
-    if (results_.status != RunStatus::RUNNING) {
-      kill(pid_, SIGKILL);
-      trySyscall(waitpid(pid_, nullptr, 0) >= 0, "unable to wait for process");
-      break;
-    }
-    // check if the process has terminated
-    int status = -1;
+bool ProcessRunner::doPoll() {
+  // check for time, memory and output limits
+  updateResultsOnRun();
+  updateTrace();
+  updateOutput();
+  updateVerdicts();
+  if (results_.status != RunStatus::RUNNING) {
+    kill(pid_, SIGKILL);
     struct rusage resources;
     zeroMem(resources);
-    int pidWaited = wait4(pid_, &status, WNOHANG | WUNTRACED, &resources);
-    if (pidWaited == -1) {
-      // wait4() error
-      int errCode = errno;
+    trySyscall(wait4(pid_, nullptr, 0, &resources) >= 0,
+               "unable to wait for process");
+    results_.rusage.loadFromRusage(resources);
+    results_.hasRusage = true;
+    return false;
+  }
+  // check if the process has terminated
+  int status = -1;
+  struct rusage resources;
+  zeroMem(resources);
+  int pidWaited = wait4(pid_, &status, WNOHANG | WUNTRACED, &resources);
+  if (pidWaited == -1) {
+    // wait4() error
+    int errCode = errno;
+    kill(pid_, SIGKILL);
+    parentFailure("unable to wait for process", errCode);
+  }
+  if (pidWaited != 0) {
+    // the process has changed the state
+    // FIXME : handle stopped/continued processes
+    updateResultsOnTerminate(resources, status);
+    updateOutput();
+    if (results_.status == RunStatus::RUNNING) {
       kill(pid_, SIGKILL);
-      parentFailure("unable to wait for process", errCode);
-    }
-    if (pidWaited != 0) {
-      // the process has changed the state
-      // FIXME : handle stopped/continued processes
-      updateResultsOnTerminate(resources, status);
-      if (results_.status == RunStatus::RUNNING) {
-        kill(pid_, SIGKILL);
-        waitpid(pid_, nullptr, 0);
-        parentFailure(
-            "unexpected process status: waitpid() returned, "
-            "but the process is still alive (status = " +
-            std::to_string(status) + ")");
-      }
-      updateVerdicts();
-      break;
+      waitpid(pid_, nullptr, 0);
+      parentFailure(
+          "unexpected process status: waitpid() returned, "
+          "but the process is still alive (status = " +
+          std::to_string(status) + ")");
     }
-    // wait a little
-    usleep(1'000);
+    updateVerdicts();
+    return false;
   }
+  return true;
 }
 
 #ifdef __linux__
@@ -380,9 +725,11 @@ bool ProcessRunner::updateMemFromProcStatus() {
   if (!procStatus.good()) {
     return false;
   }
+  bool peakFound = false;
   std::string fieldName;
   while (procStatus >> fieldName) {
-    if (fieldName == "VmPeak:") {
+    if (fieldName == "VmPeak:" || fieldName == "VmSize:" ||
+        fieldName == "VmRSS:") {
       int64_t value;
       std::string measureUnit;
       if (!(procStatus >> value >> measureUnit)) {
@@ -391,9 +738,15 @@ bool ProcessRunner::updateMemFromProcStatus() {
       if (multipliers.find(measureUnit) == end(multipliers)) {
         return false;
       }
-      results_.memory =
-          std::max(results_.memory, value * multipliers.at(measureUnit));
-      return true;
+      double valueMb = value * multipliers.at(measureUnit);
+      if (fieldName == "VmPeak:") {
+        results_.memory = std::max(results_.memory, valueMb);
+        peakFound = true;
+      } else if (fieldName == "VmSize:") {
+        currentVm_ = valueMb;
+      } else {
+        currentRss_ = valueMb;
+      }
     } else {
       std::string unused;
       if (!std::getline(procStatus, unused)) {
@@ -401,7 +754,7 @@ bool ProcessRunner::updateMemFromProcStatus() {
       }
     }
   }
-  return false;
+  return peakFound;
 }
 
 #endif  // __linux__
@@ -414,6 +767,15 @@ void ProcessRunner::updateResultsOnRun() {
   results_.clockTime = timer_.getTime();
 }
 
+void ProcessRunner::updateTrace() {
+  if (!results_.hasTrace || results_.clockTime < nextTraceTime_) {
+    return;
+  }
+  results_.trace.push_back(
+      {results_.clockTime, results_.time, currentRss_, currentVm_});
+  nextTraceTime_ = results_.clockTime + parameters_.traceInterval;
+}
+
 void ProcessRunner::updateVerdicts() {
   if (results_.time > parameters_.timeLimit) {
     results_.status = RunStatus::TIME_LIMIT;
@@ -424,6 +786,67 @@ void ProcessRunner::updateVerdicts() {
   if (results_.memory > parameters_.memoryLimit) {
     results_.status = RunStatus::MEMORY_LIMIT;
   }
+  if (parameters_.outputLimit > 0 &&
+      (outputSize_ > parameters_.outputLimit * 1048576 ||
+       results_.signal == SIGXFSZ)) {
+    results_.status = RunStatus::OUTPUT_LIMIT;
+  }
+}
+
+void ProcessRunner::openOutput() {
+  outputFd_ = -1;
+  outputSize_ = 0;
+  outputHash_.reset();
+  if (parameters_.stdoutRedir.empty() ||
+      (parameters_.outputLimit == 0 && !parameters_.hashStdout)) {
+    return;
+  }
+  // the child has already opened the file, so it exists. The child changes
+  // the directory before redirecting, so the relative paths are resolved
+  // against the working directory
+  std::string path = parameters_.stdoutRedir;
+  if (path[0] != '/' && !parameters_.workingDir.empty()) {
+    path = parameters_.workingDir + "/" + path;
+  }
+  outputFd_ = open(path.c_str(), O_RDONLY | O_CLOEXEC);
+  if (outputFd_ < 0) {
+    int errCode = errno;
+    kill(pid_, SIGKILL);
+    waitpid(pid_, nullptr, 0);
+    parentFailure("unable to open \"" + path + "\"", errCode);
+  }
+}
+
+void ProcessRunner::updateOutput() {
+  if (outputFd_ < 0) {
+    return;
+  }
+  if (!parameters_.hashStdout) {
+    struct stat fileStat;
+    if (fstat(outputFd_, &fileStat) == 0) {
+      outputSize_ = fileStat.st_size;
+    }
+    return;
+  }
+  // the output is hashed as it is appended, so it is read once and while it
+  // is still in the page cache. The program is expected to write stdout
+  // sequentially
+  char buffer[65536];
+  while (true) {
+    ssize_t bytesRead = pread(outputFd_, buffer, sizeof(buffer), outputSize_);
+    if (bytesRead <= 0) {
+      break;
+    }
+    outputHash_.update(buffer, bytesRead);
+    outputSize_ += bytesRead;
+  }
+}
+
+void ProcessRunner::closeOutput() {
+  if (outputFd_ >= 0) {
+    close(outputFd_);
+    outputFd_ = -1;
+  }
 }
 
 void ProcessRunner::updateResultsOnTerminate(const struct rusage &resources,
@@ -443,104 +866,155 @@ void ProcessRunner::updateResultsOnTerminate(const struct rusage &resources,
   results_.time =
       timevalToDouble(timeSum(resources.ru_stime, resources.ru_utime));
   results_.clockTime = timer_.getTime();
+  results_.rusage.loadFromRusage(resources);
+  results_.hasRusage = true;
   if (results_.memory == 0) {
     // FIXME : if the memory usage wasn't updated, maybe use smth better than
     // maxrss?
     results_.comment = "memory measurement is not precise!";
-    results_.memory = resources.ru_maxrss / 1048576.0 * maxRssBytes;
+    results_.memory = results_.rusage.maxRss;
   }
 }
 
 void ProcessRunner::trySyscall(bool success, const std::string &errorName) {
-  if (success) {
+  if (!success) {
+    parentFailure(errorName, errno);
+  }
+}
+
+void ProcessRunner::childCheck(bool success, ChildError error) noexcept {
+  if (!success) {
+    childFailure(error, errno);
+  }
+}
+
+std::string ProcessRunner::childErrorMessage(ChildError error) const {
+  switch (error) {
+    case ChildError::AFFINITY:
+      return "could not set CPU affinity";
+    case ChildError::AFFINITY_UNSUPPORTED:
+      return "CPU affinity is not supported on this system";
+    case ChildError::CORE_DUMPS:
+      return "could not disable core dumps";
+    case ChildError::TIME_LIMIT:
+      return "could not set time limit";
+    case ChildError::MEMORY_LIMIT:
+      return "could not set memory limit";
+    case ChildError::OUTPUT_LIMIT:
+      return "could not set output limit";
+    case ChildError::WORKING_DIR:
+      return "could not change directory";
+    case ChildError::STDIN_REDIR:
+      return "unable to redirect stdin into \"" + parameters_.stdinRedir +
+             "\"";
+    case ChildError::STDOUT_REDIR:
+      return "unable to redirect stdout into \"" + parameters_.stdoutRedir +
+             "\"";
+    case ChildError::STDERR_REDIR:
+      return "unable to redirect stderr into \"" + parameters_.stderrRedir +
+             "\"";
+    case ChildError::EXEC:
+      return "failed to run \"" + parameters_.executable + "\"";
+    default:
+      return "handleChild() has reached the end";
+  }
+}
+
+void ProcessRunner::applyAffinity() noexcept {
+  if (parameters_.affinity.empty()) {
     return;
   }
-  if (pid_ == 0) {
-    childFailure(errorName, errno);
-  } else {
-    parentFailure(errorName, errno);
+#ifdef HAVE_SCHED_SETAFFINITY
+  cpu_set_t cpuSet;
+  CPU_ZERO(&cpuSet);
+  for (int cpu : parameters_.affinity) {
+    CPU_SET(cpu, &cpuSet);
   }
+  childCheck(sched_setaffinity(0, sizeof(cpuSet), &cpuSet) == 0,
+             ChildError::AFFINITY);
+#else
+  childFailure(ChildError::AFFINITY_UNSUPPORTED);
+#endif
 }
 
-void ProcessRunner::handleChild() {
+void ProcessRunner::handleChild() noexcept {
+  // only system calls are made here, with no memory allocation and no
+  // exceptions (see ChildError)
   setsid();
 
-  trySyscall(updateLimit(RLIMIT_CORE, 0), "could not disable core dumps");
+  applyAffinity();
+
+  childCheck(updateLimit(RLIMIT_CORE, 0), ChildError::CORE_DUMPS);
 
   // FIXME : avoid overflow when handling very large time and memory limits
 
   int64_t integralTimeLimit =
       static_cast<int64_t>(ceil(parameters_.timeLimit + 0.2));
-  trySyscall(updateLimit(RLIMIT_CPU, integralTimeLimit),
-             "could not set time limit");
+  childCheck(updateLimit(RLIMIT_CPU, integralTimeLimit),
+             ChildError::TIME_LIMIT);
 
   // FIXME : distinguish between RE and ML better
 
   int64_t memLimitBytes =
       static_cast<int64_t>(ceil(parameters_.memoryLimit * 1048576));
-  trySyscall(updateLimit(RLIMIT_AS, memLimitBytes * 2),
-             "could not set memory limit");
-  trySyscall(updateLimit(RLIMIT_DATA, memLimitBytes * 2),
-             "could not set memory limit");
-  trySyscall(updateLimit(RLIMIT_STACK, memLimitBytes * 2),
-             "could not set memory limit");
+  childCheck(updateLimit(RLIMIT_AS, memLimitBytes * 2),
+             ChildError::MEMORY_LIMIT);
+  childCheck(updateLimit(RLIMIT_DATA, memLimitBytes * 2),
+             ChildError::MEMORY_LIMIT);
+  childCheck(updateLimit(RLIMIT_STACK, memLimitBytes * 2),
+             ChildError::MEMORY_LIMIT);
+
+  if (parameters_.outputLimit > 0) {
+    // one extra byte allows to distinguish the output of exactly the limit
+    // size from the truncated one
+    int64_t outputLimitBytes =
+        static_cast<int64_t>(ceil(parameters_.outputLimit * 1048576)) + 1;
+    childCheck(updateLimit(RLIMIT_FSIZE, outputLimitBytes),
+               ChildError::OUTPUT_LIMIT);
+  }
 
   if (!parameters_.workingDir.empty()) {
-    trySyscall(chdir(parameters_.workingDir.c_str()) == 0,
-               "could not change directory");
+    childCheck(chdir(parameters_.workingDir.c_str()) == 0,
+               ChildError::WORKING_DIR);
   }
 
-  trySyscall(
+  childCheck(
       redirectDescriptor(STDIN_FILENO, parameters_.stdinRedir, O_RDONLY),
-      "unable to redirect stdin into \"" + parameters_.stdinRedir + "\"");
-  trySyscall(
-      redirectDescriptor(STDOUT_FILENO, parameters_.stdoutRedir,
-                         O_CREAT | O_TRUNC | O_WRONLY),
-      "unable to redirect stdout into \"" + parameters_.stdoutRedir + "\"");
-  trySyscall(
-      redirectDescriptor(STDERR_FILENO, parameters_.stderrRedir,
-                         O_CREAT | O_TRUNC | O_WRONLY),
-      "unable to redirect stderr into \"" + parameters_.stderrRedir + "\"");
-
-  if (parameters_.clearEnv) {
-#ifdef HAVE_CLEARENV
-    trySyscall(clearenv() == 0, "could not clear environment");
-#else
-    // I didn't expect clearing the environment is a difficult task :(
-    // For example, environ = nullptr doesn't work on macOS. I implemented the
-    // solution found here:
-    // https://lists.freebsd.org/pipermail/freebsd-stable/2008-June/043136.html
-    environ = new char *[1];
-    environ[0] = nullptr;
-#endif
-  }
-  for (const auto &iter : parameters_.env) {
-    const std::string &key = iter.first;
-    const std::string &value = iter.second;
-    trySyscall(setenv(key.c_str(), value.c_str(), true) == 0,
-               "could not set environment \"" + key + "\"");
-  }
+      ChildError::STDIN_REDIR);
+  childCheck(redirectDescriptor(STDOUT_FILENO, parameters_.stdoutRedir,
+                                O_CREAT | O_TRUNC | O_WRONLY),
+             ChildError::STDOUT_REDIR);
+  childCheck(redirectDescriptor(STDERR_FILENO, parameters_.stderrRedir,
+                                O_CREAT | O_TRUNC | O_WRONLY),
+             ChildError::STDERR_REDIR);
 
-  size_t argc = parameters_.args.size() + 1;
-  char **argv = new char *[argc + 1];
-  argv[0] = strdup(parameters_.executable.c_str());
-  for (size_t i = 0; i + 1 < argc; ++i) {
-    const std::string &argument = parameters_.args[i];
-    argv[i + 1] = strdup(argument.c_str());
-  }
-  argv[argc] = nullptr;
+  waitForCounters();
+  restoreSignals();
+  childCheck(execve(argv_[0], argv_.data(), envp_.data()) == 0,
+             ChildError::EXEC);
+  childFailure(ChildError::UNEXPECTED_END);
+}
 
-  trySyscall(execv(argv[0], argv) == 0,
-             "failed to run \"" + parameters_.executable + "\"");
-  childFailure("handleChild() has reached the end");
+void ProcessRunner::restoreSignals() noexcept {
+  // the child has its own copy of the handlers (CLONE_SIGHAND is not used),
+  // so resetting them doesn't affect the parent
+  struct sigaction defaultAction;
+  zeroMem(defaultAction);
+  defaultAction.sa_handler = SIG_DFL;
+  for (int sig = 1; sig < NSIG; ++sig) {
+    struct sigaction action;
+    if (sigaction(sig, nullptr, &action) == 0 &&
+        action.sa_handler != SIG_DFL && action.sa_handler != SIG_IGN) {
+      sigaction(sig, &defaultAction, nullptr);
+    }
+  }
+  sigprocmask(SIG_SETMASK, &savedSigmask_, nullptr);
 }
 
-[[noreturn]] void ProcessRunner::childFailure(const std::string &message,
-                                              int errcode) {
-  std::string fullMsg = getFullErrorMessage(message, errcode);
-  int msgSize = static_cast<int>(fullMsg.size());
-  write(pipe_[1], &msgSize, sizeof(msgSize));
-  write(pipe_[1], fullMsg.c_str(), msgSize * sizeof(char));
+void ProcessRunner::childFailure(ChildError error, int errcode) noexcept {
+  // the message is small enough to be written atomically
+  ChildFailure failure{error, errcode};
+  write(pipe_[1], &failure, sizeof(failure));
   close(pipe_[1]);
   _exit(42);
 }
@@ -551,4 +1025,6 @@ void ProcessRunner::parentFailure(const std::string &message, int errcode) {
 
 ProcessRunner::ProcessRunner() {}
 
+ProcessRunner::~ProcessRunner() { closeOutput(); }
+
 }  // namespace UnixRunner
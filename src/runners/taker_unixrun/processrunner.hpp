@@ -23,7 +23,10 @@
 #include <sys/types.h>
 #include <exception>
 #include <map>
+#include <memory>
 #include <vector>
+#include "perfcounters.hpp"
+#include "sha256.hpp"
 #include "utils.hpp"
 
 namespace UnixRunner {
@@ -38,6 +41,8 @@ class RunnerValidateError : public RunnerError {
   RunnerValidateError(const std::string &comment);
 };
 
+class ActiveChildLock;
+
 class ProcessRunner {
  public:
   enum class RunStatus {
@@ -45,6 +50,7 @@ class ProcessRunner {
     TIME_LIMIT,
     IDLE_LIMIT,
     MEMORY_LIMIT,
+    OUTPUT_LIMIT,
     RUNTIME_ERROR,
     SECURITY_ERROR,
     RUN_FAIL,
@@ -54,10 +60,15 @@ class ProcessRunner {
 
   enum class IsolatePolicy { NONE, NORMAL, COMPILE, STRICT };
 
+  enum class LaunchMode { AUTO, FORK, VFORK };
+
   struct Parameters {
     double timeLimit = 2.0;
     double idleLimit = 7.0;
     double memoryLimit = 256.0;
+    // limits the size of the files written by the program, in MiB. Zero
+    // means no limit
+    double outputLimit = 0.0;
     bool clearEnv = false;
     std::string executable;
     std::map<std::string, std::string> env;
@@ -68,12 +79,37 @@ class ProcessRunner {
     std::string stderrRedir = "";
     std::string isolateDir = "";
     IsolatePolicy isolatePolicy = IsolatePolicy::NORMAL;
+    std::vector<int> affinity;
+    bool perfCounters = false;
+    double traceInterval = 0.0;
+    LaunchMode launchMode = LaunchMode::AUTO;
+    bool hashStdout = false;
 
     void validate();
     void loadFromJsonStr(const std::string &json);
     void loadFromJson(const Json::Value &value);
   };
 
+  struct ResourceUsage {
+    double maxRss = 0.0;
+    int64_t voluntarySwitches = 0;
+    int64_t involuntarySwitches = 0;
+    int64_t minorFaults = 0;
+    int64_t majorFaults = 0;
+    int64_t blockInput = 0;
+    int64_t blockOutput = 0;
+
+    void loadFromRusage(const struct rusage &resources);
+    Json::Value saveToJson() const;
+  };
+
+  struct TraceSample {
+    double clockTime;
+    double time;
+    double rss;
+    double vm;
+  };
+
   struct RunResults {
     double time = 0.0;
     double clockTime = 0.0;
@@ -82,6 +118,14 @@ class ProcessRunner {
     int signal = 0;
     RunStatus status = RunStatus::NONE;
     std::string comment = "";
+    bool hasCounters = false;
+    std::map<std::string, uint64_t> counters{};
+    bool hasRusage = false;
+    ResourceUsage rusage{};
+    bool hasTrace = false;
+    std::vector<TraceSample> trace{};
+    std::map<std::string, double> phases{};
+    std::string stdoutDigest = "";
 
     std::string saveToJsonStr() const;
     Json::Value saveToJson() const;
@@ -89,6 +133,7 @@ class ProcessRunner {
 
   static const char *runStatusToStr(RunStatus status);
   static IsolatePolicy strToIsolatePolicy(const std::string &value);
+  static LaunchMode strToLaunchMode(const std::string &value);
 
   Json::Value runnerInfoJson() const;
 
@@ -96,13 +141,29 @@ class ProcessRunner {
   const Parameters &parameters() const;
   const RunResults &results() const;
 
+  // runs the process and waits until it terminates
   void execute();
 
+  // starts the process, then poll() must be called until it returns false.
+  // poll() checks the limits and returns false if the process has terminated
+  void start();
+  bool poll();
+  bool running() const;
+  pid_t pid() const;
+
   ProcessRunner();
+  ProcessRunner(const ProcessRunner &) = delete;
+  ProcessRunner &operator=(const ProcessRunner &) = delete;
+  ~ProcessRunner();
 
  protected:
-  void doExecute();
-  [[noreturn]] void handleChild();
+  void doStart();
+  bool doPoll();
+  void prepareExec();
+  LaunchMode chooseLaunchMode() const;
+  pid_t launchChild();
+  [[noreturn]] void runChild() noexcept;
+  [[noreturn]] void handleChild() noexcept;
   void handleParent();
 
  private:
@@ -110,7 +171,27 @@ class ProcessRunner {
   RunResults results_{};
   pid_t pid_ = -1;
   int pipe_[2]{};
+  int syncPipe_[2]{-1, -1};
   Timer timer_{};
+  PerfCounters perfCounters_{};
+  double currentRss_ = 0.0;
+  double currentVm_ = 0.0;
+  double nextTraceTime_ = 0.0;
+  double execTime_ = 0.0;
+  std::unique_ptr<ActiveChildLock> childLock_{};
+  int outputFd_ = -1;
+  uint64_t outputSize_ = 0;
+  Sha256 outputHash_{};
+  std::vector<std::string> argStrings_{};
+  std::vector<std::string> envStrings_{};
+  std::vector<char *> argv_{};
+  std::vector<char *> envp_{};
+  sigset_t savedSigmask_{};
+  std::unique_ptr<char[]> childStack_{};
+
+#ifdef __linux__
+  static int cloneEntry(void *runner);
+#endif
 
 #ifdef __linux__
   bool updateTimeFromProcStat();
@@ -118,12 +199,48 @@ class ProcessRunner {
 #endif
 
   void updateResultsOnRun();
+  void updateTrace();
   void updateVerdicts();
+  void openOutput();
+  void updateOutput();
+  void closeOutput();
   void updateResultsOnTerminate(const struct rusage &resources, int status);
 
+  void applyAffinity() noexcept;
+  void restoreSignals() noexcept;
+  void startCounters();
+  void waitForCounters() noexcept;
+  void collectCounters();
+
+  // the failures in the child are reported to the parent as the codes, so
+  // the child doesn't allocate memory or throw exceptions. This matters for
+  // vfork-like launch, where the child shares the memory with the parent
+  enum class ChildError {
+    AFFINITY,
+    AFFINITY_UNSUPPORTED,
+    CORE_DUMPS,
+    TIME_LIMIT,
+    MEMORY_LIMIT,
+    OUTPUT_LIMIT,
+    WORKING_DIR,
+    STDIN_REDIR,
+    STDOUT_REDIR,
+    STDERR_REDIR,
+    EXEC,
+    UNEXPECTED_END
+  };
+
+  struct ChildFailure {
+    ChildError error;
+    int errcode;
+  };
+
+  std::string childErrorMessage(ChildError error) const;
+
   void trySyscall(bool success, const std::string &errorName);
+  void childCheck(bool success, ChildError error) noexcept;
 
-  [[noreturn]] void childFailure(const std::string &message, int errcode = 0);
+  [[noreturn]] void childFailure(ChildError error, int errcode = 0) noexcept;
   void parentFailure(const std::string &message, int errcode = 0);
 };
 
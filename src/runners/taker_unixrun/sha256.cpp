@@ -0,0 +1,146 @@
+/*
+ * Copyright (C) 2019  Alexander Kernozhitsky <sh200105@mail.ru>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#include "sha256.hpp"
+#include <algorithm>
+#include <cstring>
+
+namespace UnixRunner {
+
+namespace {
+
+const uint32_t ROUND_CONSTANTS[64] = {
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1,
+    0x923f82a4, 0xab1c5ed5, 0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3,
+    0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174, 0xe49b69c1, 0xefbe4786,
+    0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147,
+    0x06ca6351, 0x14292967, 0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13,
+    0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85, 0xa2bfe8a1, 0xa81a664b,
+    0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a,
+    0x5b9cca4f, 0x682e6ff3, 0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208,
+    0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2};
+
+const uint32_t INITIAL_STATE[8] = {0x6a09e667, 0xbb67ae85, 0x3c6ef372,
+                                   0xa54ff53a, 0x510e527f, 0x9b05688c,
+                                   0x1f83d9ab, 0x5be0cd19};
+
+inline uint32_t rotateRight(uint32_t value, int count) {
+  return (value >> count) | (value << (32 - count));
+}
+
+}  // namespace
+
+void Sha256::update(const void *data, size_t size) {
+  const uint8_t *bytes = static_cast<const uint8_t *>(data);
+  totalSize_ += size;
+  if (bufferSize_ != 0) {
+    size_t toCopy = std::min(size, sizeof(buffer_) - bufferSize_);
+    memcpy(buffer_ + bufferSize_, bytes, toCopy);
+    bufferSize_ += toCopy;
+    bytes += toCopy;
+    size -= toCopy;
+    if (bufferSize_ != sizeof(buffer_)) {
+      return;
+    }
+    processBlock(buffer_);
+    bufferSize_ = 0;
+  }
+  // full blocks are processed directly from the input without copying
+  for (; size >= sizeof(buffer_); bytes += 64, size -= 64) {
+    processBlock(bytes);
+  }
+  memcpy(buffer_, bytes, size);
+  bufferSize_ = size;
+}
+
+std::string Sha256::hexDigest() {
+  uint64_t totalBits = totalSize_ * 8;
+  const uint8_t padding = 0x80;
+  update(&padding, 1);
+  const uint8_t zero = 0;
+  while (bufferSize_ != 56) {
+    update(&zero, 1);
+  }
+  uint8_t sizeBytes[8];
+  for (int i = 0; i < 8; ++i) {
+    sizeBytes[i] = static_cast<uint8_t>(totalBits >> (56 - 8 * i));
+  }
+  update(sizeBytes, 8);
+  static const char HEX_DIGITS[] = "0123456789abcdef";
+  std::string result;
+  for (uint32_t word : state_) {
+    for (int shift = 28; shift >= 0; shift -= 4) {
+      result += HEX_DIGITS[(word >> shift) & 0xf];
+    }
+  }
+  reset();
+  return result;
+}
+
+void Sha256::reset() {
+  memcpy(state_, INITIAL_STATE, sizeof(state_));
+  bufferSize_ = 0;
+  totalSize_ = 0;
+}
+
+void Sha256::processBlock(const uint8_t *block) {
+  uint32_t words[64];
+  for (int i = 0; i < 16; ++i) {
+    words[i] = (uint32_t(block[4 * i]) << 24) |
+               (uint32_t(block[4 * i + 1]) << 16) |
+               (uint32_t(block[4 * i + 2]) << 8) | uint32_t(block[4 * i + 3]);
+  }
+  for (int i = 16; i < 64; ++i) {
+    uint32_t s0 = rotateRight(words[i - 15], 7) ^
+                  rotateRight(words[i - 15], 18) ^ (words[i - 15] >> 3);
+    uint32_t s1 = rotateRight(words[i - 2], 17) ^
+                  rotateRight(words[i - 2], 19) ^ (words[i - 2] >> 10);
+    words[i] = words[i - 16] + s0 + words[i - 7] + s1;
+  }
+  uint32_t a = state_[0], b = state_[1], c = state_[2], d = state_[3];
+  uint32_t e = state_[4], f = state_[5], g = state_[6], h = state_[7];
+  for (int i = 0; i < 64; ++i) {
+    uint32_t s1 = rotateRight(e, 6) ^ rotateRight(e, 11) ^ rotateRight(e, 25);
+    uint32_t choice = (e & f) ^ (~e & g);
+    uint32_t temp1 = h + s1 + choice + ROUND_CONSTANTS[i] + words[i];
+    uint32_t s0 = rotateRight(a, 2) ^ rotateRight(a, 13) ^ rotateRight(a, 22);
+    uint32_t majority = (a & b) ^ (a & c) ^ (b & c);
+    uint32_t temp2 = s0 + majority;
+    h = g;
+    g = f;
+    f = e;
+    e = d + temp1;
+    d = c;
+    c = b;
+    b = a;
+    a = temp1 + temp2;
+  }
+  state_[0] += a;
+  state_[1] += b;
+  state_[2] += c;
+  state_[3] += d;
+  state_[4] += e;
+  state_[5] += f;
+  state_[6] += g;
+  state_[7] += h;
+}
+
+Sha256::Sha256() { reset(); }
+
+}  // namespace UnixRunner
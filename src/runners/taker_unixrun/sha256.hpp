@@ -0,0 +1,50 @@
+/*
+ * Copyright (C) 2019  Alexander Kernozhitsky <sh200105@mail.ru>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#ifndef SHA256_H
+#define SHA256_H
+
+#include <cstddef>
+#include <cstdint>
+#include <string>
+
+namespace UnixRunner {
+
+// Incremental SHA-256, used to compute the digest of the program output while
+// it is being written
+class Sha256 {
+ public:
+  void update(const void *data, size_t size);
+  // finishes the computation and returns the digest as a hex string. The
+  // object is reset after that
+  std::string hexDigest();
+  void reset();
+
+  Sha256();
+
+ private:
+  uint32_t state_[8]{};
+  uint8_t buffer_[64]{};
+  size_t bufferSize_ = 0;
+  uint64_t totalSize_ = 0;
+
+  void processBlock(const uint8_t *block);
+};
+
+}  // namespace UnixRunner
+
+#endif  // SHA256_H
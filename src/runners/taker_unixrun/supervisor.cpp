@@ -0,0 +1,271 @@
+/*
+ * Copyright (C) 2019  Alexander Kernozhitsky <sh200105@mail.ru>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+
+#include "supervisor.hpp"
+#include <errno.h>
+#include <signal.h>
+#include <unistd.h>
+#include <algorithm>
+#include <cmath>
+#include "utils.hpp"
+
+#ifdef __linux__
+#include <sys/epoll.h>
+#include <sys/syscall.h>
+#include <sys/timerfd.h>
+#endif
+
+namespace UnixRunner {
+
+namespace {
+
+// the smaller intervals are rounded up to it, as an interval rounded down to
+// zero nanoseconds would disarm the timer instead of firing it constantly
+const double MIN_POLL_INTERVAL = 0.001;
+
+#ifdef __linux__
+
+// marks the timer in epoll events, other events hold the run index
+const uint64_t TIMER_EVENT = UINT64_MAX;
+
+const int MAX_EVENTS = 64;
+
+int pidfdOpen(pid_t pid) {
+#ifdef SYS_pidfd_open
+  return static_cast<int>(syscall(SYS_pidfd_open, pid, 0));
+#else
+  (void)pid;
+  errno = ENOSYS;
+  return -1;
+#endif
+}
+
+#endif  // __linux__
+
+}  // namespace
+
+void Supervisor::loadFromJson(const Json::Value &value) {
+  using Json::Value;
+  jobs_ = value.get("jobs", Value(jobs_)).asInt();
+  pollInterval_ = value.get("poll-interval", Value(pollInterval_)).asDouble();
+  if (jobs_ <= 0) {
+    throw RunnerValidateError("jobs must be positive");
+  }
+  if (pollInterval_ <= 0) {
+    throw RunnerValidateError("poll-interval must be positive");
+  }
+  pollInterval_ = std::max(pollInterval_, MIN_POLL_INTERVAL);
+  auto runsNode = value["runs"];
+  if (!runsNode.isArray()) {
+    throw std::runtime_error("runs is not an array");
+  }
+  runs_.clear();
+  for (Json::ArrayIndex i = 0; i < runsNode.size(); ++i) {
+    runs_.push_back(runsNode[i]);
+  }
+}
+
+void Supervisor::run(std::ostream &out) {
+  setUp();
+  try {
+    size_t next = 0;
+    std::vector<size_t> ready;
+    while (next < runs_.size() || !children_.empty()) {
+      while (static_cast<int>(children_.size()) < jobs_ &&
+             next < runs_.size()) {
+        launch(next++, out);
+      }
+      if (children_.empty()) {
+        continue;
+      }
+      waitEvents(ready);
+      for (size_t index : ready) {
+        poll(index, out);
+      }
+    }
+  } catch (...) {
+    tearDown();
+    throw;
+  }
+  tearDown();
+}
+
+void Supervisor::setUp() {
+  Json::StreamWriterBuilder builder;
+  builder["indentation"] = "";
+  writer_.reset(builder.newStreamWriter());
+#ifdef __linux__
+  epollFd_ = epoll_create1(EPOLL_CLOEXEC);
+  if (epollFd_ < 0) {
+    throw RunnerError(getFullErrorMessage("unable to create epoll", errno));
+  }
+  timerFd_ = timerfd_create(CLOCK_MONOTONIC, TFD_CLOEXEC | TFD_NONBLOCK);
+  if (timerFd_ < 0) {
+    throw RunnerError(getFullErrorMessage("unable to create timer", errno));
+  }
+  struct itimerspec timerSpec;
+  zeroMem(timerSpec);
+  double seconds = floor(pollInterval_);
+  timerSpec.it_interval.tv_sec = static_cast<time_t>(seconds);
+  timerSpec.it_interval.tv_nsec =
+      static_cast<long>((pollInterval_ - seconds) * 1e9);
+  timerSpec.it_value = timerSpec.it_interval;
+  if (timerfd_settime(timerFd_, 0, &timerSpec, nullptr) != 0) {
+    throw RunnerError(getFullErrorMessage("unable to set timer", errno));
+  }
+  struct epoll_event event;
+  zeroMem(event);
+  event.events = EPOLLIN;
+  event.data.u64 = TIMER_EVENT;
+  if (epoll_ctl(epollFd_, EPOLL_CTL_ADD, timerFd_, &event) != 0) {
+    throw RunnerError(getFullErrorMessage("unable to add timer", errno));
+  }
+#endif
+}
+
+void Supervisor::tearDown() {
+  for (auto &iter : children_) {
+    ProcessRunner &runner = *iter.second.runner;
+    if (runner.running()) {
+      kill(runner.pid(), SIGKILL);
+      while (runner.poll()) {
+      }
+    }
+    if (iter.second.pidFd >= 0) {
+      close(iter.second.pidFd);
+    }
+  }
+  children_.clear();
+  if (timerFd_ >= 0) {
+    close(timerFd_);
+    timerFd_ = -1;
+  }
+  if (epollFd_ >= 0) {
+    close(epollFd_);
+    epollFd_ = -1;
+  }
+}
+
+void Supervisor::launch(size_t index, std::ostream &out) {
+  std::unique_ptr<ProcessRunner> runner(new ProcessRunner());
+  try {
+    runner->parameters().loadFromJson(runs_[index]);
+  } catch (const std::exception &e) {
+    ProcessRunner::RunResults results;
+    results.status = ProcessRunner::RunStatus::RUN_FAIL;
+    results.comment = getFullExceptionMessage(e);
+    report(index, results.saveToJson(), out);
+    return;
+  }
+  runner->start();
+  // the first check is done right after the start, as in single run mode
+  runner->poll();
+  if (!runner->running()) {
+    report(index, runner->results().saveToJson(), out);
+    return;
+  }
+  int pidFd = -1;
+#ifdef __linux__
+  // without pidfd (before Linux 5.3), the termination is detected on the
+  // timer ticks only
+  pidFd = pidfdOpen(runner->pid());
+  if (pidFd >= 0) {
+    struct epoll_event event;
+    zeroMem(event);
+    event.events = EPOLLIN;
+    event.data.u64 = index;
+    if (epoll_ctl(epollFd_, EPOLL_CTL_ADD, pidFd, &event) != 0) {
+      close(pidFd);
+      pidFd = -1;
+    }
+  }
+#endif
+  Child child;
+  child.runner = std::move(runner);
+  child.pidFd = pidFd;
+  children_.emplace(index, std::move(child));
+}
+
+void Supervisor::waitEvents(std::vector<size_t> &ready) {
+  ready.clear();
+  bool timerFired = false;
+#ifdef __linux__
+  struct epoll_event events[MAX_EVENTS];
+  int count = epoll_wait(epollFd_, events, MAX_EVENTS, -1);
+  if (count < 0) {
+    if (errno == EINTR) {
+      return;
+    }
+    throw RunnerError(getFullErrorMessage("epoll_wait() failed", errno));
+  }
+  for (int i = 0; i < count; ++i) {
+    if (events[i].data.u64 == TIMER_EVENT) {
+      uint64_t expirations;
+      if (read(timerFd_, &expirations, sizeof(expirations)) < 0 &&
+          errno != EAGAIN) {
+        throw RunnerError(getFullErrorMessage("unable to read timer", errno));
+      }
+      timerFired = true;
+    } else {
+      ready.push_back(static_cast<size_t>(events[i].data.u64));
+    }
+  }
+#else
+  usleep(static_cast<useconds_t>(pollInterval_ * 1e6));
+  timerFired = true;
+#endif
+  if (timerFired) {
+    // the limits of all the children are checked on the timer
+    ready.clear();
+    for (const auto &iter : children_) {
+      ready.push_back(iter.first);
+    }
+  }
+}
+
+void Supervisor::poll(size_t index, std::ostream &out) {
+  auto iter = children_.find(index);
+  if (iter == children_.end()) {
+    return;
+  }
+  ProcessRunner &runner = *iter->second.runner;
+  if (runner.poll()) {
+    return;
+  }
+  if (iter->second.pidFd >= 0) {
+    // closing the descriptor removes it from epoll
+    close(iter->second.pidFd);
+  }
+  report(index, runner.results().saveToJson(), out);
+  children_.erase(iter);
+}
+
+void Supervisor::report(size_t index, const Json::Value &results,
+                        std::ostream &out) {
+  Json::Value value;
+  value["index"] = Json::UInt64(index);
+  value["results"] = results;
+  writer_->write(value, &out);
+  out << std::endl;
+}
+
+Supervisor::Supervisor() {}
+
+Supervisor::~Supervisor() { tearDown(); }
+
+}  // namespace UnixRunner
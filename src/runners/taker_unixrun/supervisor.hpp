@@ -0,0 +1,71 @@
+/*
+ * Copyright (C) 2019  Alexander Kernozhitsky <sh200105@mail.ru>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+
+#ifndef SUPERVISOR_H
+#define SUPERVISOR_H
+
+#include <json/json.h>
+#include <cstddef>
+#include <map>
+#include <memory>
+#include <ostream>
+#include <vector>
+#include "processrunner.hpp"
+
+namespace UnixRunner {
+
+// Runs a batch of programs, up to jobs of them concurrently, in one process.
+// On Linux, the children are supervised from one epoll loop, which wakes up
+// when a child terminates (via pidfd) or on the shared timer for the limit
+// checks. Each result is written as one JSON line as soon as the child
+// terminates
+class Supervisor {
+ public:
+  void loadFromJson(const Json::Value &value);
+  void run(std::ostream &out);
+
+  Supervisor();
+  Supervisor(const Supervisor &) = delete;
+  Supervisor &operator=(const Supervisor &) = delete;
+  ~Supervisor();
+
+ private:
+  struct Child {
+    std::unique_ptr<ProcessRunner> runner{};
+    int pidFd = -1;
+  };
+
+  int jobs_ = 1;
+  double pollInterval_ = 0.005;
+  std::vector<Json::Value> runs_{};
+  std::map<size_t, Child> children_{};
+  int epollFd_ = -1;
+  int timerFd_ = -1;
+  std::unique_ptr<Json::StreamWriter> writer_{};
+
+  void setUp();
+  void tearDown();
+  void launch(size_t index, std::ostream &out);
+  void waitEvents(std::vector<size_t> &ready);
+  void poll(size_t index, std::ostream &out);
+  void report(size_t index, const Json::Value &results, std::ostream &out);
+};
+
+}  // namespace UnixRunner
+
+#endif  // SUPERVISOR_H
@@ -218,11 +218,11 @@ std::string getFullErrorMessage(const std::string &message, int errcode) {
   }
 }
 
-bool redirectDescriptor(int fd, std::string fileName, int flags, mode_t mode) {
-  if (fileName.empty()) {
-    fileName = "/dev/null";
-  }
-  int dest_fd = open(fileName.c_str(), flags, mode);
+bool redirectDescriptor(int fd, const std::string &fileName, int flags,
+                        mode_t mode) {
+  // doesn't allocate memory, as it's called in the child before exec()
+  const char *path = fileName.empty() ? "/dev/null" : fileName.c_str();
+  int dest_fd = open(path, flags, mode);
   if (dest_fd < 0) {
     return false;
   }
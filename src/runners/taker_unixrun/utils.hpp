@@ -99,7 +99,7 @@ double timevalToDouble(const struct timeval &value);
 
 std::string getFullErrorMessage(const std::string &message, int errcode = 0);
 
-bool redirectDescriptor(int fd, std::string fileName, int flags,
+bool redirectDescriptor(int fd, const std::string &fileName, int flags,
                         mode_t mode = 0644);
 
 // rusage.ru_maxrss in bytes on in kbytes?
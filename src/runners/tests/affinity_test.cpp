@@ -0,0 +1,18 @@
+#include <sched.h>
+#include <iostream>
+
+using namespace std;
+
+int main() {
+  cpu_set_t cpuSet;
+  CPU_ZERO(&cpuSet);
+  if (sched_getaffinity(0, sizeof(cpuSet), &cpuSet) != 0) {
+    return 1;
+  }
+  for (int cpu = 0; cpu < CPU_SETSIZE; ++cpu) {
+    if (CPU_ISSET(cpu, &cpuSet)) {
+      cout << cpu << endl;
+    }
+  }
+  return 0;
+}
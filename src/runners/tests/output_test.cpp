@@ -0,0 +1,13 @@
+#include <cstdio>
+#include <cstdlib>
+
+int main(int argc, char **argv) {
+  if (argc < 2) {
+    return 1;
+  }
+  long size = atol(argv[1]);
+  for (long i = 0; i < size; ++i) {
+    putchar('a' + i % 26);
+  }
+  return 0;
+}
@@ -0,0 +1,119 @@
+import threading
+import time
+import pytest
+from pathlib import Path
+from runners.affinity import CpuSlots, parse_cpu_list, cpu_cores
+from runners.affinity import create_cpu_slots, cpu_slots
+from runners.config import CONFIG_NAME
+from ...pytest_fixtures import config_manager
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list('0-3,8,10-11\n') == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpu_list('5') == [5]
+    assert parse_cpu_list('3,1,1-2') == [1, 2, 3]
+    assert parse_cpu_list('') == []
+    with pytest.raises(ValueError):
+        parse_cpu_list('3-1')
+    with pytest.raises(ValueError):
+        parse_cpu_list('a')
+
+
+def make_sysfs(root, siblings):
+    for cpu, sibling_list in siblings.items():
+        topology = Path(root) / 'cpu{}'.format(cpu) / 'topology'
+        topology.mkdir(parents=True)
+        (topology / 'thread_siblings_list').open('w').write(
+            sibling_list + '\n')
+
+
+def test_cpu_cores(tmpdir):
+    make_sysfs(str(tmpdir), {0: '0,4', 1: '1,5', 2: '2-3', 3: '2-3',
+                             4: '0,4', 5: '1,5'})
+    cpus = list(range(6))
+    assert cpu_cores(cpus, True, str(tmpdir)) == [[0], [1], [2]]
+    assert cpu_cores(cpus, False, str(tmpdir)) == [[cpu] for cpu in cpus]
+    # CPUs without topology info are considered to have no siblings
+    assert cpu_cores([1, 7, 5], True, str(tmpdir)) == [[1], [7]]
+
+
+def test_create_cpu_slots(config_manager, tmpdir):
+    config_manager.user_config(CONFIG_NAME).open('w').write('''
+[runtime]
+dir = '{}'
+
+[affinity]
+cpus = '2-4,7'
+skip-smt = false
+'''.format(str(tmpdir / 'runtime')))
+    slots = create_cpu_slots()
+    assert slots.slots == [[2], [3], [4], [7]]
+    assert slots.lock_dir == Path(str(tmpdir / 'runtime'))
+    assert slots.lock_dir.is_dir()
+    # the shared slots are created once for the runtime directory
+    assert cpu_slots() is cpu_slots()
+    assert cpu_slots().slots == slots.slots
+    assert cpu_slots().lock_dir == slots.lock_dir
+
+
+def test_cpu_slots():
+    slots = CpuSlots([[0], [1], [2]])
+    assert len(slots) == 3
+    lock = threading.Lock()
+    active = set()
+    max_active = 0
+    conflicts = []
+
+    def run():
+        nonlocal max_active
+        with slots.slot() as cpus:
+            with lock:
+                if cpus[0] in active:
+                    conflicts.append(cpus[0])
+                active.add(cpus[0])
+                max_active = max(max_active, len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(cpus[0])
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not conflicts
+    assert max_active <= 3
+
+    with slots.slot() as first:
+        with slots.slot() as second:
+            assert first == [0]
+            assert second == [1]
+
+    with pytest.raises(ValueError):
+        CpuSlots([])
+
+
+def test_cpu_slots_shared(tmpdir):
+    # the instances with the same lock_dir behave like different processes,
+    # as each of them holds its own lock file descriptors
+    first = CpuSlots([[0], [1]], str(tmpdir))
+    second = CpuSlots([[0], [1]], str(tmpdir))
+    with first.slot() as first_cpus:
+        with second.slot() as second_cpus:
+            assert first_cpus == [0]
+            assert second_cpus == [1]
+            acquired = []
+
+            def run():
+                with first.slot() as cpus:
+                    acquired.append(cpus)
+
+            thread = threading.Thread(target=run)
+            thread.start()
+            time.sleep(0.05)
+            # both CPUs are busy, so the third run waits
+            assert acquired == []
+        thread.join()
+        assert acquired == [[1]]
+    with second.slot() as second_cpus:
+        assert second_cpus == [0]
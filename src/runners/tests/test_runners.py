@@ -1,8 +1,14 @@
 import json
 import os
+import shutil
 from os import path
+from pathlib import Path
 import pytest
+from runners import scheduler
+from runners import runners as runners_module
+from runners.locks import runtime_dir
 from runners.runners import *
+from ...pytest_fixtures import config_manager
 
 
 def test_parameters_to_json():
@@ -19,7 +25,10 @@ def test_parameters_to_json():
         stdout_redir='out.txt',
         stderr_redir='err.txt',
         isolate_dir=None,
-        isolate_policy=None
+        isolate_policy=None,
+        affinity=None,
+        perf_counters=None,
+        launch_mode=None
     )
     assert (json.loads(parameters_to_json(parameters)) ==
             {
@@ -36,6 +45,11 @@ def test_parameters_to_json():
                 'stderr-redir': 'err.txt',
                 'isolate-dir': 'work',
                 'isolate-policy': 'normal'})
+    parameters.affinity = (2, 3)
+    assert json.loads(parameters_to_json(parameters))['affinity'] == [2, 3]
+    parameters.launch_mode = LaunchMode.VFORK
+    assert json.loads(parameters_to_json(parameters))['launch-mode'] == \
+        'vfork'
 
 
 def test_results_from_json():
@@ -66,6 +80,38 @@ def test_results_from_json():
     invoke_value_error('status', 'invalid')
     invoke_value_error('comment', 42)
 
+    src_dict['counters'] = {'instructions': 1000, 'task-clock': 42}
+    assert (json_to_results(json.dumps(src_dict)).counters ==
+            {'instructions': 1000, 'task-clock': 42})
+    invoke_value_error('counters', {'instructions': 1.5})
+    invoke_value_error('counters', [1, 2])
+
+    src_dict['rusage'] = {'max-rss': 12.5, 'voluntary-switches': 1,
+                          'involuntary-switches': 2, 'minor-faults': 100,
+                          'major-faults': 3, 'block-input': 8,
+                          'block-output': 16}
+    assert (json_to_results(json.dumps(src_dict)).rusage ==
+            Rusage(max_rss=12.5, voluntary_switches=1,
+                   involuntary_switches=2, minor_faults=100, major_faults=3,
+                   block_input=8, block_output=16))
+    src_dict['trace'] = {'clock-time': [100, 10000, 10000],
+                         'time': [0, 10000, 0], 'rss': [1024, 2048, -1024],
+                         'vm': [2048, 0, 0]}
+    assert (json_to_results(json.dumps(src_dict)).trace ==
+            [TraceSample(clock_time=pytest.approx(0.0001), time=0.0,
+                         rss=1.0, vm=2.0),
+             TraceSample(clock_time=pytest.approx(0.0101),
+                         time=pytest.approx(0.01), rss=3.0, vm=2.0),
+             TraceSample(clock_time=pytest.approx(0.0201),
+                         time=pytest.approx(0.01), rss=2.0, vm=2.0)])
+    invoke_value_error('trace', {'clock-time': [1], 'time': [1, 2],
+                                 'rss': [1], 'vm': [1]})
+
+    invoke_value_error('rusage', {'max-rss': 1.0, 'voluntary-switches': 1.5,
+                                  'involuntary-switches': 2,
+                                  'minor-faults': 100, 'major-faults': 3,
+                                  'block-input': 8, 'block-output': 16})
+
 
 def test_runner_info_from_json():
     src_dict = {'name': 'myName', 'description': 'myDescr', 'author': 'me',
@@ -82,7 +128,7 @@ def tests_location():
 
 
 @pytest.fixture(scope='function')
-def runner():
+def runner(config_manager):
     runner_path = path.abspath(path.join('src', 'runners', 'taker_unixrun',
                                          'build', 'taker_unixrun'))
     return Runner(runner_path)
@@ -156,6 +202,20 @@ def test_memory(runner):
     assert runner.results.status == Status.OK
     assert runner.results.memory >= 60.0
     assert runner.results.memory <= 80.0
+    # the memory is touched, so it's resident and causes page faults
+    assert runner.results.rusage.max_rss >= 50.0
+    assert runner.results.rusage.minor_faults > 1000
+    assert runner.results.trace is None
+    # the memory usage grows while the program runs
+    runner.parameters.trace_interval = 0.005
+    runner.run()
+    assert runner.results.status == Status.OK
+    trace = runner.results.trace
+    assert len(trace) >= 2
+    assert trace[-1].rss > trace[0].rss
+    assert all(first.clock_time < second.clock_time
+               for first, second in zip(trace, trace[1:]))
+    runner.parameters.trace_interval = None
 
 
 def test_vector(runner):
@@ -264,6 +324,34 @@ def test_runerror(runner):
     runner.pass_stdin = False
 
 
+def test_stdin_types(runner, tmpdir, monkeypatch):
+    '''test_stdin_types: test for bytes and file paths as stdin'''
+    tests_dir = path.abspath(tests_location())
+    runner.parameters.executable = path.join(tests_dir, 'runerror_test')
+    runner.pass_stdin = True
+    runner.stdin = b'normal'
+    runner.run()
+    assert runner.results.status == Status.OK
+    runner.stdin = memoryview(b'xassert')[1:]
+    runner.run()
+    assert runner.results.status == Status.RUNTIME_ERROR
+    # relative paths are resolved against the current directory, not the
+    # working directory of the program
+    monkeypatch.chdir(str(tmpdir))
+    open('input.txt', 'w').write('normal')
+    runner.stdin = Path('input.txt')
+    runner.parameters.working_dir = tests_dir
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.parameters.stdin_redir == ''
+    runner.stdin = Path('missing.txt')
+    runner.run()
+    assert runner.results.status == Status.RUN_FAIL
+    runner.parameters.working_dir = ''
+    runner.stdin = ''
+    runner.pass_stdin = False
+
+
 def test_args(runner):
     '''test_args: test for args parameter'''
     runner.parameters.executable = path.join(
@@ -282,3 +370,210 @@ def test_broken(runner):
         tests_location(), 'broken_test')
     runner.run()
     assert runner.results.status == Status.RUN_FAIL
+
+
+def test_affinity(runner):
+    '''test_affinity: test for affinity parameter'''
+    if RunnerFeature.AFFINITY not in runner.info.features:
+        pytest.skip('affinity is not supported by the runner')
+    runner.parameters.executable = path.join(
+        tests_location(), 'affinity_test')
+    runner.capture_stdout = True
+    cpu = min(os.sched_getaffinity(0))
+    runner.parameters.affinity = [cpu]
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.stdout == '{}\n'.format(cpu)
+    runner.parameters.affinity = [-1]
+    runner.run()
+    assert runner.results.status == Status.RUN_FAIL
+    runner.parameters.affinity = None
+    runner.capture_stdout = False
+
+
+def test_memory_scheduler(runner, monkeypatch):
+    '''test_memory_scheduler: the runs are admitted by the memory scheduler
+    only if it's enabled'''
+    runs_file = runtime_dir() / scheduler.MemoryScheduler.RUNS_FILE
+    runner.parameters.executable = path.join(tests_location(), 'basic_test')
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert not runs_file.exists()
+    monkeypatch.setattr(runners_module, 'scheduler_enabled', lambda: True)
+    runner.run()
+    assert runner.results.status == Status.OK
+    # the run has been listed and removed after it finished
+    assert runs_file.read_text() == ''
+
+
+def test_output_limit(runner, tmpdir):
+    '''test_output_limit: test for output_limit and hash_stdout parameters'''
+    runner.parameters.executable = path.join(tests_location(), 'output_test')
+    out_file = path.join(str(tmpdir), 'output.txt')
+    runner.parameters.stdout_redir = out_file
+    runner.parameters.output_limit = 1.0
+    runner.parameters.hash_stdout = True
+    for size, status in [(0, Status.OK), (1048576, Status.OK),
+                         (1048577, Status.OUTPUT_LIMIT),
+                         (5000000, Status.OUTPUT_LIMIT)]:
+        runner.parameters.args = [str(size)]
+        runner.run()
+        assert runner.results.status == status
+        assert os.path.getsize(out_file) <= 1048577
+        assert runner.results.stdout_digest == file_digest(out_file)
+    runner.parameters.output_limit = None
+    runner.parameters.args = ['5000000']
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert os.path.getsize(out_file) == 5000000
+    assert runner.results.stdout_digest == file_digest(out_file)
+    runner.parameters.hash_stdout = None
+    runner.run()
+    assert runner.results.stdout_digest is None
+    runner.parameters.stdout_redir = ''
+    runner.parameters.hash_stdout = True
+    runner.run()
+    assert runner.results.status == Status.RUN_FAIL
+
+    # the captured stdout is not read if it's hashed or written into the file
+    runner.capture_stdout = True
+    runner.parameters.args = ['1000']
+    runner.stdout_file = Path(str(tmpdir)) / 'direct.txt'
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.stdout == ''
+    assert runner.results.stdout_digest == file_digest(runner.stdout_file)
+    runner.stdout_file = None
+    runner.run()
+    assert runner.stdout == ''
+    assert runner.results.stdout_digest == file_digest(
+        Path(str(tmpdir)) / 'direct.txt')
+    runner.parameters.hash_stdout = None
+    runner.run()
+    assert len(runner.stdout) == 1000
+    runner.capture_stdout = False
+    runner.parameters.args = []
+
+
+def test_perf_counters(runner):
+    '''test_perf_counters: test for perf_counters parameter'''
+    if RunnerFeature.PERF_COUNTERS not in runner.info.features:
+        pytest.skip('perf counters are not supported by the runner')
+    runner.parameters.executable = path.join(tests_location(), 'worky_test')
+    runner.parameters.time_limit = 2.0
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.results.counters is None
+    runner.parameters.perf_counters = True
+    runner.run()
+    assert runner.results.status == Status.OK
+    counters = runner.results.counters
+    assert counters is not None
+    # the counters may be unavailable in the sandbox, but those collected
+    # must be consistent with the measured time
+    if 'task-clock' in counters:
+        assert abs(counters['task-clock'] / 1e9 - runner.results.time) < 0.1
+    if 'instructions' in counters:
+        assert counters['instructions'] > 0
+    runner.parameters.perf_counters = None
+
+
+def test_calibrate(runner):
+    '''test_calibrate: test for runner overhead calibration'''
+    runner.parameters.executable = path.join(tests_location(), 'basic_test')
+    runner.capture_stdout = True
+    runner.run()
+    assert list(runner.phases.keys()) == RUN_PHASES
+    assert runner.results.phases is not None
+    assert sum(runner.phases.values()) > runner.phases['wait'] > 0
+
+    baseline = runner.calibrate(5)
+    assert runner.baseline == baseline
+    assert baseline.runs == 5
+    assert list(baseline.phases.keys()) == RUN_PHASES
+    assert all(value >= 0 for value in baseline.phases.values())
+    assert 0 < baseline.clock_time < 1.0
+    # the runner state is restored after calibration
+    assert runner.parameters.executable == path.join(tests_location(),
+                                                     'basic_test')
+    assert runner.capture_stdout
+    assert not runner.pass_stdin
+    runner.capture_stdout = False
+
+
+@pytest.mark.parametrize('launch_mode', list(LaunchMode))
+def test_launch_mode(runner, launch_mode):
+    '''test_launch_mode: the program runs the same way in all the launch
+    modes'''
+    runner.parameters.launch_mode = launch_mode
+    runner.capture_stdout = True
+    runner.parameters.executable = path.join(tests_location(), 'env_test')
+    runner.parameters.env['HELLO'] = '42'
+    runner.parameters.clear_env = True
+    runner.run()
+    assert runner.results.status == Status.OK
+    assert runner.stdout == 'env=42\n'
+    runner.parameters.executable = path.join(tests_location(), 'args_test')
+    runner.parameters.args = ['arg1', 'arg2']
+    runner.run()
+    assert runner.stdout == 'arg1\narg2\n'
+    runner.parameters.executable = path.join(tests_location(), 'broken_test')
+    runner.run()
+    assert runner.results.status == Status.RUN_FAIL
+    runner.parameters.executable = path.join(tests_location(), 'runerror_test')
+    runner.parameters.args = []
+    runner.pass_stdin = True
+    runner.stdin = 'error'
+    runner.run()
+    assert runner.results.status == Status.RUNTIME_ERROR
+    # the signals blocked while launching are unblocked in the program
+    runner.parameters.executable = shutil.which('grep')
+    runner.parameters.args = ['SigBlk', '/proc/self/status']
+    runner.pass_stdin = False
+    runner.run()
+    assert runner.stdout == 'SigBlk:\t0000000000000000\n'
+    assert runner.phases['exec'] > 0
+
+
+def test_vfork_perf_counters(runner):
+    '''test_vfork_perf_counters: vfork launch is impossible with perf
+    counters, auto mode falls back to fork'''
+    runner.parameters.executable = path.join(tests_location(), 'basic_test')
+    runner.parameters.perf_counters = True
+    runner.parameters.launch_mode = LaunchMode.VFORK
+    runner.run()
+    assert runner.results.status == Status.RUN_FAIL
+    runner.parameters.launch_mode = LaunchMode.AUTO
+    runner.run()
+    assert runner.results.status == Status.OK
+
+
+def test_batch(runner):
+    '''test_batch: test for running many programs in one runner process'''
+    if RunnerFeature.BATCH not in runner.info.features:
+        pytest.skip('batch mode is not supported by the runner')
+    parameters_list = [
+        Parameters(executable=path.join(tests_location(), 'sleepy_test')),
+        Parameters(executable=path.join(tests_location(), 'worky_test'),
+                   time_limit=0.3),
+        Parameters(executable=path.join(tests_location(), 'invalid_test')),
+        Parameters(executable=path.join(tests_location(), 'runerror_test'),
+                   stdin_redir=os.devnull),
+        Parameters(executable=path.join(tests_location(), 'basic_test'))]
+    order = [index for index, _ in runner.iter_batch(parameters_list, 3)]
+    assert sorted(order) == list(range(len(parameters_list)))
+    # the short runs finish before the long ones
+    assert order.index(4) < order.index(0)
+
+    results = runner.run_batch(parameters_list, 3)
+    assert [item.status for item in results] == [
+        Status.OK, Status.TIME_LIMIT, Status.RUN_FAIL, Status.OK, Status.OK]
+    assert abs(results[0].clock_time - 0.55) < 0.12
+    assert results[1].time >= 0.3
+    # a tiny interval is rounded up, so the idle limit is still checked
+    sleepy = Parameters(executable=path.join(tests_location(), 'sleepy_test'),
+                        idle_limit=0.2)
+    results = runner.run_batch([sleepy], poll_interval=1e-12)
+    assert results[0].status == Status.IDLE_LIMIT
+    assert results[0].clock_time < 0.45
+    assert runner.run_batch([]) == []
@@ -0,0 +1,98 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from runners import scheduler
+from runners.scheduler import MemoryScheduler, available_memory
+from runners.scheduler import memory_budget
+from runners.config import CONFIG_NAME
+from ...pytest_fixtures import config_manager
+
+
+def test_available_memory(tmpdir):
+    meminfo = Path(str(tmpdir)) / 'meminfo'
+    meminfo.open('w').write('MemTotal:       16384000 kB\n'
+                            'MemFree:         1024000 kB\n'
+                            'MemAvailable:    8192000 kB\n')
+    assert available_memory(str(meminfo)) == 8000.0
+    meminfo.open('w').write('MemTotal:       16384000 kB\n')
+    assert available_memory(str(meminfo)) is None
+    assert available_memory(str(tmpdir / 'missing')) is None
+
+
+def test_memory_budget(tmpdir, config_manager, monkeypatch):
+    config_manager.user_config(CONFIG_NAME).open('w').write('''
+[scheduler]
+memory-budget = 1000.0
+available-ratio = 0.5
+''')
+    monkeypatch.setattr(scheduler, 'available_memory', lambda: 4000.0)
+    assert memory_budget() == 1000.0
+    monkeypatch.setattr(scheduler, 'available_memory', lambda: 1000.0)
+    assert memory_budget() == 500.0
+    monkeypatch.setattr(scheduler, 'available_memory', lambda: None)
+    assert memory_budget() == 1000.0
+
+
+def test_memory_scheduler():
+    mem_scheduler = MemoryScheduler(1000.0)
+    lock = threading.Lock()
+    used = 0.0
+    max_used = 0.0
+
+    def run(memory):
+        nonlocal used, max_used
+        with mem_scheduler.admit(memory):
+            with lock:
+                used += memory
+                max_used = max(max_used, used)
+            time.sleep(0.02)
+            with lock:
+                used -= memory
+
+    threads = [threading.Thread(target=run, args=(memory,))
+               for memory in [600.0, 300.0, 500.0, 200.0, 400.0, 100.0]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 600.0 <= max_used <= 1000.0
+    assert mem_scheduler.used == 0.0
+    assert mem_scheduler.running == 0
+
+    # the run larger than the budget is admitted when nothing is running
+    with mem_scheduler.admit(5000.0):
+        assert mem_scheduler.running == 1
+
+
+def test_memory_scheduler_shared(tmpdir):
+    # the instances with the same lock_dir behave like different processes
+    first = MemoryScheduler(1000.0, str(tmpdir))
+    second = MemoryScheduler(1000.0, str(tmpdir))
+    with first.admit(600.0):
+        with second.admit(300.0):
+            admitted = []
+
+            def run():
+                with second.admit(500.0):
+                    admitted.append(True)
+
+            thread = threading.Thread(target=run)
+            thread.start()
+            time.sleep(0.05)
+            # 600 + 300 + 500 doesn't fit into the budget
+            assert admitted == []
+        time.sleep(0.05)
+        assert admitted == []
+    thread.join()
+    assert admitted == [True]
+    assert (Path(str(tmpdir)) / MemoryScheduler.RUNS_FILE).open().read() == ''
+
+    # the runs of the dead processes are dropped
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    (Path(str(tmpdir)) / MemoryScheduler.RUNS_FILE).open('w').write(
+        '{} 0 1000.0\n'.format(process.pid))
+    with first.admit(600.0):
+        assert first.running == 1
@@ -0,0 +1,45 @@
+from pathlib import Path
+from runners import scratch
+from runners.scratch import ScratchPool, scratch_pool, scratch_root
+from runners.config import CONFIG_NAME
+from ...pytest_fixtures import config_manager
+
+
+def test_scratch_pool(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    pool = ScratchPool(tmpdir)
+
+    dir1 = pool.acquire()
+    dir2 = pool.acquire()
+    assert dir1 != dir2
+    assert dir1.parent == tmpdir and dir1.is_dir()
+    (dir1 / 'file').open('w').write('contents')
+    (dir1 / 'subdir').mkdir()
+    (dir1 / 'subdir' / 'file').open('w').write('contents')
+    pool.release(dir1)
+    assert dir1.is_dir()
+    assert list(dir1.iterdir()) == []
+
+    with pool.directory() as dir3:
+        assert dir3 == dir1
+    pool.release(dir2)
+
+    pool.cleanup()
+    assert list(tmpdir.iterdir()) == []
+
+
+def test_scratch_root(tmpdir, config_manager, monkeypatch):
+    tmpdir = Path(str(tmpdir))
+    config_manager.user_config(CONFIG_NAME).open('w').write('''
+[scratch]
+dir = '{}'
+'''.format(tmpdir))
+    assert scratch_root() == tmpdir
+    assert scratch_pool().root == tmpdir
+    assert scratch_pool() is scratch_pool(tmpdir)
+
+    monkeypatch.setattr(scratch, 'SHM_PATH', tmpdir)
+    assert scratch.default_scratch_root(0.0) == tmpdir
+    assert scratch.default_scratch_root(1e12) != tmpdir
+    monkeypatch.setattr(scratch, 'SHM_PATH', tmpdir / 'missing')
+    assert scratch.default_scratch_root(0.0) != tmpdir / 'missing'
@@ -0,0 +1,18 @@
+'''
+Programmatic interface to Taker
+
+It allows to compile and run the programs in the task without spawning "take"
+and without exiting the interpreter, for example:
+
+    session = Session(task_dir)
+    compile_result = session.compile(Path('solution.cpp'))
+    run_result = session.run(compile_result.exe_file, 'generator',
+                             language=compile_result.language, stdin='1 2')
+'''
+from invoker import Session, CompileResult, RunResult, TestRun
+from invoker import CompileError, RepeatStats, repeat_stats
+from runners import Status, Results, Rusage, TraceSample
+
+__all__ = ['Session', 'CompileResult', 'RunResult', 'TestRun', 'CompileError',
+           'RepeatStats', 'repeat_stats', 'Status', 'Results', 'Rusage',
+           'TraceSample']
@@ -1,7 +1,7 @@
 import colorama
 from cli import ConsoleApp, app, register_app
 from taskbuilder import TaskDirNotFoundError
-from invoker import CompileSubcommand, RunSubcommand
+from invoker import CompileSubcommand, RunSubcommand, RunnerBenchSubcommand
 
 
 class TakerApp(ConsoleApp):
@@ -24,4 +24,5 @@ def main():
     colorama.init()
     app().add_subcommand(CompileSubcommand())
     app().add_subcommand(RunSubcommand())
+    app().add_subcommand(RunnerBenchSubcommand())
     app().run()
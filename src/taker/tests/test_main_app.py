@@ -1,3 +1,5 @@
+import hashlib
+import json
 import subprocess
 from subprocess import PIPE
 import pytest
@@ -72,6 +74,35 @@ def test_compile(repo_manager, monkeypatch):
     assert res.stdout.find('compilation error') >= 0
 
 
+def test_compile_many(repo_manager, monkeypatch):
+    monkeypatch.chdir(fspath(repo_manager.repo.directory))
+    make_source()
+    make_badsource()
+    shutil.copy('file.cpp', 'file2.cpp')
+
+    res = subprocess.run(['take', 'compile', 'file.cpp', 'file2.cpp',
+                          '-l', 'cpp.g++14', '-j', '2',
+                          '-o', 'first' + default_exe_ext(),
+                          '-o', 'second' + default_exe_ext()],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode == 0
+    assert res.stdout.count('ok') == 2
+    assert os.path.isfile('first' + default_exe_ext())
+    assert os.path.isfile('second' + default_exe_ext())
+
+    res = subprocess.run(['take', 'compile', 'file.cpp', 'bad.cpp'],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode != 0
+    assert res.stdout.find('bad.cpp') >= 0
+    assert res.stdout.find('compilation error') >= 0
+
+    res = subprocess.run(['take', 'compile', 'file.cpp', 'file2.cpp',
+                          '-o', 'first' + default_exe_ext()],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode != 0
+    assert res.stderr.find('--exe must be given once for each source') >= 0
+
+
 def test_run(repo_manager, monkeypatch):
     tests_loc = tests_location()
     badexe_loc = bad_exe_location()
@@ -96,6 +127,12 @@ def test_run(repo_manager, monkeypatch):
     assert res.stdout == '4\n'
     assert res.stderr == 'done\n'
 
+    res = subprocess.run(['take', 'run', code_div_exe, '-p', 'compiler', '-q',
+                          '--hash-stdout', '--output-limit', '1'],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout == hashlib.sha256(b'4\n').hexdigest() + '\n'
+
     open('input.txt', 'w').write('12 0')
     res = subprocess.run(['take', 'run', code_div_exe, '-p', 'compiler'],
                          stdout=PIPE, stderr=PIPE,
@@ -125,3 +162,113 @@ def test_run(repo_manager, monkeypatch):
     assert res.returncode != 0
     assert res.stdout == ''
     assert res.stderr.find('error: program exited with status run-fail') >= 0
+
+
+def test_run_tests(repo_manager, monkeypatch):
+    monkeypatch.chdir(fspath(repo_manager.repo.directory))
+    make_source()
+    subprocess.run(['take', 'compile', 'file.cpp'], check=True,
+                   stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    exe = 'file' + default_exe_ext()
+
+    os.mkdir('tests')
+    for test in range(5):
+        open(path.join('tests', '{}.in'.format(test)), 'w').write(
+            '{} 1'.format(test))
+    os.mkdir('out')
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator', '-j', '2',
+                          '-T', 'tests', '-O', 'out'],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout.find('5 of 5 test(s) passed') >= 0
+    for test in range(5):
+        assert open(path.join('out', '{}.out'.format(test))).read() == \
+            '{}\n'.format(test + 1)
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator', '-j', '2',
+                          '--isolate', '-T', 'tests'],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout.find('5 of 5 test(s) passed') >= 0
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator', '-q',
+                          '-T', path.join('tests', '0.in')],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout == ''
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'checker', '-q',
+                          '-I', path.join('tests', '2.in')],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout == '3\n'
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator',
+                          '-I', 'missing.in'],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode != 0
+    assert res.stderr.find('not found') >= 0
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator', '-O', 'out'],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode != 0
+    assert res.stderr.find('require --tests') >= 0
+
+    open('0', 'w').write('0 1')
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator',
+                          '-T', '0', path.join('tests', '0.in'), '-O', 'out'],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode != 0
+    assert res.stderr.find('have the same output file') >= 0
+
+
+def test_run_repeat(repo_manager, monkeypatch):
+    monkeypatch.chdir(fspath(repo_manager.repo.directory))
+    make_source()
+    subprocess.run(['take', 'compile', 'file.cpp'], check=True,
+                   stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    exe = 'file' + default_exe_ext()
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator', '-r', '5',
+                          '-j', '2'],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout.find('median') >= 0
+    assert res.stdout.find('runs: 5, failed: 0') >= 0
+
+    res = subprocess.run(['take', 'run', exe, '-p', 'generator', '-r', '2',
+                          '-T', 'file.cpp'],
+                         stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    assert res.returncode != 0
+    assert res.stderr.find('cannot be used with --tests') >= 0
+
+
+def test_run_trace(repo_manager, monkeypatch):
+    monkeypatch.chdir(fspath(repo_manager.repo.directory))
+    make_source()
+    subprocess.run(['take', 'compile', 'file.cpp'], check=True,
+                   stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    exe = 'file' + default_exe_ext()
+
+    subprocess.run(['take', 'run', exe, '-p', 'generator', '--trace',
+                    'trace.json', '--trace-interval', '0.001'],
+                   check=True, stdout=PIPE, stderr=PIPE,
+                   universal_newlines=True)
+    trace = json.load(open('trace.json'))
+    assert set(trace.keys()) == {'clock-time', 'time', 'rss', 'vm'}
+    assert len({len(values) for values in trace.values()}) == 1
+
+
+def test_runner_bench(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    res = subprocess.run(['take', 'runner-bench', '-n', '3', '-m', 'fork',
+                          '-m', 'vfork', '-o', 'baseline.json'],
+                         check=True, stdout=PIPE, stderr=PIPE,
+                         universal_newlines=True)
+    assert res.stdout.find('baseline clock time') >= 0
+    assert res.stdout.find('launch mode: vfork') >= 0
+    baselines = json.load(open('baseline.json'))
+    assert set(baselines.keys()) == {'fork', 'vfork'}
+    assert baselines['fork']['runs'] == 3
+    assert 'wait' in baselines['vfork']['phases']
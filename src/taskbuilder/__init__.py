@@ -1,5 +1,6 @@
 from .repository import TaskRepository, get_repository, TaskDirNotFoundError
 from .commands import File, AbsoluteFile, NullFile, InputFile, OutputFile
 from .commands import CommandFlag, TouchCommand, MakeDirCommand, EchoCommand
+from .commands import StampCommand
 from .makefiles import RuleOptions, Makefile
 from .manager import RepositoryManager
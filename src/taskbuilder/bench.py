@@ -0,0 +1,205 @@
+'''
+Scalability benchmarks for Makefile generation
+
+The benchmark synthesizes a task with the given number of rules (one half are
+file rules which generate tests, the other half are dynamic rules which run
+the solution on them, each half in its own Makefile group), and measures time
+and peak memory for the following phases:
+
+build - creating the rules and adding the commands into them
+dump - converting the rule graph into Makefile text
+save - writing the Makefile and its fragments into the task directory
+
+Thresholds are specified per rule (microseconds for time and bytes for
+memory), so the same thresholds can be used for all the task sizes. If any
+phase exceeds its threshold, the benchmark fails.
+
+Run it with "python -m taskbuilder.bench" (see --help for options).
+'''
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from .repository import TaskRepository
+from .makefiles import Makefile, RuleOptions
+from .commands import InputFile, OutputFile, EchoCommand
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+PHASES = ['build', 'dump', 'save']
+
+Threshold = namedtuple('Threshold', ['time', 'memory'])
+
+BenchResult = namedtuple('BenchResult',
+                         ['phase', 'rules', 'time', 'memory'])
+
+# Thresholds per one rule: time in microseconds, memory in bytes. They are
+# loose enough to pass on slow CI machines, but catch complexity regressions
+# (e.g. quadratic behaviour on large tasks)
+DEFAULT_THRESHOLDS = {
+    'build': Threshold(time=1000.0, memory=6144),
+    'dump': Threshold(time=1500.0, memory=2048),
+    'save': Threshold(time=1500.0, memory=2048),
+}
+
+
+def synthesize_task(makefile, rule_count):
+    for test in range(rule_count // 2):
+        input_file = Path('tests') / '{:03}'.format(test)
+        answer_file = Path('tests') / '{:03}.a'.format(test)
+
+        gen_rule = makefile.add_file_rule(input_file, group='tests')
+        gen_rule.add_executable(Path('gen') / 'gen',
+                                args=['--test', str(test), '--seed', '42'],
+                                stdout_redir=OutputFile(input_file))
+
+        run_rule = makefile.add_dynamic_rule(
+            'run-{}'.format(test), group='solutions',
+            options={RuleOptions.FORCE_SINGLE_TARGET})
+        run_rule.add_executable(Path('sol') / 'sol',
+                                stdin_redir=InputFile(input_file),
+                                stdout_redir=OutputFile(answer_file))
+        run_rule.add_executable(Path('check') / 'check',
+                                args=[InputFile(input_file),
+                                      InputFile(answer_file)])
+        run_rule.add_command(EchoCommand, 'test {} ok'.format(test))
+        makefile.all_rule.add_depend(run_rule)
+
+
+def _run_phases(repo, rule_count, trace_memory):
+    makefile = Makefile(repo)
+    phases = [('build', lambda: synthesize_task(makefile, rule_count)),
+              ('dump', makefile.dump),
+              ('save', makefile.save)]
+    results = []
+    for phase, func in phases:
+        gc.collect()
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            start_time = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start_time
+            peak_memory = None
+            if trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+        results += [BenchResult(phase=phase, rules=rule_count, time=elapsed,
+                                memory=peak_memory)]
+    return results
+
+
+def run_benchmark(rule_count, measure_memory=True):
+    '''Runs the benchmark on the task with rule_count rules, returns the list
+    of BenchResult (one per phase)
+
+    Time and memory are measured in separate passes, as tracing memory
+    allocations slows the code down significantly. If measure_memory is
+    False, memory is not measured and set to None'''
+    with TemporaryDirectory() as task_dir:
+        repo = TaskRepository(task_dir)
+        repo.init_task()
+        results = _run_phases(repo, rule_count, False)
+        if measure_memory:
+            memory_results = _run_phases(repo, rule_count, True)
+            results = [result._replace(memory=memory_result.memory)
+                       for result, memory_result
+                       in zip(results, memory_results)]
+        return results
+
+
+def check_thresholds(results, thresholds=None):
+    '''Returns the list of error messages for the results that exceed the
+    thresholds'''
+    if thresholds is None:
+        thresholds = DEFAULT_THRESHOLDS
+    errors = []
+    for result in results:
+        threshold = thresholds.get(result.phase)
+        if threshold is None or result.rules == 0:
+            continue
+        time_per_rule = 1e6 * result.time / result.rules
+        if threshold.time is not None and time_per_rule > threshold.time:
+            errors += ['{} ({} rules): {:.1f} us per rule, {:.1f} expected'
+                       .format(result.phase, result.rules, time_per_rule,
+                               threshold.time)]
+        if threshold.memory is None or result.memory is None:
+            continue
+        memory_per_rule = result.memory / result.rules
+        if memory_per_rule > threshold.memory:
+            errors += ['{} ({} rules): {:.0f} bytes per rule, {} expected'
+                       .format(result.phase, result.rules, memory_per_rule,
+                               threshold.memory)]
+    return errors
+
+
+def format_results(results):
+    lines = ['{:>8} {:>8} {:>10} {:>12} {:>10} {:>10}'.format(
+        'phase', 'rules', 'time, s', 'memory, MiB', 'us/rule', 'B/rule')]
+    for result in results:
+        rules = max(result.rules, 1)
+        memory, memory_per_rule = '-', '-'
+        if result.memory is not None:
+            memory = '{:.2f}'.format(result.memory / 1048576)
+            memory_per_rule = '{:.0f}'.format(result.memory / rules)
+        lines += ['{:>8} {:>8} {:>10.3f} {:>12} {:>10.1f} {:>10}'.format(
+            result.phase, result.rules, result.time, memory,
+            1e6 * result.time / rules, memory_per_rule)]
+    return '\n'.join(lines)
+
+
+def parse_threshold(value):
+    key, sep, number = value.partition('=')
+    phase, dot, kind = key.partition('.')
+    if not sep or not dot or phase not in PHASES or \
+            kind not in Threshold._fields:
+        raise argparse.ArgumentTypeError(
+            'threshold must look like PHASE.{time|memory}=VALUE')
+    try:
+        return phase, kind, float(number)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(
+            '{} is not a number'.format(number)) from exc
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m taskbuilder.bench',
+        description='Benchmarks Makefile generation on large tasks')
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES,
+                        help='Number of rules in the synthesized tasks '
+                             '(default: {})'.format(
+                                 ' '.join(map(str, DEFAULT_SIZES))))
+    parser.add_argument('-t', '--threshold', type=parse_threshold,
+                        action='append', default=[],
+                        help='Override the threshold, e.g. dump.time=100 '
+                             '(microseconds per rule) or build.memory=4096 '
+                             '(bytes per rule)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Do not measure peak memory (this makes the '
+                             'benchmark several times faster)')
+    args = parser.parse_args(args)
+
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for phase, kind, value in args.threshold:
+        thresholds[phase] = thresholds[phase]._replace(**{kind: value})
+
+    results = []
+    for size in args.sizes:
+        results += run_benchmark(size, not args.no_memory)
+    print(format_results(results))
+
+    errors = check_thresholds(results, thresholds)
+    for error in errors:
+        print('threshold exceeded: ' + error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
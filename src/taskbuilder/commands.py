@@ -11,11 +11,13 @@ directory, NOT to the current directory.
 Also, the paths use pathlib.Path class and are not stored in "raw" string
 format.
 '''
+import os
 from os import path
 from pathlib import Path
 import shlex
 import shutil
-from copy import copy, deepcopy
+from copy import copy
+from functools import lru_cache
 from enum import Enum, unique
 from compat import fspath
 from taskbuilder import utils
@@ -31,11 +33,19 @@ class CommandFlag(Enum):
     FORCE = '+'
 
 
+NO_FLAGS = frozenset()
+SILENT_FLAGS = frozenset({CommandFlag.SILENT})
+
+CURDIR_PATH = Path(path.curdir)
+
+
 def command_flags_to_str(flags):
     return ''.join(sorted((f.value for f in flags)))
 
 
 class File:
+    __slots__ = ('filename', 'prefix')
+
     def __eq__(self, other):
         return ((type(self) == type(other)) and
                 (self.filename == other.filename))
@@ -59,8 +69,22 @@ class File:
     def absolute(self, repo):
         return repo.abspath(self.filename)
 
+    def _normalized_filename(self, repo):
+        return repo.relpath(self.filename)
+
     def normalize(self, repo):
-        self.filename = repo.relpath(self.filename)
+        self.filename = self._normalized_filename(repo)
+
+    def normalized(self, repo):
+        '''Returns the normalized copy of the file. If the file is already
+        normalized, returns the file itself, so the file objects are not
+        copied needlessly'''
+        filename = self._normalized_filename(repo)
+        if filename == self.filename:
+            return self
+        result = copy(self)
+        result.filename = filename
+        return result
 
     def relative_to(self, repo, work_dir):
         abs_filename = self.absolute(repo)
@@ -69,27 +93,33 @@ class File:
 
 
 class AbsoluteFile(File):
-    def normalize(self, repo):
-        self.filename = repo.abspath(self.filename)
+    __slots__ = ()
+
+    def _normalized_filename(self, repo):
+        return repo.abspath(self.filename)
 
     def relative_to(self, repo, work_dir):
         return self.filename
 
 
 class NullFile(AbsoluteFile):
+    __slots__ = ()
+
     def __init__(self, prefix=''):
         super().__init__(path.devnull, prefix)
 
 
 class InputFile(File):
-    pass
+    __slots__ = ()
 
 
 class OutputFile(File):
-    pass
+    __slots__ = ()
 
 
 class Executable(File):
+    __slots__ = ()
+
     def command_name(self, repo, work_dir):
         result = fspath(self.relative_to(repo, work_dir))
         if path.basename(result) == result:
@@ -97,27 +127,40 @@ class Executable(File):
         return result
 
 
+@lru_cache(maxsize=None)
+def _which(cmd_name, search_path):
+    return shutil.which(cmd_name, path=search_path)
+
+
 class GlobalCmd(Executable):
+    __slots__ = ()
+
     def relative_to(self, repo, work_dir):
         return self.filename
 
     def command_name(self, repo, work_dir):
         return fspath(self.filename)
 
-    def normalize(self, repo):
-        new_filename = shutil.which(fspath(self.filename))
+    def _normalized_filename(self, repo):
+        # lookups are cached, as the same commands are resolved for lots of
+        # the rules
+        new_filename = _which(fspath(self.filename), os.environ.get('PATH'))
         if new_filename is None:
             raise FileNotFoundError('command {} not found'
                                     .format(new_filename))
-        self.filename = Path(new_filename)
+        return Path(new_filename)
 
 
 class ShellCmd(GlobalCmd):
-    def normalize(self, repo):
-        pass
+    __slots__ = ()
+
+    def _normalized_filename(self, repo):
+        return self.filename
 
 
 class AbstractCommand:
+    __slots__ = ('repo', 'work_dir', 'flags')
+
     def get_input_files(self):
         raise NotImplementedError()
 
@@ -140,19 +183,23 @@ class AbstractCommand:
 
     def __init__(self, repo, work_dir=None, flags=None):
         if flags is None:
-            flags = set()
-        if work_dir is None:
-            work_dir = repo.directory
+            flags = NO_FLAGS
         self.repo = repo
-        self.work_dir = repo.relpath(work_dir)
+        if work_dir is None:
+            self.work_dir = CURDIR_PATH
+        else:
+            self.work_dir = repo.relpath(work_dir)
         self.flags = flags
 
 
 class Command(AbstractCommand):
+    __slots__ = ('executable', 'args', 'stdin_redir', 'stdout_redir',
+                 'stderr_redir')
+
     def __normalize_file(self, the_file):
         if not isinstance(the_file, File):
-            return
-        the_file.normalize(self.repo)
+            return the_file
+        return the_file.normalized(self.repo)
 
     def __executable_to_shell(self, exe):
         if isinstance(exe, Executable):
@@ -167,23 +214,18 @@ class Command(AbstractCommand):
                                                        self.work_dir))
         raise TypeError('arg has invalid type (str or File expected)')
 
-    def __normalize_files(self):
-        self.__normalize_file(self.executable)
-        self.__normalize_file(self.stdin_redir)
-        self.__normalize_file(self.stdout_redir)
-        self.__normalize_file(self.stderr_redir)
-        for the_file in self.args:
-            self.__normalize_file(the_file)
-
-    def __init__(self, repo, executable, args=[], work_dir=None, flags=None,
+    def __init__(self, repo, executable, args=None, work_dir=None, flags=None,
                  stdin_redir=None, stdout_redir=None, stderr_redir=None):
         super().__init__(repo, work_dir, flags)
-        self.executable = copy(executable)
-        self.args = deepcopy(args)
-        self.stdin_redir = copy(stdin_redir)
-        self.stdout_redir = copy(stdout_redir)
-        self.stderr_redir = copy(stderr_redir)
-        self.__normalize_files()
+        # the files are not modified after normalization, so they are not
+        # copied and can be shared between the commands
+        if args is None:
+            args = []
+        self.executable = self.__normalize_file(executable)
+        self.args = [self.__normalize_file(arg) for arg in args]
+        self.stdin_redir = self.__normalize_file(stdin_redir)
+        self.stdout_redir = self.__normalize_file(stdout_redir)
+        self.stderr_redir = self.__normalize_file(stderr_redir)
 
     def get_input_files(self):
         return [item
@@ -219,11 +261,15 @@ class Command(AbstractCommand):
 
 
 class TouchCommand(Command):
+    __slots__ = ()
+
     def __init__(self, repo, target_file):
         super().__init__(repo, GlobalCmd('touch'), args=[target_file])
 
 
 class MakeDirCommand(Command):
+    __slots__ = ()
+
     def __init__(self, repo, dirname, parents=False):
         args = []
         if parents:
@@ -232,8 +278,29 @@ class MakeDirCommand(Command):
         super().__init__(repo, GlobalCmd('mkdir'), args=args)
 
 
+class StampCommand(Command):
+    '''Creates an empty stamp file using shell builtins only, so no extra
+    process is spawned. The directory of the stamp is created only if it's
+    missing (e.g. removed after the makefile was saved)'''
+    __slots__ = ()
+
+    def _shell_str_internal(self):
+        stamp_dir = fspath(self.stdout_redir.relative_to(
+            self.repo, self.work_dir).parent)
+        if stamp_dir == path.curdir:
+            return super()._shell_str_internal()
+        return 'test -d {0} || mkdir -p {0}; {1}'.format(
+            shlex.quote(stamp_dir), super()._shell_str_internal())
+
+    def __init__(self, repo, target_file):
+        super().__init__(repo, ShellCmd(':'), flags=SILENT_FLAGS,
+                         stdout_redir=target_file)
+
+
 class EchoCommand(Command):
+    __slots__ = ()
+
     def __init__(self, repo, message, stdout_redir=None):
         super().__init__(repo, ShellCmd('echo'),
-                         flags={CommandFlag.SILENT}, args=[message],
+                         flags=SILENT_FLAGS, args=[message],
                          stdout_redir=stdout_redir)
@@ -1,10 +1,15 @@
+import re
+from array import array
 from enum import Enum, unique
 from pathlib import Path
 from compat import fspath
 from .commands import Executable, GlobalCmd, ShellCmd, File, Command
-from .commands import MakeDirCommand, EchoCommand, TouchCommand
+from .commands import EchoCommand, StampCommand
 from .repository import INTERNAL_PATH
 
+FRAGMENTS_PATH = INTERNAL_PATH / 'make'
+FRAGMENT_EXT = '.mk'
+
 # TODO : Add strict validation for target names (?)
 
 
@@ -26,11 +31,85 @@ class RuleOptions(Enum):
 
 DEFAULT_OPTIONS = {RuleOptions.CHECK_SINGLE_TARGET}
 
+FILE_PLAIN = 0
+FILE_INPUT = 1
+FILE_OUTPUT = 2
+
+
+class PathTable:
+    '''Shared table of path strings. Each path is stored once and is
+    referred by its integer id'''
+
+    def intern(self, the_path):
+        the_path = fspath(the_path)
+        path_id = self.__ids.get(the_path)
+        if path_id is None:
+            path_id = len(self.__paths)
+            self.__ids[the_path] = path_id
+            self.__paths.append(the_path)
+        return path_id
+
+    def find(self, the_path):
+        return self.__ids.get(fspath(the_path))
+
+    def __getitem__(self, path_id):
+        return self.__paths[path_id]
+
+    def __len__(self):
+        return len(self.__paths)
+
+    def __init__(self):
+        self.__ids = {}
+        self.__paths = []
+
+
+class IdArray:
+    '''Array of unique integer ids, which keeps the insertion order
+
+    The ids are stored in a compact array and small arrays are scanned
+    linearly. The hash index is built only when the array grows large (for
+    example, "all" rule with lots of dependencies)'''
+    INDEX_THRESHOLD = 32
+
+    __slots__ = ('items', 'index')
+
+    def position(self, value):
+        if self.index is not None:
+            return self.index.get(value, -1)
+        try:
+            return self.items.index(value)
+        except ValueError:
+            return -1
+
+    def __contains__(self, value):
+        return self.position(value) >= 0
+
+    def add(self, value):
+        if value in self:
+            return False
+        if self.index is not None:
+            self.index[value] = len(self.items)
+        self.items.append(value)
+        if self.index is None and len(self.items) > self.INDEX_THRESHOLD:
+            self.index = {item: pos for pos, item in enumerate(self.items)}
+        return True
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __init__(self):
+        self.items = array('l')
+        self.index = None
+
 
 class MakefileBase:
     def __init__(self, repo):
         self.repo = repo
         self.aliases = {}
+        self.paths = PathTable()
 
     def alias(self, word, meaning):
         if word in self.aliases:
@@ -57,33 +136,54 @@ class RuleBase:
                  options=DEFAULT_OPTIONS):
         self.makefile = makefile
         self.repo = makefile.repo
+        self.paths = makefile.paths
+        self.group = None
         self.commands = []
         self.options = options
-        self.input_files = set()
-        self.output_files = set()
-        self.files = set()
-        self.depends = set()
+        # each file is stored once with its role (FILE_*), which is defined
+        # when the file is added first
+        self._files = IdArray()
+        self._file_roles = bytearray()
+        self._depends = IdArray()
         self.name = target_name
         self.description = description
         if description is not None:
             self.makefile.add_rule_description(target_name, description)
 
+    def __add_file(self, the_file, role):
+        if self._files.add(self.paths.intern(the_file)):
+            self._file_roles.append(role)
+
+    def _file_names(self, role=None):
+        return {self.paths[file_id]
+                for file_id, file_role in zip(self._files, self._file_roles)
+                if role is None or file_role == role}
+
+    @property
+    def input_files(self):
+        return self._file_names(FILE_INPUT)
+
+    @property
+    def output_files(self):
+        return self._file_names(FILE_OUTPUT)
+
+    @property
+    def files(self):
+        return self._file_names()
+
+    @property
+    def depends(self):
+        return {self.paths[depend_id] for depend_id in self._depends}
+
     def _do_add_command(self, command):
         for the_file in command.get_output_files():
-            the_file = fspath(the_file)
-            if the_file not in self.files:
-                self.output_files.add(the_file)
-                self.files.add(the_file)
+            self.__add_file(the_file, FILE_OUTPUT)
 
         for the_file in command.get_input_files():
-            the_file = fspath(the_file)
-            if the_file not in self.files:
-                self.input_files.add(the_file)
-                self.files.add(the_file)
+            self.__add_file(the_file, FILE_INPUT)
 
         for the_file in command.get_all_files():
-            the_file = fspath(the_file)
-            self.files.add(the_file)
+            self.__add_file(the_file, FILE_PLAIN)
 
     def add_command(self, cmdtype, *args, **kwargs):
         command = cmdtype(self.repo, *args, **kwargs)
@@ -95,8 +195,10 @@ class RuleBase:
             return
         if isinstance(depend, RuleBase):
             depend = depend.name
-        if depend not in self.input_files:
-            self.depends.add(depend)
+        depend_id = self.paths.intern(depend)
+        pos = self._files.position(depend_id)
+        if pos < 0 or self._file_roles[pos] != FILE_INPUT:
+            self._depends.add(depend_id)
 
     def add_executable(self, exe_name, *args, **kwargs):
         self.add_command(Command, Executable(Path(exe_name)), *args, **kwargs)
@@ -110,10 +212,10 @@ class RuleBase:
     def get_targets(self):
         if RuleOptions.FORCE_SINGLE_TARGET in self.options:
             return {self.name}
-        return {self.name} | set(map(fspath, self.output_files))
+        return {self.name} | self.output_files
 
     def get_depends(self):
-        return set(map(fspath, self.input_files | self.depends))
+        return self.input_files | self.depends
 
     def _unaliased_name(self):
         return self.makefile.unalias(self.name)
@@ -158,10 +260,10 @@ class DynamicRule(RuleBase):
         self.makefile.alias(self.name, fspath(self.target_file))
 
     def _do_dump(self):
+        # the directory for stamps is created by Makefile.save(), and also by
+        # the stamp command if it's removed later
         result = super()._do_dump()
-        result += [_command_to_make(MakeDirCommand(self.repo,
-                                                   self.target_path(), True)),
-                   _command_to_make(TouchCommand(self.repo,
+        result += [_command_to_make(StampCommand(self.repo,
                                                  File(self.target_file)))]
         return result
 
@@ -184,8 +286,23 @@ class PhonyRule(RuleBase):
 
 
 class Makefile(MakefileBase):
-    def _add_custom_rule(self, ruletype, rulename, *args, **kwargs):
+    '''Makefile for the task
+
+    The rules can be put into groups (for example, one group per solution or
+    per test group). Each group is saved into its own fragment in
+    .taker/make/, which is included from the top-level Makefile. The rules
+    without group are saved into the top-level Makefile itself. While saving,
+    each file is compared with its contents on disk and rewritten only if it
+    differs (or is missing), so make doesn't see unchanged fragments as
+    modified. All the fragments are compared, as the aliases used in one group
+    can be defined by the rules in another one.'''
+
+    def _add_custom_rule(self, ruletype, rulename, *args, group=None,
+                         **kwargs):
+        if group is not None and not re.fullmatch(r'[\w.-]+', group):
+            raise MakefileError('invalid group name: {}'.format(group))
         rule = ruletype(self, rulename, *args, **kwargs)
+        rule.group = group
         self.rules += [rule]
         return rule
 
@@ -210,12 +327,59 @@ class Makefile(MakefileBase):
         return ('# Do not edit this file, it was generated automatically by '
                 'Taker build system\n')
 
-    def dump(self):
+    @staticmethod
+    def fragment_path(group):
+        return FRAGMENTS_PATH / (group + FRAGMENT_EXT)
+
+    def groups(self):
+        return sorted({rule.group
+                       for rule in self.rules
+                       if rule.group is not None})
+
+    def dump_fragment(self, group):
         return '\n'.join([self.get_initial_comment()] +
-                         [rule.dump() for rule in self.rules])
+                         [rule.dump()
+                          for rule in self.rules
+                          if rule.group == group])
+
+    def dump(self):
+        result = self.dump_fragment(None)
+        includes = ['include {}\n'.format(fspath(self.fragment_path(group)))
+                    for group in self.groups()]
+        if includes:
+            result += '\n' + ''.join(includes)
+        return result
+
+    def __save_file(self, filename, contents):
+        try:
+            with self.repo.open(filename, 'r') as old_file:
+                if old_file.read() == contents:
+                    return
+        except FileNotFoundError:
+            pass
+        with self.repo.open(filename, 'w') as new_file:
+            new_file.write(contents)
+
+    def __remove_stale_fragments(self, groups):
+        fragments_dir = self.repo.abspath(FRAGMENTS_PATH)
+        if not fragments_dir.is_dir():
+            return
+        for fragment in fragments_dir.glob('*' + FRAGMENT_EXT):
+            if fragment.stem not in groups:
+                fragment.unlink()
 
     def save(self):
-        self.repo.open('Makefile', 'w').write(self.dump())
+        if any(isinstance(rule, DynamicRule) for rule in self.rules):
+            self.repo.mkdir(DynamicRule.target_path(), parents=True,
+                            exist_ok=True)
+        groups = self.groups()
+        if groups:
+            self.repo.mkdir(FRAGMENTS_PATH, parents=True, exist_ok=True)
+        for group in groups:
+            self.__save_file(self.fragment_path(group),
+                             self.dump_fragment(group))
+        self.__remove_stale_fragments(set(groups))
+        self.__save_file('Makefile', self.dump())
 
     def __init__(self, repo):
         super().__init__(repo)
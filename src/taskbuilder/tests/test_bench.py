@@ -0,0 +1,33 @@
+from taskbuilder.bench import *
+
+
+def test_run_benchmark():
+    results = run_benchmark(100)
+    assert [result.phase for result in results] == PHASES
+    for result in results:
+        assert result.rules == 100
+        assert result.time > 0.0
+        assert result.memory > 0
+
+    results = run_benchmark(10, measure_memory=False)
+    assert [result.memory for result in results] == [None, None, None]
+
+    zero_thresholds = {phase: Threshold(time=0.0, memory=0)
+                       for phase in PHASES}
+    assert len(check_thresholds(results, zero_thresholds)) == 3
+    assert check_thresholds(results, {}) == []
+    assert format_results(results).count('\n') == 3
+
+
+def test_main(capsys):
+    no_limits = []
+    for phase in PHASES:
+        no_limits += ['-t', phase + '.time=1e9', '-t', phase + '.memory=1e9']
+    assert main(['20', '40'] + no_limits) == 0
+    out, err = capsys.readouterr()
+    assert out.count('\n') == 7
+    assert err == ''
+
+    assert main(['20', '--no-memory', '-t', 'dump.time=0']) == 1
+    out, err = capsys.readouterr()
+    assert err.startswith('threshold exceeded: dump (20 rules)')
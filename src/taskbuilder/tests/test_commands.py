@@ -113,6 +113,16 @@ def test_commands(tmpdir):
     assert command.shell_str() == ' '.join(('exe:' + shutil.which('mkdir'),
                                             'output=mydir'))
 
+    # normalized files are shared, others are copied and left untouched
+    in_file = InputFile('in.txt')
+    out_file = OutputFile(task_dir / 'out.txt')
+    command = Command(repo, Executable('exe'), args=[in_file],
+                      stdout_redir=out_file)
+    assert command.args[0] is in_file
+    assert command.stdout_redir is not out_file
+    assert command.stdout_redir == OutputFile('out.txt')
+    assert out_file.filename == task_dir / 'out.txt'
+
 
 def test_echo(tmpdir):
     repo = TaskRepository(tmpdir)
@@ -122,3 +132,14 @@ def test_echo(tmpdir):
 
     command = EchoCommand(repo, 'redirect', stdout_redir=File('42.txt'))
     assert command.shell_str() == '@echo redirect >42.txt'
+
+
+def test_stamp(tmpdir):
+    repo = TaskRepository(tmpdir)
+
+    command = StampCommand(repo, File(path.join('dir', 'stamp')))
+    assert command.shell_str() == ('@test -d dir || mkdir -p dir; : >' +
+                                   path.join('dir', 'stamp'))
+    command = StampCommand(repo, File('stamp'))
+    assert command.shell_str() == '@: >stamp'
+    assert command.get_output_files() == []
@@ -1,4 +1,5 @@
 from os import path
+from compat import fspath
 import shutil
 import pytest
 from taskbuilder.makefiles import *
@@ -37,6 +38,47 @@ def test_file_rule1(makefile):
     assert rule.dump() == load_answer_file('file_rule1.make')
 
 
+def test_path_table():
+    table = PathTable()
+    assert table.intern('a.txt') == 0
+    assert table.intern(Path('b.txt')) == 1
+    assert table.intern(InputFile('a.txt')) == 0
+    assert table.find('b.txt') == 1
+    assert table.find('c.txt') is None
+    assert table[1] == 'b.txt'
+    assert len(table) == 2
+
+
+def test_id_array():
+    ids = IdArray()
+    for value in range(100):
+        assert ids.add(value * 7 % 100)
+        assert not ids.add(value * 7 % 100)
+        assert (ids.index is None) == (len(ids) <= IdArray.INDEX_THRESHOLD)
+    assert len(ids) == 100
+    assert list(ids) == [value * 7 % 100 for value in range(100)]
+    assert ids.position(14) == 2
+    assert 42 in ids
+    assert 100 not in ids
+    assert ids.position(100) == -1
+
+
+def test_rule_files(makefile):
+    rule = makefile.add_file_rule('out.txt')
+    rule.add_executable('exe', args=[InputFile('in.txt'), File('a.txt'),
+                                     OutputFile('b.txt'), 'arg'],
+                        stdout_redir=OutputFile('out.txt'))
+    rule.add_depend('in.txt')
+    rule.add_depend('other')
+    rule.add_depend('out.txt')
+    assert rule.input_files == {'in.txt'}
+    assert rule.output_files == {'out.txt', 'b.txt'}
+    assert rule.files == {'in.txt', 'out.txt', 'a.txt', 'b.txt', 'exe'}
+    assert rule.depends == {'other', 'out.txt'}
+    assert rule.get_depends() == {'in.txt', 'other', 'out.txt'}
+    assert makefile.paths.find('other') is not None
+
+
 def test_file_rule2(makefile):
     rule = makefile.add_file_rule('file2.txt')
     rule.add_command(TouchCommand, OutputFile('file3.txt'))
@@ -115,3 +157,70 @@ def test_makefile(makefile):
 
     makefile.save()
     assert makefile.repo.open('Makefile', 'r').read() == makefile.dump()
+
+
+def test_makefile_groups(makefile):
+    repo = makefile.repo
+    repo.init_task()
+
+    sol_rule = makefile.add_phony_rule('sol', group='solutions')
+    sol_rule.add_command(EchoCommand, 'solution')
+    gen_rule = makefile.add_file_rule('gen', group='gen-1.0')
+    gen_rule.add_shell_cmd('true', args=[OutputFile('gen')])
+    makefile.all_rule.add_depend(sol_rule)
+
+    with pytest.raises(MakefileError):
+        makefile.add_phony_rule('bad', group='bad/group')
+
+    assert makefile.groups() == ['gen-1.0', 'solutions']
+    assert makefile.dump_fragment('solutions') == '\n'.join([
+        makefile.get_initial_comment(), sol_rule.dump()])
+    assert makefile.dump().endswith('\n\ninclude .taker/make/gen-1.0.mk\n'
+                                    'include .taker/make/solutions.mk\n')
+    assert 'sol:' not in makefile.dump()
+
+    repo.mkdir(FRAGMENTS_PATH)
+    repo.open(makefile.fragment_path('stale'), 'w').write('stale')
+
+    makefile.save()
+    assert (repo.open('.taker/make/solutions.mk', 'r').read() ==
+            makefile.dump_fragment('solutions'))
+    assert (repo.open('.taker/make/gen-1.0.mk', 'r').read() ==
+            makefile.dump_fragment('gen-1.0'))
+    assert not repo.abspath(makefile.fragment_path('stale')).exists()
+
+    written = []
+    old_open = repo.open
+
+    def logged_open(filename, mode, *args, **kwargs):
+        if mode == 'w':
+            written.append(fspath(filename))
+        return old_open(filename, mode, *args, **kwargs)
+
+    repo.open = logged_open
+    makefile.save()
+    assert written == []
+
+    sol_rule.add_command(EchoCommand, 'changed')
+    makefile.save()
+    assert written == [fspath(makefile.fragment_path('solutions'))]
+
+    # the removed fragment is written again, even if its rules are the same
+    written.clear()
+    repo.abspath(makefile.fragment_path('gen-1.0')).unlink()
+    makefile.save()
+    assert written == [fspath(makefile.fragment_path('gen-1.0'))]
+
+    # the alias defined in one group changes the other group
+    written.clear()
+    sol_rule.add_depend('dyn')
+    makefile.save()
+    assert written == [fspath(makefile.fragment_path('solutions'))]
+    written.clear()
+    dyn_rule = makefile.add_dynamic_rule('dyn', group='dynamic')
+    makefile.save()
+    assert sorted(written) == sorted([
+        fspath(makefile.fragment_path('dynamic')),
+        fspath(makefile.fragment_path('solutions')), 'Makefile'])
+    assert (fspath(dyn_rule.target_file) in
+            repo.open(makefile.fragment_path('solutions'), 'r').read())
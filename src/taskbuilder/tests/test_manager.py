@@ -1,5 +1,8 @@
+import shutil
+from compat import fspath
 from ...pytest_fixtures import repo_manager, config_manager
 from taskbuilder import RepositoryManager, EchoCommand, InputFile, OutputFile
+from taskbuilder import CommandFlag, RuleOptions
 
 
 def test_manager(repo_manager):
@@ -34,3 +37,31 @@ def test_manager(repo_manager):
     repo_manager.build()
     assert ((repo.open('file4.txt', 'r').read()) ==
             'then something happened...\nwe learned to make...\n')
+
+    file5_rule = makefile.add_file_rule('file5.txt', group='grouped')
+    file5_rule.add_shell_cmd('cat', args=[InputFile('file4.txt')],
+                             stdout_redir=OutputFile('file5.txt'))
+    makefile.all_rule.add_depend(file5_rule)
+    repo_manager.build()
+    assert ((repo.open('file5.txt', 'r').read()) ==
+            'then something happened...\nwe learned to make...\n')
+
+    # dynamic rules must run only once, as they are stamped
+    dyn_rule = makefile.add_dynamic_rule(
+        'dynrule', options={RuleOptions.FORCE_SINGLE_TARGET})
+    dyn_rule.add_shell_cmd('echo', args=['run'],
+                           stdout_redir=OutputFile('dyn.txt'),
+                           flags={CommandFlag.SILENT})
+    dyn_rule.add_shell_cmd('cat', args=[InputFile('dyn.txt')],
+                           stdout_redir=OutputFile('dyn2.txt'))
+    repo_manager.build('dynrule')
+    assert repo.open('dyn2.txt', 'r').read() == 'run\n'
+    repo.open('dyn.txt', 'w').write('not changed')
+    repo_manager.build('dynrule')
+    assert repo.open('dyn.txt', 'r').read() == 'not changed'
+
+    # the stamp directory is recreated if it's removed between the builds
+    shutil.rmtree(fspath(repo.directory / '.taker' / 'make_targets'))
+    repo_manager.build('dynrule')
+    assert repo.open('dyn.txt', 'r').read() == 'run\n'
+    assert (repo.directory / '.taker' / 'make_targets' / 'dynrule').exists()